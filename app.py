@@ -37,12 +37,24 @@ from fastapi import FastAPI, Request, Form, HTTPException, File, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from markupsafe import Markup, escape
 from telethon import TelegramClient, events
 from telethon import __version__ as TELETHON_VERSION
 from telethon.sessions import StringSession
 
 # Import dos novos módulos de performance
-from cache_manager import init_cache, cache_manager, decorator_cache
+import cache_manager as cache_redis
+import coalescencia
+from cache_manager import init_cache, decorator_cache
+from auditoria import init_auditoria
+from cache_estatisticas import init_cache_estatisticas
+from cliente_http import cliente_http, falhas_requisicao, marcar_falha
+import limite_taxa
+from referencia import referencia
+from enriquecimento import FonteEnriquecimento, registro_fontes, FONTES_DESATIVADAS
+from database import init_db
+from migrations import aplicar_migracoes
+import repositorio
 from circuit_breaker_manager import inicializar_circuit_breakers, circuit_breaker_manager
 from job_queue import enfileirar_tarefa, obter_status_tarefa, obter_stats_queue
 from sse_streaming import stream_consulta_completa, criar_sse_response
@@ -71,12 +83,11 @@ def is_plaintext_password(password: str) -> bool:
     # Senhas bcrypt começam com $2a$, $2b$, or $2y$
     return not (password.startswith('$2a$') or password.startswith('$2b$') or password.startswith('$2y$'))
 
-def upgrade_password_to_bcrypt(user_id: int, plaintext_password: str) -> bool:
+async def upgrade_password_to_bcrypt(user_id: int, plaintext_password: str) -> bool:
     """Converte uma senha em texto plano para bcrypt no banco"""
     try:
         hashed = hash_password(plaintext_password)
-        cursor.execute("UPDATE users SET password = ? WHERE id = ?", (hashed, user_id))
-        conn.commit()
+        await repositorio.atualizar_senha(user_id, hashed)
         return True
     except Exception as e:
         logger.error(f"Erro ao fazer upgrade de senha para bcrypt: {e}")
@@ -103,167 +114,55 @@ os.makedirs(TEMPLATES_DIR, exist_ok=True)
 # ----------------------
 DB_FILE = os.environ.get("DB_FILE", os.path.join(BASE_DIR, "history.db"))
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE, timeout=10, check_same_thread=False)
-    conn.isolation_level = None
-    return conn
-
-conn = get_db_connection()
-cursor = conn.cursor()
-
-# Tabela de Buscas
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS searches (
-    id           INTEGER PRIMARY KEY AUTOINCREMENT,
-    identifier   TEXT,
-    response     TEXT,
-    searched_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
-    username     TEXT
-)
-""")
-
-# Migração: adicionar colunas se não existirem
-try:
-    cursor.execute("SELECT response FROM searches LIMIT 1")
-except sqlite3.OperationalError:
-    cursor.execute("ALTER TABLE searches ADD COLUMN response TEXT")
-    conn.commit()
+db = init_db(DB_FILE)
 
-try:
-    cursor.execute("SELECT username FROM searches LIMIT 1")
-except sqlite3.OperationalError:
-    cursor.execute("ALTER TABLE searches ADD COLUMN username TEXT")
-    conn.commit()
-
-# Tabela de Usuários
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE,
-    password TEXT,
-    is_admin INTEGER DEFAULT 0,
-    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-    ultimo_login DATETIME,
-    ip_acesso TEXT,
-    status INTEGER DEFAULT 1,
-    numero_consultas INTEGER DEFAULT 0
+# Log de auditoria gravado em lote por uma thread (AUDIT_LOG_MODO=imediato grava na hora)
+auditoria = init_auditoria(
+    modo=os.environ.get("AUDIT_LOG_MODO", "lote"),
+    intervalo_ms=int(os.environ.get("AUDIT_LOG_INTERVALO_MS", "200")),
+    tamanho_lote=int(os.environ.get("AUDIT_LOG_LOTE", "100")),
+    max_fila=int(os.environ.get("AUDIT_LOG_MAX_FILA", "10000")),
 )
-""")
-conn.commit()
 
-# Migração: adicionar colunas se não existirem (com tratamento de erro específico)
-def add_column_if_not_exists(table_name, column_name, column_type):
-    try:
-        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
-        conn.commit()
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" in str(e):
-            pass  # Coluna já existe, tudo bem
-        else:
-            raise
-
-# Adicionar todas as colunas necessárias
-add_column_if_not_exists("users", "data_criacao", "DATETIME")
-add_column_if_not_exists("users", "ultimo_login", "DATETIME")
-add_column_if_not_exists("users", "ip_acesso", "TEXT")
-add_column_if_not_exists("users", "status", "INTEGER")
-add_column_if_not_exists("users", "numero_consultas", "INTEGER")
-add_column_if_not_exists("users", "senha_temporaria", "INTEGER DEFAULT 0")
+def init_schema():
+    """Aplica as migrações pendentes e garante o admin padrão"""
+    global ADMIN_PASSWORD
+
+    versao = aplicar_migracoes(db)
+    logger.info(f"🗄️ Schema do banco na versão {versao}")
+
+    with db.transacao(imediata=True) as cursor:
+        # Criar admin padrão a partir de variáveis de ambiente
+        cursor.execute("SELECT id, password FROM users WHERE username = ?", (ADMIN_USERNAME,))
+        admin_row = cursor.fetchone()
+
+        if admin_row is None:
+            if not ADMIN_PASSWORD:
+                ADMIN_PASSWORD = secrets.token_urlsafe(10)
+                logger.warning(
+                    "ADMIN_PASSWORD nao definido. Senha temporaria gerada para %s: %s",
+                    ADMIN_USERNAME,
+                    ADMIN_PASSWORD
+                )
+            # Hash a senha antes de inserir
+            hashed_password = hash_password(ADMIN_PASSWORD)
+            cursor.execute(
+                "INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)",
+                (ADMIN_USERNAME, hashed_password, 1)
+            )
+        elif ADMIN_PASSWORD:
+            # Hash a senha antes de atualizar
+            hashed_password = hash_password(ADMIN_PASSWORD)
+            cursor.execute(
+                "UPDATE users SET password = ? WHERE username = ?",
+                (hashed_password, ADMIN_USERNAME)
+            )
 
-# Criar admin padrão a partir de variáveis de ambiente
+# Credenciais do admin padrão a partir de variáveis de ambiente
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 
-cursor.execute("SELECT id, password FROM users WHERE username = ?", (ADMIN_USERNAME,))
-admin_row = cursor.fetchone()
-
-if admin_row is None:
-    if not ADMIN_PASSWORD:
-        ADMIN_PASSWORD = secrets.token_urlsafe(10)
-        logger.warning(
-            "ADMIN_PASSWORD nao definido. Senha temporaria gerada para %s: %s",
-            ADMIN_USERNAME,
-            ADMIN_PASSWORD
-        )
-    # Hash a senha antes de inserir
-    hashed_password = hash_password(ADMIN_PASSWORD)
-    cursor.execute(
-        "INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)",
-        (ADMIN_USERNAME, hashed_password, 1)
-    )
-elif ADMIN_PASSWORD:
-    # Hash a senha antes de atualizar
-    hashed_password = hash_password(ADMIN_PASSWORD)
-    cursor.execute(
-        "UPDATE users SET password = ? WHERE username = ?",
-        (hashed_password, ADMIN_USERNAME)
-    )
-
-conn.commit()
-
-# Tabela de Logs de Auditoria
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS audit_logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    action TEXT,
-    username TEXT,
-    ip_address TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    details TEXT
-)
-""")
-conn.commit()
-
-# Tabela de Favoritos
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS favorites (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    search_id INTEGER,
-    username TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (search_id) REFERENCES searches(id)
-)
-""")
-conn.commit()
-
-# Tabela de Notas/Comentários
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS notes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    search_id INTEGER,
-    username TEXT,
-    note TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (search_id) REFERENCES searches(id)
-)
-""")
-conn.commit()
-
-# Tabela de Tags
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS tags (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    search_id INTEGER,
-    tag_name TEXT,
-    username TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (search_id) REFERENCES searches(id)
-)
-""")
-conn.commit()
-
-# Tabela de Configurações do Usuário
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS user_settings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE,
-    dark_mode INTEGER DEFAULT 0,
-    notifications_enabled INTEGER DEFAULT 1,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-)
-""")
-conn.commit()
+init_schema()
 
 # ----------------------
 # Sistema de Rate Limiting e Expiração
@@ -282,6 +181,10 @@ csrf_token_timeout = 60 * 60  # 1 hora
 MAX_QUERIES_PER_MINUTE = 10
 query_attempts = defaultdict(list)  # {username: [timestamp1, timestamp2, ...]}
 
+# Paginação do histórico (keyset)
+HISTORICO_POR_PAGINA = 50
+API_HISTORICO_MAX_POR_PAGINA = 200
+
 # ----------------------
 # Configuração Telethon (Telegram)
 # ----------------------
@@ -464,8 +367,8 @@ async def startup_event():
     try:
         # Inicializar Cache Redis
         redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-        init_cache(redis_url)
-        print(f"✅ Cache Redis inicializado: {redis_url}")
+        if await init_cache(redis_url).conectar():
+            print(f"✅ Cache Redis inicializado: {redis_url}")
     except Exception as e:
         print(f"⚠️ Aviso: Cache Redis não disponível: {e}")
     
@@ -476,10 +379,23 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Aviso: Circuit Breakers não puderam ser inicializados: {e}")
 
+    # Pool HTTP compartilhado pelas APIs de enriquecimento (buscar_*)
+    await cliente_http.abrir()
+
+    # Dados de referência locais (CNAE/CEP) consultados antes das APIs
+    try:
+        referencia.carregar()
+    except Exception as e:
+        print(f"⚠️ Aviso: Dados de referência locais não carregados: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Limpa recursos ao desligar a aplicação"""
-    # Redis vai ser desconectado automaticamente
+    if cache_redis.cache_manager:
+        await cache_redis.cache_manager.fechar()
+    await cliente_http.fechar()
+    auditoria.encerrar()
+    db.encerrar()
     logger.info("👋 Aplicação desligando...")
 
 # ----------------------
@@ -591,14 +507,13 @@ def is_session_expired(request: Request) -> bool:
     except (ValueError, TypeError):
         return True
 
-def is_user_inactive(username: str) -> bool:
+async def is_user_inactive(username: str) -> bool:
     """Verifica se o usuário está inativo (desativado)"""
     try:
-        cursor.execute("SELECT status FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
+        user = await repositorio.buscar_papel_usuario(username)
         if not user:
             return True  # Usuário não existe
-        status = user[0]
+        status = user[1]
         # Se status é NULL ou 0, usuário está inativo
         if status is None or status == 0:
             return True
@@ -606,7 +521,7 @@ def is_user_inactive(username: str) -> bool:
     except:
         return False  # Se der erro, deixa passar (compatibilidade)
 
-def validate_user_session(request: Request):
+async def validate_user_session(request: Request):
     """Valida se o usuário tem uma sessão válida e está ativo. Retorna None se OK, ou um RedirectResponse se inválido."""
     username = request.cookies.get("auth_user")
     
@@ -622,7 +537,7 @@ def validate_user_session(request: Request):
         return response
     
     # Verificar se usuário está inativo
-    if is_user_inactive(username):
+    if await is_user_inactive(username):
         response = RedirectResponse(url="/login", status_code=303)
         response.delete_cookie("auth_user")
         response.delete_cookie("is_admin")
@@ -631,13 +546,12 @@ def validate_user_session(request: Request):
     
     return None
 
-def is_admin_username(username: str) -> bool:
+async def is_admin_username(username: str) -> bool:
     """Valida privilégios admin no banco (não confiar em cookie)."""
     if not username:
         return False
     try:
-        cursor.execute("SELECT is_admin, status FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
+        user = await repositorio.buscar_papel_usuario(username)
         if not user:
             return False
         is_admin = user[0] == 1
@@ -647,12 +561,12 @@ def is_admin_username(username: str) -> bool:
     except Exception:
         return False
 
-def request_is_admin(request: Request) -> bool:
+async def request_is_admin(request: Request) -> bool:
     """Valida sessão e papel admin no servidor."""
     username = request.cookies.get("auth_user")
     if not username:
         return False
-    return is_admin_username(username)
+    return await is_admin_username(username)
 
 def check_rate_limit(ip: str) -> bool:
     """Verifica se o IP excedeu o limite de tentativas de login"""
@@ -669,13 +583,9 @@ def record_login_attempt(ip: str):
     login_attempts[ip].append(datetime.now().timestamp())
 
 def record_audit_log(action: str, username: str, ip_address: str, details: str = ""):
-    """Registra ação no log de auditoria"""
+    """Registra ação no log de auditoria (enfileirado e gravado em lote, não bloqueia a rota)"""
     try:
-        cursor.execute(
-            "INSERT INTO audit_logs (action, username, ip_address, details) VALUES (?, ?, ?, ?)",
-            (action, username, ip_address, details)
-        )
-        conn.commit()
+        auditoria.registrar(action, username, ip_address, details)
     except:
         pass  # Silenciar erros de auditoria
 
@@ -691,10 +601,38 @@ def format_timestamp_br(timestamp_str: str) -> str:
     except:
         return timestamp_str  # Retorna original se houver erro
 
+def formatar_trecho_busca(trecho: str):
+    """Escapa o trecho do FTS e destaca os termos encontrados com <mark>"""
+    if not trecho:
+        return None
+    html = str(escape(trecho))
+    html = html.replace(repositorio.MARCA_INICIO, "<mark>").replace(repositorio.MARCA_FIM, "</mark>")
+    return Markup(html)
+
+def montar_consulta_historico(consulta: dict) -> dict:
+    """Converte uma linha do repositório no formato usado pelo template historico.html"""
+    return {
+        "id": consulta["id"],
+        "id_alvo": consulta["identifier"],
+        "data": format_timestamp_br(consulta["searched_at"]),
+        "resumo": consulta["resumo"],
+        "truncado": consulta["truncado"],
+        "trecho": formatar_trecho_busca(consulta.get("trecho")),
+        "is_favorite": consulta["is_favorite"],
+        "note": consulta["note"],
+        "note_date": format_timestamp_br(consulta["note_created_at"]) if consulta["note_created_at"] else None,
+        "tags": consulta["tags"]
+    }
+
 # ========================
 # INTEGRAÇÃO DE APIs GRÁTIS
 # ========================
 
+# Prazo global do enriquecimento: fontes que não responderem a tempo ficam de fora
+ENRIQUECIMENTO_PRAZO = float(os.environ.get("ENRIQUECIMENTO_PRAZO", "10"))
+# registrar() recusa fontes com timeout acima do prazo (nunca terminariam a tempo)
+registro_fontes.prazo = ENRIQUECIMENTO_PRAZO
+
 async def enriquecher_endereco_selecionado(endereco: str) -> dict:
     """
     Busca ViaCEP, Nominatim e Informações Públicas para um endereço específico
@@ -712,33 +650,11 @@ async def enriquecher_endereco_selecionado(endereco: str) -> dict:
     }
     
     try:
-        # ViaCEP
-        endereco_validado = await buscar_cep_viacep(endereco)
-        if endereco_validado:
-            result["viacep"] = endereco_validado
-            
-            try:
-                # Nominatim
-                localizacao = await buscar_nominatim(
-                    endereco_validado.get("logradouro", ""),
-                    endereco_validado.get("localidade", ""),
-                    endereco_validado.get("uf", "")
-                )
-                if localizacao:
-                    result["nominatim"] = localizacao
-                    
-                    # Buscar Overpass (pontos de interesse) se temos coords
-                    try:
-                        overpass_data = await buscar_overpass_api(
-                            localizacao.get("latitude", 0),
-                            localizacao.get("longitude", 0)
-                        )
-                        if overpass_data:
-                            result["info_publica"]["overpass"] = overpass_data
-                    except Exception as op_err:
-                        print(f"⚠️ Erro ao buscar Overpass: {str(op_err)}")
-            except Exception as nom_err:
-                print(f"⚠️ Erro ao buscar Nominatim: {str(nom_err)}")
+        # ViaCEP -> Nominatim -> Overpass (fontes do tipo "endereco" no registro)
+        resultados = await registro_fontes.enriquecer({"tipo": "endereco", "endereco": endereco}, ENRIQUECIMENTO_PRAZO)
+        result["viacep"] = resultados.get("viacep")
+        result["nominatim"] = resultados.get("nominatim")
+        result["info_publica"]["overpass"] = resultados.get("overpass")
     except Exception as e:
         print(f"⚠️ Erro em enriquecher_endereco_selecionado: {str(e)}")
     
@@ -748,10 +664,22 @@ async def enriquecer_dados_com_apis(identificador: str, tipo: str, dados_estrutu
     """
     Enriquece com APIs RÁPIDAS
     Endereços: mostrar lista para SELECIONAR (usuário valida qual quer)
+    
+    As fontes vêm do registro_fontes (ver REGISTRO DE FONTES abaixo) e rodam em
+    paralelo; a latência total é a da fonte mais lenta, limitada por ENRIQUECIMENTO_PRAZO.
+    A mesma consulta aberta ao mesmo tempo (vários usuários, envio duplicado) gera um
+    único enriquecimento, cujo resultado é compartilhado (não alterar o dict retornado).
     """
     if not dados_estruturados:
         return {}
     
+    return await coalescencia.coalescedor.executar(
+        # O resultado depende também dos dados do Telegram, não só do identificador
+        coalescencia.Coalescedor.chave("enriquecimento", tipo, identificador, dados_estruturados),
+        lambda: _enriquecer_dados_com_apis(identificador, tipo, dados_estruturados),
+    )
+
+async def _enriquecer_dados_com_apis(identificador: str, tipo: str, dados_estruturados: dict) -> dict:
     apis_data = {
         "enderecos_disponiveis": [],
         "endereco_validado": None,
@@ -761,6 +689,14 @@ async def enriquecer_dados_com_apis(identificador: str, tipo: str, dados_estrutu
         "risk_score": None
     }
     
+    contexto = {
+        "identificador": identificador,
+        "tipo": tipo,
+        "dados": dados_estruturados,
+        "endereco": None,
+        "nome": ""
+    }
+    
     try:
         # Listar endereços para seleção
         if dados_estruturados.get("enderecos"):
@@ -773,109 +709,23 @@ async def enriquecer_dados_com_apis(identificador: str, tipo: str, dados_estrutu
             
             # Se apenas 1 endereço, validar automaticamente
             if len(apis_data["enderecos_disponiveis"]) == 1:
-                try:
-                    endereco = apis_data["enderecos_disponiveis"][0]
-                    resultado = await enriquecher_endereco_selecionado(endereco)
-                    if resultado and resultado.get("viacep"):
-                        apis_data["endereco_validado"] = resultado["viacep"]
-                    if resultado and resultado.get("nominatim"):
-                        apis_data["localizacao"] = resultado["nominatim"]
-                except Exception as end_err:
-                    print(f"⚠️ Erro ao validar 1 endereço: {str(end_err)}")
-                    pass
+                contexto["endereco"] = apis_data["enderecos_disponiveis"][0]
     except Exception as e:
         print(f"⚠️ Erro ao processar endereços: {str(e)}")
     
     try:
-        # Wikipedia + Wikidata + CNAE + Gravatar - Automáticas
-        nome_para_wiki = ""
-        if tipo.lower() == "cnpj" and dados_estruturados.get("dados_pessoais", {}).get("nome"):
-            nome_para_wiki = dados_estruturados["dados_pessoais"]["nome"]
-        elif tipo.lower() == "cpf" and dados_estruturados.get("dados_pessoais", {}).get("nome"):
-            # Também buscar Wikipedia para CPF (pessoas famosas)
-            nome_para_wiki = dados_estruturados["dados_pessoais"]["nome"]
+        # Nome usado por Wikipedia/Wikidata (empresa para CNPJ, pessoa para CPF)
+        if tipo.lower() in ("cnpj", "cpf") and dados_estruturados.get("dados_pessoais", {}).get("nome"):
+            contexto["nome"] = dados_estruturados["dados_pessoais"]["nome"]
         
         # Debug: verificar se nome foi extraído
-        print(f"🔍 DEBUG Enriquecimento - Tipo: {tipo}, Nome extraído: '{nome_para_wiki}'")
-        
-        info_publica_compilada = {}
-        
-        # 1. Wikipedia
-        if nome_para_wiki and isinstance(nome_para_wiki, str):
-            info_wiki = await buscar_wikipedia(nome_para_wiki)
-            if info_wiki:
-                info_publica_compilada["wikipedia"] = info_wiki
-        
-        # 2. Wikidata - Complementa Wikipedia
-        if nome_para_wiki and isinstance(nome_para_wiki, str):
-            try:
-                info_wikidata = await buscar_wikidata(nome_para_wiki)
-                if info_wikidata:
-                    info_publica_compilada["wikidata"] = info_wikidata
-            except Exception as wd_err:
-                print(f"⚠️ Erro ao buscar Wikidata: {str(wd_err)}")
-        
-        # 3. CNAE (IBGE) - Para empresas
-        if tipo.lower() == "cnpj":
-            cnae_code = dados_estruturados.get("dados_empresa", {}).get("cnae")
-            if cnae_code:
-                try:
-                    info_cnae = await buscar_cnae_ibge(cnae_code)
-                    if info_cnae:
-                        info_publica_compilada["cnae"] = info_cnae
-                except Exception as cnae_err:
-                    print(f"⚠️ Erro ao buscar CNAE: {str(cnae_err)}")
+        print(f"🔍 DEBUG Enriquecimento - Tipo: {tipo}, Nome extraído: '{contexto['nome']}'")
         
-        # 4. Gravatar - Para CPF/Pessoa
-        if tipo.lower() == "cpf":
-            # Tentar extrair email dos dados estruturados
-            emails = dados_estruturados.get("emails", [])
-            
-            if emails and len(emails) > 0:
-                try:
-                    info_gravatar = await buscar_gravatar(emails[0])
-                    if info_gravatar:
-                        info_publica_compilada["gravatar"] = info_gravatar
-                except Exception as grav_err:
-                    print(f"⚠️ Erro ao buscar Gravatar: {str(grav_err)}")
-        
-        # 5. ReceitaWS - CNPJ
-        if tipo.lower() == "cnpj":
-            try:
-                info_receitaws = await buscar_cnpj_receitaws(identificador)
-                if info_receitaws:
-                    info_publica_compilada["receitaws"] = info_receitaws
-            except Exception as rws_err:
-                print(f"⚠️ Erro ao buscar ReceitaWS: {str(rws_err)}")
-        
-        # 6. BrasilAPI CNPJ
-        if tipo.lower() == "cnpj":
-            try:
-                info_brasilapi = await buscar_cnpj_brasilapi(identificador)
-                if info_brasilapi:
-                    info_publica_compilada["brasilapi"] = info_brasilapi
-            except Exception as bapi_err:
-                print(f"⚠️ Erro ao buscar BrasilAPI: {str(bapi_err)}")
-        
-        # 7. Licitações e Contratos Federais (Portal Dados Abertos)
-        if tipo.lower() == "cnpj":
-            try:
-                info_licitacoes = await buscar_licitacoes_dadosabertos(identificador)
-                if info_licitacoes:
-                    info_publica_compilada["licitacoes_federais"] = info_licitacoes
-            except Exception as lic_err:
-                print(f"⚠️ Erro ao buscar licitações: {str(lic_err)}")
-        
-        # 8. Portal da Transparência (Gastos Públicos)
-        # Executar sempre para CPF e CNPJ
-        try:
-            info_transparencia = await buscar_transparencia_gastos(identificador, tipo)
-            if info_transparencia:
-                info_publica_compilada["transparencia_federal"] = info_transparencia
-                print(f"✅ Transparência executada: encontrado={info_transparencia.get('encontrado', False)}")
-        except Exception as transp_err:
-            print(f"⚠️ Erro ao buscar transparência: {str(transp_err)}")
+        resultados = await registro_fontes.enriquecer(contexto, ENRIQUECIMENTO_PRAZO)
         
+        apis_data["endereco_validado"] = resultados.pop("viacep", None)
+        apis_data["localizacao"] = resultados.pop("nominatim", None)
+        info_publica_compilada = resultados
         
         if info_publica_compilada:
             apis_data["info_publica"] = info_publica_compilada
@@ -901,12 +751,24 @@ async def buscar_cep_viacep(endereco: str) -> dict:
         
         cep = f"{cep_match.group(1)}{cep_match.group(2)}"
         
-        # Usar executor para não bloquear event loop
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(f"https://viacep.com.br/ws/{cep}/json/", timeout=5)
-        )
+        # Base local: CEP exato dispensa a API; só a faixa (localidade/UF) fica de reserva
+        local = referencia.buscar_cep(cep)
+        if local and local["logradouro"]:
+            return local
+        
+        try:
+            response = await cliente_http.get(f"https://viacep.com.br/ws/{cep}/json/")
+        except Exception:
+            # ViaCEP fora do ar: a localidade pela faixa ainda é útil, mas é resposta degradada
+            # (marcada como falha: não vai para o cache no lugar do endereço completo)
+            if local:
+                marcar_falha()
+                return local
+            raise
+        
+        if response.status_code != 200 and local:
+            marcar_falha()
+            return local
         
         if response.status_code == 200:
             try:
@@ -937,18 +799,9 @@ async def buscar_nominatim(rua: str, cidade: str, estado: str) -> dict:
     """
     try:
         query = f"{rua}, {cidade}, {estado}, Brasil"
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        # Usar executor para não bloquear event loop
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={"q": query, "format": "json", "limit": 1},
-                headers=headers,
-                timeout=5
-            )
+        response = await cliente_http.get(
+            "https://nominatim.openstreetmap.org/search",
+            params={"q": query, "format": "json", "limit": 1}
         )
         
         if response.status_code == 200:
@@ -978,25 +831,16 @@ async def buscar_wikipedia(nome_empresa: str) -> dict:
     Útil para empresas famosas/públicas
     """
     try:
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        # Usar executor para não bloquear event loop
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                "https://pt.wikipedia.org/w/api.php",
-                params={
-                    "action": "query",
-                    "format": "json",
-                    "titles": nome_empresa,
-                    "prop": "extracts",
-                    "explaintext": True,
-                    "exsectionformat": "plain"
-                },
-                headers=headers,
-                timeout=5
-            )
+        response = await cliente_http.get(
+            "https://pt.wikipedia.org/w/api.php",
+            params={
+                "action": "query",
+                "format": "json",
+                "titles": nome_empresa,
+                "prop": "extracts",
+                "explaintext": 1,
+                "exsectionformat": "plain"
+            }
         )
         
         if response.status_code == 200:
@@ -1035,18 +879,12 @@ async def buscar_cnae_ibge(cnae_code: str) -> dict:
         if len(cnae_clean) < 4:
             return None
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
+        # Tabela CNAE local (python referencia.py importar-cnae) antes da API do IBGE
+        local = referencia.buscar_cnae(cnae_clean)
+        if local:
+            return local
         
-        # Usar executor para não bloquear event loop
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                f"https://servicodados.ibge.gov.br/api/v2/CNAE/{cnae_clean}",
-                headers=headers,
-                timeout=5
-            )
-        )
+        response = await cliente_http.get(f"https://servicodados.ibge.gov.br/api/v2/CNAE/{cnae_clean}")
         
         if response.status_code == 200:
             try:
@@ -1079,25 +917,16 @@ async def buscar_wikidata(nome: str) -> dict:
         if not nome or len(nome) < 2:
             return None
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        # Usar executor para não bloquear event loop
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                "https://www.wikidata.org/w/api.php",
-                params={
-                    "action": "wbsearchentities",
-                    "search": nome,
-                    "language": "pt",
-                    "format": "json",
-                    "type": "item",
-                    "limit": 1
-                },
-                headers=headers,
-                timeout=5
-            )
+        response = await cliente_http.get(
+            "https://www.wikidata.org/w/api.php",
+            params={
+                "action": "wbsearchentities",
+                "search": nome,
+                "language": "pt",
+                "format": "json",
+                "type": "item",
+                "limit": 1
+            }
         )
         
         if response.status_code == 200:
@@ -1114,13 +943,8 @@ async def buscar_wikidata(nome: str) -> dict:
                 
                 # Se encontrou, buscar detalhes da entidade
                 if entity_id:
-                    details_response = await loop.run_in_executor(
-                        executor,
-                        lambda: requests.get(
-                            f"https://www.wikidata.org/wiki/Special:EntityData/{entity_id}.json",
-                            headers=headers,
-                            timeout=5
-                        )
+                    details_response = await cliente_http.get(
+                        f"https://www.wikidata.org/wiki/Special:EntityData/{entity_id}.json"
                     )
                     
                     if details_response.status_code == 200:
@@ -1175,18 +999,7 @@ async def buscar_overpass_api(latitude: float, longitude: float) -> dict:
         out center 10;
         """
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.post(
-                "https://overpass-api.de/api/interpreter",
-                data=query,
-                headers=headers,
-                timeout=10
-            )
-        )
+        response = await cliente_http.post("https://overpass-api.de/api/interpreter", content=query)
         
         if response.status_code == 200:
             try:
@@ -1255,17 +1068,7 @@ async def buscar_gravatar(email: str) -> dict:
         # Calcular SHA256 hash do email (lowercase + trimmed)
         email_hash = hashlib.sha256(email.lower().strip().encode()).hexdigest()
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                f"https://api.gravatar.com/v3/profiles/{email_hash}",
-                headers=headers,
-                timeout=5
-            )
-        )
+        response = await cliente_http.get(f"https://api.gravatar.com/v3/profiles/{email_hash}")
         
         if response.status_code == 200:
             try:
@@ -1321,18 +1124,10 @@ async def buscar_pep(nome: str, cpf_cnpj: str = None) -> dict:
         if not nome or len(nome) < 2:
             return None
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
         # Buscar em API de dados abertos (Pessoas Politicamente Expostas)
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                "https://dados.gov.br/api/3/action/package_search",
-                params={"q": "PEP pessoas politicamente expostas", "rows": 5},
-                headers=headers,
-                timeout=5
-            )
+        response = await cliente_http.get(
+            "https://dados.gov.br/api/3/action/package_search",
+            params={"q": "PEP pessoas politicamente expostas", "rows": 5}
         )
         
         if response.status_code == 200:
@@ -1368,18 +1163,10 @@ async def buscar_servidores_publicos(nome: str, cpf: str = None) -> dict:
         if not nome or len(nome) < 2:
             return None
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
         # Buscar servidores públicos (busca por nome)
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                "http://api.portaldatransparencia.gov.br/api-de-dados/servidores",
-                params={"nome": nome, "pagina": 1},
-                headers=headers,
-                timeout=5
-            )
+        response = await cliente_http.get(
+            "http://api.portaldatransparencia.gov.br/api-de-dados/servidores",
+            params={"nome": nome, "pagina": 1}
         )
         
         if response.status_code == 200:
@@ -1456,17 +1243,7 @@ async def buscar_cnpj_receitaws(cnpj: str) -> dict:
         # Remover formatação
         cnpj_limpo = cnpj.replace(".", "").replace("-", "").replace("/", "")
         
-        headers = {"User-Agent": "Detetive-App/1.0"}
-        
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                f"https://www.receitaws.com.br/v1/cnpj/{cnpj_limpo}",
-                headers=headers,
-                timeout=5
-            )
-        )
+        response = await cliente_http.get(f"https://www.receitaws.com.br/v1/cnpj/{cnpj_limpo}")
         
         if response.status_code == 200:
             try:
@@ -1514,14 +1291,7 @@ async def buscar_cnpj_brasilapi(cnpj: str) -> dict:
         # Remover formatação
         cnpj_limpo = cnpj.replace(".", "").replace("-", "").replace("/", "")
         
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(
-                f"https://brasilapi.com.br/api/cnpj/v1/{cnpj_limpo}",
-                timeout=5
-            )
-        )
+        response = await cliente_http.get(f"https://brasilapi.com.br/api/cnpj/v1/{cnpj_limpo}")
         
         if response.status_code == 200:
             try:
@@ -1840,8 +1610,7 @@ async def buscar_oab_api_simples(numero: str, estado: str, tipo_inscricao: str =
         
         print(f"🔍 Buscando OAB (modo simples): {numero}/{estado}")
         
-        session = requests.Session()
-        resp_get = session.get(url_base + "/", headers=headers, timeout=15)
+        resp_get = await cliente_http.get(url_base + "/", headers=headers)
         
         import re
         csrf_match = re.search(r'name="__RequestVerificationToken"[^>]*value="([^"]+)"', resp_get.text)
@@ -1864,7 +1633,13 @@ async def buscar_oab_api_simples(numero: str, estado: str, tipo_inscricao: str =
             "IsMobile": ""
         }
         
-        resp_search = session.post(url_base + "/Home/Search", data=payload, headers=headers, timeout=15)
+        # O cliente compartilhado não guarda cookies: repassa os da sessão aberta no GET acima
+        cookies_sessao = "; ".join(f"{nome}={valor}" for nome, valor in resp_get.cookies.items())
+        resp_search = await cliente_http.post(
+            url_base + "/Home/Search",
+            data=payload,
+            headers={**headers, "Cookie": cookies_sessao}
+        )
         
         if resp_search.status_code != 200:
             return {"encontrado": False, "erro": f"HTTP {resp_search.status_code}"}
@@ -2019,9 +1794,16 @@ async def buscar_transparencia_gastos(cpf_cnpj: str, tipo: str) -> dict:
         
         logger.info(f"🔍 Buscando transparência federal para {tipo.upper()}: {cpf_cnpj_limpo}")
         
-        loop = asyncio.get_event_loop()
         client = PortalTransparencia(api_key=TRANSPARENCIA_API_KEY)
         
+        # _make_request devolve None tanto para "não encontrado" quanto para 5xx/timeout;
+        # as falhas ficam no registro do cliente_http e distinguem os dois casos
+        falhas = falhas_requisicao.get()
+        if falhas is None:
+            falhas = {'falhas': 0}
+            falhas_requisicao.set(falhas)
+        falhas_antes = falhas.get('falhas', 0)
+        
         resultados = {
             "encontrado": False,
             "fonte": "Portal da Transparência - Governo Federal"
@@ -2029,19 +1811,14 @@ async def buscar_transparencia_gastos(cpf_cnpj: str, tipo: str) -> dict:
         
         # Para CPF: buscar dados de servidor público + informações de pessoa física
         if tipo.lower() == "cpf":
-            # Buscar dados de servidor
-            servidor = await loop.run_in_executor(
-                executor,
-                client.buscar_servidor_por_cpf,
-                cpf_cnpj
-            )
-            
-            # Buscar informações gerais de pessoa física (paralelo)
-            pessoa_fisica = await loop.run_in_executor(
-                executor,
-                client.buscar_dados_pessoa_fisica,
-                cpf_cnpj
+            # Dados de servidor + informações gerais de pessoa física (em paralelo)
+            servidor, pessoa_fisica = await asyncio.gather(
+                client.buscar_servidor_por_cpf(cpf_cnpj),
+                client.buscar_dados_pessoa_fisica(cpf_cnpj)
             )
+            if falhas.get('falhas', 0) > falhas_antes:
+                logger.warning("⚠️ Portal da Transparência com falha - resultado descartado (não é 'não encontrado')")
+                return None
             
             # Se encontrou servidor OU pessoa física
             if (servidor and servidor.get('encontrado')) or (pessoa_fisica and pessoa_fisica.get('encontrado')):
@@ -2073,17 +1850,13 @@ async def buscar_transparencia_gastos(cpf_cnpj: str, tipo: str) -> dict:
         # Para CNPJ: buscar dados de empresa + convênios
         elif tipo.lower() == "cnpj":
             # Buscar em paralelo: pessoa jurídica + convênios
-            pessoa_juridica = await loop.run_in_executor(
-                executor,
-                client.buscar_dados_pessoa_juridica,
-                cpf_cnpj
-            )
-            
-            convenios = await loop.run_in_executor(
-                executor,
-                client.buscar_convenios_por_cnpj,
-                cpf_cnpj
+            pessoa_juridica, convenios = await asyncio.gather(
+                client.buscar_dados_pessoa_juridica(cpf_cnpj),
+                client.buscar_convenios_por_cnpj(cpf_cnpj)
             )
+            if falhas.get('falhas', 0) > falhas_antes:
+                logger.warning("⚠️ Portal da Transparência com falha - resultado descartado (não é 'não encontrado')")
+                return None
             
             # Se encontrou dados de empresa OU convênios
             if (pessoa_juridica and pessoa_juridica.get('encontrado')) or convenios:
@@ -2119,6 +1892,82 @@ async def buscar_transparencia_gastos(cpf_cnpj: str, tipo: str) -> dict:
         return None
 
 
+# ========================
+# REGISTRO DE FONTES DE ENRIQUECIMENTO
+# ========================
+# Ordem de registro = ordem das chaves em info_publica.
+# entrada(contexto, dependencias) -> argumentos do buscar_* ou None (fonte não se aplica)
+
+DIA = 86400
+
+def _nome_contexto(ctx: dict, dep: dict):
+    nome = ctx.get("nome")
+    return (nome,) if nome and isinstance(nome, str) else None
+
+def _cnae_contexto(ctx: dict, dep: dict):
+    cnae_code = ctx["dados"].get("dados_empresa", {}).get("cnae")
+    return (cnae_code,) if cnae_code else None
+
+def _email_contexto(ctx: dict, dep: dict):
+    emails = ctx["dados"].get("emails", [])
+    return (emails[0],) if emails else None
+
+def _cep_contexto(ctx: dict, dep: dict):
+    # Só o CEP (sem o resto do endereço) vai para o buscar_*: a chave de cache fica estável
+    cep_match = re.search(r'(\d{5})-?(\d{3})', ctx.get("endereco") or "")
+    return (f"{cep_match.group(1)}{cep_match.group(2)}",) if cep_match else None
+
+def _documento_contexto(ctx: dict, dep: dict):
+    return (re.sub(r'\D', '', ctx["identificador"]),)
+
+registro_fontes.registrar(FonteEnriquecimento(
+    "viacep", buscar_cep_viacep,
+    entrada=_cep_contexto,
+    tipos=("cpf", "cnpj", "endereco"), timeout=5, tentativas=2, cache_ttl=30 * DIA, max_concorrencia=10
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "nominatim", buscar_nominatim,
+    entrada=lambda ctx, dep: (
+        dep["viacep"].get("logradouro", ""), dep["viacep"].get("localidade", ""), dep["viacep"].get("uf", "")
+    ),
+    tipos=("cpf", "cnpj", "endereco"), depende_de=("viacep",), timeout=5, cache_ttl=30 * DIA, max_concorrencia=2
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "overpass", buscar_overpass_api,
+    entrada=lambda ctx, dep: (dep["nominatim"].get("latitude", 0), dep["nominatim"].get("longitude", 0)),
+    tipos=("endereco",), depende_de=("nominatim",), timeout=10, cache_ttl=7 * DIA, max_concorrencia=2
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "wikipedia", buscar_wikipedia, entrada=_nome_contexto, timeout=5, cache_ttl=7 * DIA
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "wikidata", buscar_wikidata, entrada=_nome_contexto, timeout=8, cache_ttl=7 * DIA
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "cnae", buscar_cnae_ibge, entrada=_cnae_contexto,
+    tipos=("cnpj",), timeout=5, tentativas=2, cache_ttl=90 * DIA, max_concorrencia=10
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "gravatar", buscar_gravatar, entrada=_email_contexto, tipos=("cpf",), timeout=5, cache_ttl=7 * DIA
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "receitaws", buscar_cnpj_receitaws, entrada=_documento_contexto,
+    tipos=("cnpj",), timeout=5, cache_ttl=1 * DIA, max_concorrencia=1  # 3 consultas/min no plano gratuito
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "brasilapi", buscar_cnpj_brasilapi, entrada=_documento_contexto,
+    tipos=("cnpj",), timeout=5, tentativas=2, cache_ttl=1 * DIA, max_concorrencia=10
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "licitacoes_federais", buscar_licitacoes_dadosabertos, entrada=_documento_contexto,
+    tipos=("cnpj",), timeout=10, cache_ttl=1 * DIA
+))
+registro_fontes.registrar(FonteEnriquecimento(
+    "transparencia_federal", buscar_transparencia_gastos, entrada=lambda ctx, dep: (ctx["identificador"], ctx["tipo"]),
+    timeout=8, cache_ttl=1 * DIA, max_concorrencia=3
+))
+registro_fontes.desativar(*FONTES_DESATIVADAS)
+
 def calcular_risk_score_juridico(dados: dict, tipo: str) -> dict:
     """
     Calcula score de risco jurídico baseado em critérios legais
@@ -2766,98 +2615,19 @@ def parse_nome_resultado(resultado_texto: str) -> dict:
     
     return data
 
-def get_user_statistics(username: str, is_admin: bool = False):
+# Snapshot das estatísticas da home (LRU em memória + Redis opcional)
+STATS_CACHE_TTL = int(os.environ.get("STATS_CACHE_TTL", "60"))
+stats_cache = init_cache_estatisticas(ttl=STATS_CACHE_TTL)
+
+async def get_user_statistics(username: str, is_admin: bool = False):
     """Retorna estatísticas do usuário ou sistema (se admin)"""
-    stats = {}
-    
+    stats = await stats_cache.get(username, is_admin)
+    if stats is not None:
+        return stats
+
     try:
-        # Total de consultas
-        if is_admin:
-            cursor.execute("SELECT COUNT(*) FROM searches")
-        else:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ?", (username,))
-        stats['total_consultas'] = cursor.fetchone()[0]
-        
-        # Consultas hoje
-        if is_admin:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE DATE(searched_at) = DATE('now', 'localtime')")
-        else:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ? AND DATE(searched_at) = DATE('now', 'localtime')", (username,))
-        stats['consultas_hoje'] = cursor.fetchone()[0]
-        
-        # Consultas esta semana
-        if is_admin:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE DATE(searched_at) >= DATE('now', 'localtime', '-7 days')")
-        else:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ? AND DATE(searched_at) >= DATE('now', 'localtime', '-7 days')", (username,))
-        stats['consultas_semana'] = cursor.fetchone()[0]
-        
-        # Consultas este mês
-        if is_admin:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE DATE(searched_at) >= DATE('now', 'localtime', '-30 days')")
-        else:
-            cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ? AND DATE(searched_at) >= DATE('now', 'localtime', '-30 days')", (username,))
-        stats['consultas_mes'] = cursor.fetchone()[0]
-        
-        # Consultas por dia (últimos 7 dias)
-        if is_admin:
-            cursor.execute("""
-                SELECT DATE(searched_at) as data, COUNT(*) as total 
-                FROM searches 
-                WHERE DATE(searched_at) >= DATE('now', 'localtime', '-7 days')
-                GROUP BY DATE(searched_at)
-                ORDER BY data DESC
-            """)
-        else:
-            cursor.execute("""
-                SELECT DATE(searched_at) as data, COUNT(*) as total 
-                FROM searches 
-                WHERE username = ? AND DATE(searched_at) >= DATE('now', 'localtime', '-7 days')
-                GROUP BY DATE(searched_at)
-                ORDER BY data DESC
-            """, (username,))
-        stats['consultas_por_dia'] = cursor.fetchall()
-        
-        # Horário de pico (hora com mais consultas)
-        if is_admin:
-            cursor.execute("""
-                SELECT strftime('%H', searched_at) as hora, COUNT(*) as total
-                FROM searches
-                GROUP BY hora
-                ORDER BY total DESC
-                LIMIT 1
-            """)
-        else:
-            cursor.execute("""
-                SELECT strftime('%H', searched_at) as hora, COUNT(*) as total
-                FROM searches
-                WHERE username = ?
-                GROUP BY hora
-                ORDER BY total DESC
-                LIMIT 1
-            """, (username,))
-        pico = cursor.fetchone()
-        stats['horario_pico'] = f"{pico[0]}:00" if pico else "N/A"
-        stats['consultas_pico'] = pico[1] if pico else 0
-        
-        # Se for admin, busca top usuários
-        if is_admin:
-            cursor.execute("""
-                SELECT username, COUNT(*) as total
-                FROM searches
-                WHERE username IS NOT NULL AND username NOT IN ('admin', 'None', 'T')
-                GROUP BY username
-                ORDER BY total DESC
-                LIMIT 5
-            """)
-            stats['top_usuarios'] = cursor.fetchall()
-        else:
-            stats['top_usuarios'] = []
-        
-        # Total de favoritos
-        cursor.execute("SELECT COUNT(*) FROM favorites WHERE username = ?", (username,))
-        stats['total_favoritos'] = cursor.fetchone()[0]
-        
+        stats = await repositorio.estatisticas_consultas(username, is_admin)
+        await stats_cache.set(username, is_admin, stats)
     except Exception as e:
         # Em caso de erro, retorna estatísticas zeradas
         stats = {
@@ -2932,8 +2702,7 @@ async def do_login(request: Request, username: str = Form(...), password: str =
         })
     
     # Verificar credenciais com suporte a migração automática de bcrypt
-    cursor.execute("SELECT id, is_admin, status, senha_temporaria, password FROM users WHERE username = ?", (username,))
-    user_row = cursor.fetchone()
+    user_row = await repositorio.buscar_usuario_login(username)
     
     if not user_row:
         # Usuário não existe
@@ -2988,13 +2757,12 @@ async def do_login(request: Request, username: str = Form(...), password: str =
         
         # Fazer upgrade de senha para bcrypt se ainda em texto plano
         if not is_bcrypt:
-            upgrade_password_to_bcrypt(user_id, password)
+            await upgrade_password_to_bcrypt(user_id, password)
             record_audit_log("PASSWORD_UPGRADED_TO_BCRYPT", username, client_ip, "Senha migrada para bcrypt")
         
         # Atualizar último login
         try:
-            cursor.execute("UPDATE users SET ultimo_login = CURRENT_TIMESTAMP WHERE id = ?", (user_id,))
-            conn.commit()
+            await repositorio.registrar_ultimo_login(user_id)
         except:
             pass  # Se a coluna não existir, ignora
         
@@ -3113,11 +2881,7 @@ async def processar_mudanca_senha_obrigatoria(request: Request,
     # Atualizar senha e marcar que mudou (com hash bcrypt)
     try:
         hashed_password = hash_password(nova_senha)
-        cursor.execute(
-            "UPDATE users SET password = ?, senha_temporaria = 0 WHERE username = ?",
-            (hashed_password, username)
-        )
-        conn.commit()
+        await repositorio.atualizar_senha_temporaria(username, hashed_password)
         
         record_audit_log("SENHA_ALTERADA_OBRIGATORIA", username, client_ip, "Alterou senha padrão com sucesso (bcrypt)")
         
@@ -3163,11 +2927,7 @@ async def get_consulta_details(request: Request, search_id: int):
     username = request.cookies.get("auth_user")
     
     # Buscar consulta do usuário
-    cursor.execute(
-        "SELECT id, identifier, response, searched_at FROM searches WHERE id = ? AND username = ?",
-        (search_id, username)
-    )
-    search = cursor.fetchone()
+    search = await repositorio.buscar_consulta(search_id, username)
     
     if not search:
         return JSONResponse({"success": False, "error": "Consulta não encontrada"})
@@ -3201,11 +2961,7 @@ async def view_resultado_completo(request: Request, search_id: int):
     username = request.cookies.get("auth_user")
     
     # Buscar consulta do usuário
-    cursor.execute(
-        "SELECT id, identifier, response FROM searches WHERE id = ? AND username = ?",
-        (search_id, username)
-    )
-    search = cursor.fetchone()
+    search = await repositorio.buscar_consulta(search_id, username)
     
     if not search:
         return "<h1>Consulta não encontrada</h1>"
@@ -3225,18 +2981,18 @@ async def view_resultado_completo(request: Request, search_id: int):
 # Rotas do Sistema
 # ----------------------
 @app.get("/", response_class=HTMLResponse)
-def form(request: Request):
+async def form(request: Request):
     # Validar sessão do usuário
-    session_error = validate_user_session(request)
+    session_error = await validate_user_session(request)
     if session_error:
         return session_error
     
     # Obter estatísticas para o dashboard
     username = request.cookies.get("auth_user")
-    is_admin = is_admin_username(username)
+    is_admin = await is_admin_username(username)
     
     # Estatísticas do usuário
-    stats = get_user_statistics(username, is_admin)
+    stats = await get_user_statistics(username, is_admin)
     
     csrf_token = get_or_create_csrf_token(request)
     return templates.TemplateResponse("modern-form.html", {
@@ -3246,13 +3002,13 @@ def form(request: Request):
     })
 
 @app.get("/admin/dashboard", response_class=HTMLResponse)
-def admin_dashboard(request: Request):
+async def admin_dashboard(request: Request):
     """Dashboard administrativo com estatísticas e gráficos"""
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
     # Verificar se é admin
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/")
     
     # Verificar expiração de sessão
@@ -3270,48 +3026,10 @@ def admin_dashboard(request: Request):
     record_audit_log("ACCESS_ADMIN_DASHBOARD", username, client_ip, "Acessou dashboard administrativo")
     
     # Obter estatísticas globais (admin)
-    stats = get_user_statistics(username, is_admin=True)
-    
-    # Obter dados adicionais para gráficos
-    # Consultas dos últimos 30 dias
-    cursor.execute("""
-        SELECT DATE(searched_at) as dia, COUNT(*) as total
-        FROM searches
-        WHERE DATE(searched_at) >= DATE('now', '-30 days')
-        GROUP BY DATE(searched_at)
-        ORDER BY dia
-    """)
-    consultas_30_dias = cursor.fetchall()
-    
-    # Top 10 usuários (excluindo admin, None, T)
-    cursor.execute("""
-        SELECT username, COUNT(*) as total
-        FROM searches
-        WHERE username IS NOT NULL AND username NOT IN ('admin', 'None', 'T')
-        GROUP BY username
-        ORDER BY total DESC
-        LIMIT 10
-    """)
-    top_usuarios = cursor.fetchall()
-    
-    # Consultas por hora do dia
-    cursor.execute("""
-        SELECT CAST(strftime('%H', searched_at) AS INTEGER) as hora, COUNT(*) as total
-        FROM searches
-        GROUP BY hora
-        ORDER BY hora
-    """)
-    consultas_por_hora = cursor.fetchall()
-    
-    # Total de usuários
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_usuarios = cursor.fetchone()[0]
-    
-    # Adicionar dados aos stats
-    stats['consultas_ultimos_30_dias'] = [(row[0], row[1]) for row in consultas_30_dias]
-    stats['top_usuarios'] = top_usuarios
-    stats['consultas_por_hora'] = consultas_por_hora
-    stats['total_usuarios'] = total_usuarios
+    stats = await get_user_statistics(username, is_admin=True)
+    
+    # Obter dados adicionais para gráficos (em um dict novo: stats pode ser o snapshot em cache)
+    stats = {**stats, **(await repositorio.estatisticas_dashboard())}
     
     return templates.TemplateResponse("admin_dashboard.html", {
         "request": request,
@@ -3328,7 +3046,7 @@ async def consulta_stream(request: Request):
     Envia resultados parciais conforme ficam prontos
     """
     # Validar sessão
-    session_error = validate_user_session(request)
+    session_error = await validate_user_session(request)
     if session_error:
         return JSONResponse({"erro": "Sessão inválida"}, status_code=401)
     
@@ -3348,7 +3066,7 @@ async def consulta_stream(request: Request):
     
     # Tentar obter do cache primeiro
     tipo = tipo_manual or detect_tipo(identificador)
-    resultado_cache = await cache_manager.get(tipo, identificador)
+    resultado_cache = await cache_redis.cache_manager.get(tipo, identificador)
     
     if resultado_cache:
         # Se estiver em cache, retornar resultado completo imediatamente
@@ -3393,7 +3111,7 @@ async def consulta_stream(request: Request):
             
             # Salvar em cache
             if dados_estruturados:
-                await cache_manager.set(
+                await cache_redis.cache_manager.set(
                     tipo, 
                     identificador, 
                     {
@@ -3417,7 +3135,7 @@ async def consulta_stream(request: Request):
 
 async def do_consulta(request: Request):
     # Validar sessão do usuário
-    session_error = validate_user_session(request)
+    session_error = await validate_user_session(request)
     if session_error:
         return session_error
     
@@ -3499,11 +3217,8 @@ async def do_consulta(request: Request):
             
             # Salvar no histórico
             try:
-                cursor.execute(
-                    "INSERT INTO searches (identifier, response, username) VALUES (?, ?, ?)", 
-                    (f"{identificador}/{oab_estado}", resultado, username)
-                )
-                conn.commit()
+                await repositorio.salvar_consulta(f"{identificador}/{oab_estado}", resultado, username)
+                await stats_cache.invalidar(username)
             except Exception as save_err:
                 print(f"⚠️ Erro ao salvar no histórico: {str(save_err)}")
             
@@ -3587,11 +3302,8 @@ async def do_consulta(request: Request):
         if not resultado.startswith("❌"):
             try:
                 username = request.cookies.get("auth_user")
-                cursor.execute(
-                    "INSERT INTO searches (identifier, response, username) VALUES (?, ?, ?)", 
-                    (identificador, resultado, username)
-                )
-                conn.commit()
+                await repositorio.salvar_consulta(identificador, resultado, username)
+                await stats_cache.invalidar(username)
             except Exception as save_err:
                 print(f"⚠️ Erro ao salvar no histórico: {str(save_err)}")
         
@@ -3643,51 +3355,24 @@ async def do_consulta(request: Request):
         })
 
 @app.get("/historico", response_class=HTMLResponse)
-def historico(request: Request):
+async def historico(request: Request, cursor: str = ""):
     # Validar sessão do usuário
-    session_error = validate_user_session(request)
+    session_error = await validate_user_session(request)
     if session_error:
         return session_error
     
     username = request.cookies.get("auth_user")
-    cursor.execute("""
-        SELECT s.id, s.identifier, s.response, s.searched_at, 
-               CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
-        FROM searches s
-        LEFT JOIN favorites f ON s.id = f.search_id AND f.username = ?
-        WHERE s.username = ?
-        ORDER BY s.searched_at DESC
-        LIMIT 100
-    """, (username, username))
-    searches = cursor.fetchall()
-    
-    consultas = []
-    for s in searches:
-        # Buscar notas
-        cursor.execute("SELECT note, created_at FROM notes WHERE search_id = ? ORDER BY created_at DESC LIMIT 1", (s[0],))
-        note_row = cursor.fetchone()
-        note_text = note_row[0] if note_row else None
-        note_date = format_timestamp_br(note_row[1]) if note_row else None
-        
-        # Buscar tags
-        cursor.execute("SELECT tag_name FROM tags WHERE search_id = ? ORDER BY created_at", (s[0],))
-        tags_rows = cursor.fetchall()
-        tags_list = [t[0] for t in tags_rows]
-        
-        consultas.append({
-            "id": s[0], 
-            "id_alvo": s[1], 
-            "data": format_timestamp_br(s[3]), 
-            "response": s[2],
-            "is_favorite": s[4] == 1,
-            "note": note_text,
-            "note_date": note_date,
-            "tags": tags_list
-        })
+    pagina, proximo = await repositorio.listar_historico(
+        username,
+        limite=HISTORICO_POR_PAGINA,
+        apos=repositorio.decodificar_cursor(cursor)
+    )
+    consultas = [montar_consulta_historico(c) for c in pagina]
     
     return templates.TemplateResponse("historico.html", {
         "request": request, 
         "consultas": consultas,
+        "proximo_url": f"/historico?{urllib.parse.urlencode({'cursor': proximo})}" if proximo else None,
         "csrf_token": get_or_create_csrf_token(request)
     })
 
@@ -3702,17 +3387,13 @@ async def reverse_search_phone(request: Request, phone: str):
     
     username = request.cookies.get("auth_user")
     client_ip = get_client_ip(request)
-    is_admin = request_is_admin(request)
+    is_admin = await request_is_admin(request)
     
     # Limpar telefone (remover caracteres especiais)
     phone_clean = ''.join(filter(str.isdigit, phone))
     
     # Buscar consultas: admin vê global, usuário comum vê apenas próprias
-    if is_admin:
-        cursor.execute("SELECT id, identifier, response FROM searches")
-    else:
-        cursor.execute("SELECT id, identifier, response FROM searches WHERE username = ?", (username,))
-    searches = cursor.fetchall()
+    searches = await repositorio.listar_respostas(None if is_admin else username)
     
     resultados = []
     cpf_adicionados = set()  # Evitar duplicatas
@@ -3759,17 +3440,13 @@ async def reverse_search_email(request: Request, email: str):
     
     username = request.cookies.get("auth_user")
     client_ip = get_client_ip(request)
-    is_admin = request_is_admin(request)
+    is_admin = await request_is_admin(request)
     
     # Email em lowercase
     email_lower = email.lower()
     
     # Buscar consultas: admin vê global, usuário comum vê apenas próprias
-    if is_admin:
-        cursor.execute("SELECT id, identifier, response FROM searches")
-    else:
-        cursor.execute("SELECT id, identifier, response FROM searches WHERE username = ?", (username,))
-    searches = cursor.fetchall()
+    searches = await repositorio.listar_respostas(None if is_admin else username)
     
     resultados = []
     cpf_adicionados = set()  # Evitar duplicatas
@@ -3815,17 +3492,13 @@ async def reverse_search_address(request: Request, address: str):
     
     username = request.cookies.get("auth_user")
     client_ip = get_client_ip(request)
-    is_admin = request_is_admin(request)
+    is_admin = await request_is_admin(request)
     
     # Normalizar endereço para comparação (remover acentos, lowercase)
     address_norm = address.lower().strip()
     
     # Buscar consultas: admin vê global, usuário comum vê apenas próprias
-    if is_admin:
-        cursor.execute("SELECT id, identifier, response FROM searches")
-    else:
-        cursor.execute("SELECT id, identifier, response FROM searches WHERE username = ?", (username,))
-    searches = cursor.fetchall()
+    searches = await repositorio.listar_respostas(None if is_admin else username)
     
     resultados = []
     cpf_adicionados = set()  # Evitar duplicatas
@@ -3866,7 +3539,7 @@ async def reverse_search_address(request: Request, address: str):
 @app.post("/historico/limpar")
 async def limpar_historico(request: Request, csrf_token: str = Form(...)):
     # Validar sessão do usuário
-    session_error = validate_user_session(request)
+    session_error = await validate_user_session(request)
     if session_error:
         return session_error
     
@@ -3880,8 +3553,8 @@ async def limpar_historico(request: Request, csrf_token: str = Form(...)):
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
     
     try:
-        cursor.execute("DELETE FROM searches WHERE username = ?", (username,))
-        conn.commit()
+        await repositorio.limpar_historico(username)
+        await stats_cache.invalidar(username)
         record_audit_log("CLEAR_HISTORY", username, client_ip, "Histórico limpo com sucesso")
         return JSONResponse({"success": True, "message": "Histórico limpo com sucesso"})
     except Exception as e:
@@ -3929,8 +3602,7 @@ async def export_historico_csv(request: Request):
         return RedirectResponse(url="/login", status_code=303)
     
     username = request.cookies.get("auth_user")
-    cursor.execute("SELECT id, identifier, response, searched_at FROM searches WHERE username = ? ORDER BY searched_at DESC", (username,))
-    searches = cursor.fetchall()
+    searches = await repositorio.listar_consultas(username)
     
     output = StringIO()
     writer = csv.writer(output)
@@ -3957,8 +3629,7 @@ async def export_historico_json(request: Request):
         return RedirectResponse(url="/login", status_code=303)
     
     username = request.cookies.get("auth_user")
-    cursor.execute("SELECT id, identifier, response, searched_at FROM searches WHERE username = ? ORDER BY searched_at DESC", (username,))
-    searches = cursor.fetchall()
+    searches = await repositorio.listar_consultas(username)
     
     data = [{"id": s[0], "identifier": s[1], "response": s[2], "searched_at": format_timestamp_br(s[3])} for s in searches]
     
@@ -3972,20 +3643,25 @@ async def export_historico_json(request: Request):
     )
 
 @app.get("/api/historico")
-def api_historico(request: Request):
+async def api_historico(request: Request, cursor: str = "", limite: int = HISTORICO_POR_PAGINA):
+    """
+    Resumos do histórico paginados por cursor (keyset em searched_at, id)
+
+    A resposta completa de cada item fica em /api/consulta/{id}.
+    Para a próxima página, repetir a chamada com ?cursor=<proximo_cursor>.
+    """
     if not request.cookies.get("auth_user"):
         raise HTTPException(status_code=401, detail="Não autorizado")
 
     username = request.cookies.get("auth_user")
-    if request_is_admin(request):
-        cursor.execute("SELECT id, identifier, response, searched_at FROM searches ORDER BY searched_at DESC LIMIT 100")
-    else:
-        cursor.execute(
-            "SELECT id, identifier, response, searched_at FROM searches WHERE username = ? ORDER BY searched_at DESC LIMIT 100",
-            (username,)
-        )
-    searches = cursor.fetchall()
-    return [{"id": s[0], "identifier": s[1], "response": s[2], "searched_at": s[3]} for s in searches]
+    is_admin = await request_is_admin(request)
+    limite = max(1, min(limite, API_HISTORICO_MAX_POR_PAGINA))
+    consultas, proximo = await repositorio.listar_resumos(
+        None if is_admin else username,
+        limite=limite,
+        apos=repositorio.decodificar_cursor(cursor)
+    )
+    return {"consultas": consultas, "proximo_cursor": proximo}
 
 # ----------------------
 # Painel de Admin
@@ -4004,17 +3680,11 @@ async def admin_logs(request: Request):
         response.delete_cookie("auth_time")
         return response
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/")
     
     # Buscar logs (últimos 500)
-    cursor.execute("""
-        SELECT id, action, username, ip_address, timestamp, details 
-        FROM audit_logs 
-        ORDER BY timestamp DESC 
-        LIMIT 500
-    """)
-    logs = cursor.fetchall()
+    logs = await repositorio.listar_logs(500)
     
     log_list = [
         {
@@ -4051,17 +3721,10 @@ async def list_users(request: Request):
         return response
     
     # Apenas admin pode gerenciar usuários
-    if not request_is_admin(request): 
+    if not await request_is_admin(request): 
         return RedirectResponse(url="/")
     
-    try:
-        # Tentar com as novas colunas
-        cursor.execute("SELECT id, username, is_admin, data_criacao, ultimo_login, status, numero_consultas FROM users ORDER BY data_criacao DESC")
-        usuarios = cursor.fetchall()
-    except sqlite3.OperationalError:
-        # Se falhar, usar query com colunas básicas + valores padrão
-        cursor.execute("SELECT id, username, is_admin, CURRENT_TIMESTAMP, NULL, 1, 0 FROM users ORDER BY id DESC")
-        usuarios = cursor.fetchall()
+    usuarios = await repositorio.listar_usuarios()
     
     csrf_token = get_or_create_csrf_token(request)
     return templates.TemplateResponse("usuarios.html", {
@@ -4083,7 +3746,7 @@ async def create_user(request: Request, new_user: str = Form(...), new_pass: str
         response.delete_cookie("auth_time")
         return response
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/", status_code=303)
     
     username = request.cookies.get("auth_user")
@@ -4102,13 +3765,7 @@ async def create_user(request: Request, new_user: str = Form(...), new_pass: str
     
     try:
         password_to_store = hash_password(new_pass)
-        if usar_senha_padrao:
-            cursor.execute("INSERT INTO users (username, password, is_admin, senha_temporaria) VALUES (?, ?, ?, 1)", 
-                         (new_user, password_to_store, 1 if admin else 0))
-        else:
-            cursor.execute("INSERT INTO users (username, password, is_admin, senha_temporaria) VALUES (?, ?, ?, 0)", 
-                         (new_user, password_to_store, 1 if admin else 0))
-        conn.commit()
+        await repositorio.criar_usuario(new_user, password_to_store, bool(admin), usar_senha_padrao)
         record_audit_log("CREATE_USER", username, client_ip, f"Novo usuário: {new_user}, admin: {bool(admin)}, senha padrão: {usar_senha_padrao}")
     except: 
         record_audit_log("CREATE_USER_FAILED", username, client_ip, f"Falha ao criar: {new_user}")
@@ -4128,13 +3785,12 @@ async def delete_user(request: Request, user_id: int):
         response.delete_cookie("auth_time")
         return response
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/", status_code=303)
     
     username = request.cookies.get("auth_user")
     client_ip = get_client_ip(request)
-    cursor.execute("DELETE FROM users WHERE id = ? AND is_admin = 0", (user_id,))
-    conn.commit()
+    await repositorio.remover_usuario(user_id)
     record_audit_log("DELETE_USER", username, client_ip, f"Usuário ID: {user_id} deletado")
     return RedirectResponse(url="/usuarios", status_code=303)
 
@@ -4147,7 +3803,7 @@ async def change_password(request: Request, user_id: int = Form(...), new_pass:
     if is_session_expired(request):
         return JSONResponse({"success": False, "error": "Sessão expirada"}, status_code=401)
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return JSONResponse({"success": False, "error": "Acesso negado"}, status_code=403)
     
     username = request.cookies.get("auth_user")
@@ -4165,15 +3821,13 @@ async def change_password(request: Request, user_id: int = Form(...), new_pass:
     
     try:
         # Verificar se o usuário existe
-        cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
+        user = await repositorio.buscar_usuario_por_id(user_id)
         if not user:
             return JSONResponse({"success": False, "error": "Usuário não encontrado"}, status_code=404)
         
         # Hash a nova senha com bcrypt
         hashed_password = hash_password(new_pass)
-        cursor.execute("UPDATE users SET password = ? WHERE id = ?", (hashed_password, user_id))
-        conn.commit()
+        await repositorio.atualizar_senha(user_id, hashed_password)
         record_audit_log("CHANGE_PASSWORD", username, client_ip, f"Senha alterada para usuário: {user[0]} (ID: {user_id}) (bcrypt)")
         return JSONResponse({"success": True, "message": "Senha alterada com sucesso"})
     except Exception as e:
@@ -4187,52 +3841,18 @@ async def change_password(request: Request, user_id: int = Form(...), new_pass:
 @app.get("/api/usuarios/stats")
 async def get_user_stats(request: Request):
     """Retorna estatísticas de usuários em JSON"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     try:
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
-        total_admins = cursor.fetchone()[0]
-        
-        # Tentar com a coluna 'status', se não existir usar valor padrão
-        try:
-            cursor.execute("SELECT COUNT(*) FROM users WHERE status = 1")
-            total_ativos = cursor.fetchone()[0]
-        except sqlite3.OperationalError:
-            total_ativos = total_users
-        
-        # Tentar com a coluna 'data_criacao', se não existir usar 0
-        try:
-            cursor.execute("SELECT COUNT(*) FROM users WHERE DATE(data_criacao) = DATE('now')")
-            users_hoje = cursor.fetchone()[0]
-        except sqlite3.OperationalError:
-            users_hoje = 0
-        
-        # Tentar com a coluna 'numero_consultas', se não existir usar 0
-        try:
-            cursor.execute("SELECT SUM(numero_consultas) FROM users")
-            total_consultas = cursor.fetchone()[0] or 0
-        except sqlite3.OperationalError:
-            total_consultas = 0
-        
-        return {
-            "total_users": total_users,
-            "total_admins": total_admins,
-            "total_operadores": total_users - total_admins,
-            "total_ativos": total_ativos,
-            "users_hoje": users_hoje,
-            "total_consultas": total_consultas
-        }
+        return await repositorio.estatisticas_usuarios()
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/usuarios/importar-csv")
 async def import_users_csv(request: Request, file: UploadFile = File(...), csrf_token: str = Form(...)):
     """Importa múltiplos usuários de um arquivo CSV"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/login", status_code=303)
     
     username = request.cookies.get("auth_user")
@@ -4248,24 +3868,18 @@ async def import_users_csv(request: Request, file: UploadFile = File(...), csrf_
         lines = content.decode('utf-8').split('\n')
         reader = csv.DictReader(lines)
         
-        added = 0
-        skipped = 0
-        
+        # Hash fora da transação (bcrypt é lento e seguraria o lock de escrita)
+        novos_usuarios = []
         for row in reader:
-            try:
-                new_user = row.get('username', '').strip()
-                new_pass = row.get('password', '').strip()
-                is_admin = int(row.get('is_admin', 0))
-                
-                if new_user and new_pass:
-                    hashed_password = hash_password(new_pass)
-                    cursor.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)",
-                                 (new_user, hashed_password, is_admin))
-                    added += 1
-            except sqlite3.IntegrityError:
-                skipped += 1
-        
-        conn.commit()
+            new_user = row.get('username', '').strip()
+            new_pass = row.get('password', '').strip()
+            is_admin = int(row.get('is_admin', 0))
+            
+            if new_user and new_pass:
+                novos_usuarios.append((new_user, hash_password(new_pass), is_admin))
+        
+        added, skipped = await repositorio.importar_usuarios(novos_usuarios)
+        
         record_audit_log("IMPORT_USERS_CSV", username, client_ip, f"Importado: {added} usuários, Ignorado: {skipped}")
         
         return {"success": True, "added": added, "skipped": skipped}
@@ -4276,7 +3890,7 @@ async def import_users_csv(request: Request, file: UploadFile = File(...), csrf_
 @app.post("/usuarios/mudar-permissao")
 async def toggle_user_permission(request: Request, user_id: int = Form(...), csrf_token: str = Form(...)):
     """Alterna permissões do usuário (Admin ↔ Operador)"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/login", status_code=303)
     
     username = request.cookies.get("auth_user")
@@ -4288,16 +3902,12 @@ async def toggle_user_permission(request: Request, user_id: int = Form(...), csr
         return JSONResponse({"success": False, "error": "Sessão inválida. Recarregue a página."}, status_code=403)
     
     try:
-        cursor.execute("SELECT is_admin, username FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
+        alterado = await repositorio.alternar_permissao(user_id)
         
-        if user and user[1] != "admin":  # Não permitir mudar admin padrão
-            novo_admin = 0 if user[0] == 1 else 1
-            cursor.execute("UPDATE users SET is_admin = ? WHERE id = ?", (novo_admin, user_id))
-            conn.commit()
-            
+        if alterado:
+            alvo, novo_admin = alterado
             novo_tipo = "ADMIN" if novo_admin else "OPERADOR"
-            record_audit_log("TOGGLE_PERMISSION", username, client_ip, f"Usuário {user[1]} mudado para {novo_tipo}")
+            record_audit_log("TOGGLE_PERMISSION", username, client_ip, f"Usuário {alvo} mudado para {novo_tipo}")
             return {"success": True, "new_role": novo_tipo}
         
         return {"error": "Usuário não encontrado ou protegido"}
@@ -4308,7 +3918,7 @@ async def toggle_user_permission(request: Request, user_id: int = Form(...), csr
 @app.post("/usuarios/ativar-desativar")
 async def toggle_user_status(request: Request, user_id: int = Form(...), csrf_token: str = Form(...)):
     """Ativa ou desativa um usuário"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/login", status_code=303)
     
     username = request.cookies.get("auth_user")
@@ -4320,16 +3930,12 @@ async def toggle_user_status(request: Request, user_id: int = Form(...), csrf_to
         return JSONResponse({"success": False, "error": "Sessão inválida. Recarregue a página."}, status_code=403)
     
     try:
-        cursor.execute("SELECT status, username FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
+        alterado = await repositorio.alternar_status(user_id)
         
-        if user:
-            novo_status = 0 if user[0] == 1 else 1
-            cursor.execute("UPDATE users SET status = ? WHERE id = ?", (novo_status, user_id))
-            conn.commit()
-            
+        if alterado:
+            alvo, novo_status = alterado
             novo_estado = "ATIVO" if novo_status else "INATIVO"
-            record_audit_log("TOGGLE_STATUS", username, client_ip, f"Usuário {user[1]} mudado para {novo_estado}")
+            record_audit_log("TOGGLE_STATUS", username, client_ip, f"Usuário {alvo} mudado para {novo_estado}")
             return {"success": True, "new_status": novo_estado}
         
         return {"error": "Usuário não encontrado"}
@@ -4340,19 +3946,11 @@ async def toggle_user_status(request: Request, user_id: int = Form(...), csrf_to
 @app.get("/usuarios/exportar-csv")
 async def export_users_csv(request: Request):
     """Exporta lista de usuários em CSV"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/login", status_code=303)
     
     try:
-        # Tentar com todas as colunas novas primeiro
-        try:
-            cursor.execute("SELECT username, is_admin, data_criacao, status FROM users")
-            usuarios = cursor.fetchall()
-        except sqlite3.OperationalError:
-            # Fallback para bancos antigos - sem data_criacao
-            cursor.execute("SELECT username, is_admin, status FROM users")
-            resultado_antigo = cursor.fetchall()
-            usuarios = [(u[0], u[1], None, u[2] if len(u) > 2 else 1) for u in resultado_antigo]
+        usuarios = await repositorio.exportar_usuarios()
         
         output = StringIO()
         writer = csv.writer(output)
@@ -4378,7 +3976,7 @@ async def export_users_csv(request: Request):
 @app.get("/test-telegram")
 async def test_telegram(request: Request):
     """Endpoint para testar conexão com Telegram"""
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     try:
@@ -4434,8 +4032,8 @@ async def add_favorite(request: Request, search_id: int, csrf_token: str = Form(
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
     try:
-        cursor.execute("INSERT INTO favorites (search_id, username) VALUES (?, ?)", (search_id, username))
-        conn.commit()
+        await repositorio.adicionar_favorito(search_id, username)
+        await stats_cache.invalidar(username)
         record_audit_log("ADD_FAVORITE", username, client_ip, f"Consulta ID: {search_id}")
         return {"success": True, "message": "Adicionado aos favoritos"}
     except:
@@ -4455,8 +4053,8 @@ async def remove_favorite(request: Request, search_id: int, csrf_token: str = Fo
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
     try:
-        cursor.execute("DELETE FROM favorites WHERE search_id = ? AND username = ?", (search_id, username))
-        conn.commit()
+        await repositorio.remover_favorito(search_id, username)
+        await stats_cache.invalidar(username)
         record_audit_log("REMOVE_FAVORITE", username, client_ip, f"Consulta ID: {search_id}")
         return {"success": True, "message": "Removido dos favoritos"}
     except:
@@ -4469,39 +4067,7 @@ async def get_favorites(request: Request):
         return RedirectResponse(url="/login")
     
     username = request.cookies.get("auth_user")
-    cursor.execute("""
-        SELECT s.id, s.identifier, s.response, s.searched_at, 
-               CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
-        FROM searches s
-        INNER JOIN favorites f ON s.id = f.search_id
-        WHERE f.username = ?
-        ORDER BY f.created_at DESC
-    """, (username,))
-    favorites = cursor.fetchall()
-    
-    consultas = []
-    for f in favorites:
-        # Buscar notas
-        cursor.execute("SELECT note, created_at FROM notes WHERE search_id = ? ORDER BY created_at DESC LIMIT 1", (f[0],))
-        note_row = cursor.fetchone()
-        note_text = note_row[0] if note_row else None
-        note_date = format_timestamp_br(note_row[1]) if note_row else None
-        
-        # Buscar tags
-        cursor.execute("SELECT tag_name FROM tags WHERE search_id = ? ORDER BY created_at", (f[0],))
-        tags_rows = cursor.fetchall()
-        tags_list = [t[0] for t in tags_rows]
-        
-        consultas.append({
-            "id": f[0], 
-            "id_alvo": f[1], 
-            "data": format_timestamp_br(f[3]), 
-            "response": f[2],
-            "is_favorite": True,
-            "note": note_text,
-            "note_date": note_date,
-            "tags": tags_list
-        })
+    consultas = [montar_consulta_historico(c) for c in await repositorio.listar_favoritos(username)]
     
     return templates.TemplateResponse("historico.html", {
         "request": request, 
@@ -4527,18 +4093,8 @@ async def add_note(request: Request, search_id: int = Form(...), note: str = For
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
     try:
-        # Verificar se já existe nota
-        cursor.execute("SELECT id FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
-        existing = cursor.fetchone()
+        await repositorio.salvar_nota(search_id, username, note)
         
-        if existing:
-            # Atualizar nota existente
-            cursor.execute("UPDATE notes SET note = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (note, existing[0]))
-        else:
-            # Criar nova nota
-            cursor.execute("INSERT INTO notes (search_id, username, note) VALUES (?, ?, ?)", (search_id, username, note))
-        
-        conn.commit()
         record_audit_log("ADD_NOTE", username, client_ip, f"Consulta ID: {search_id}")
         return {"success": True, "message": "Nota salva com sucesso"}
     except Exception as e:
@@ -4551,8 +4107,7 @@ async def get_note(request: Request, search_id: int):
         return {"success": False, "error": "Não autenticado"}
     
     username = request.cookies.get("auth_user")
-    cursor.execute("SELECT note, updated_at FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
-    note = cursor.fetchone()
+    note = await repositorio.buscar_nota(search_id, username)
     
     if note:
         return {"success": True, "note": note[0], "updated_at": format_timestamp_br(note[1])}
@@ -4572,8 +4127,7 @@ async def delete_note(request: Request, search_id: int):
         record_audit_log("INVALID_CSRF_DELETE_NOTE", username, client_ip, f"Consulta ID: {search_id}")
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
-    cursor.execute("DELETE FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
-    conn.commit()
+    await repositorio.remover_nota(search_id, username)
     record_audit_log("DELETE_NOTE", username, client_ip, f"Consulta ID: {search_id}")
     return {"success": True, "message": "Nota deletada"}
 
@@ -4594,8 +4148,7 @@ async def add_tag(request: Request, search_id: int = Form(...), tag_name: str =
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
     try:
-        cursor.execute("INSERT INTO tags (search_id, tag_name, username) VALUES (?, ?, ?)", (search_id, tag_name, username))
-        conn.commit()
+        await repositorio.adicionar_tag(search_id, tag_name, username)
         record_audit_log("ADD_TAG", username, client_ip, f"Consulta ID: {search_id}, Tag: {tag_name}")
         return {"success": True, "message": "Tag adicionada"}
     except:
@@ -4615,8 +4168,7 @@ async def remove_tag(request: Request, tag_id: int):
         record_audit_log("INVALID_CSRF_REMOVE_TAG", username, client_ip, f"Tag ID: {tag_id}")
         return JSONResponse({"success": False, "error": "Token CSRF inválido"}, status_code=403)
 
-    cursor.execute("DELETE FROM tags WHERE id = ? AND username = ?", (tag_id, username))
-    conn.commit()
+    await repositorio.remover_tag(tag_id, username)
     record_audit_log("REMOVE_TAG", username, client_ip, f"Tag ID: {tag_id}")
     return {"success": True, "message": "Tag removida"}
 
@@ -4627,8 +4179,7 @@ async def get_tags(request: Request, search_id: int):
         return {"success": False, "tags": []}
     
     username = request.cookies.get("auth_user")
-    cursor.execute("SELECT id, tag_name FROM tags WHERE search_id = ? AND username = ?", (search_id, username))
-    tags = cursor.fetchall()
+    tags = await repositorio.listar_tags(search_id, username)
     return {"success": True, "tags": [{"id": t[0], "name": t[1]} for t in tags]}
 
 # ----------------------
@@ -4640,50 +4191,17 @@ async def relatorio_mensal(request: Request):
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     username = request.cookies.get("auth_user")
     
-    # Consultas por mês
-    cursor.execute("""
-        SELECT strftime('%Y-%m', searched_at) as mes, COUNT(*) as total
-        FROM searches
-        WHERE searched_at >= DATE('now', '-12 months')
-        GROUP BY mes
-        ORDER BY mes DESC
-    """)
-    consultas_mes = cursor.fetchall()
-    
-    # Usuários mais ativos no mês atual
-    cursor.execute("""
-        SELECT username, COUNT(*) as total
-        FROM searches
-        WHERE strftime('%Y-%m', searched_at) = strftime('%Y-%m', 'now')
-        GROUP BY username
-        ORDER BY total DESC
-        LIMIT 10
-    """)
-    usuarios_ativos = cursor.fetchall()
-    
-    # Logs de auditoria críticos
-    cursor.execute("""
-        SELECT action, COUNT(*) as total
-        FROM audit_logs
-        WHERE strftime('%Y-%m', timestamp) = strftime('%Y-%m', 'now')
-        GROUP BY action
-        ORDER BY total DESC
-    """)
-    logs_resumo = cursor.fetchall()
+    relatorio = await repositorio.relatorio_mensal()
     
     client_ip = get_client_ip(request)
     record_audit_log("GENERATE_MONTHLY_REPORT", username, client_ip, "Relatório mensal gerado")
     
-    return {
-        "consultas_por_mes": consultas_mes,
-        "usuarios_ativos": usuarios_ativos,
-        "logs_resumo": logs_resumo
-    }
+    return relatorio
 
 @app.get("/relatorios/usuario/{target_username}")
 async def relatorio_usuario(request: Request, target_username: str):
@@ -4691,45 +4209,17 @@ async def relatorio_usuario(request: Request, target_username: str):
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     username = request.cookies.get("auth_user")
     
-    # Total de consultas
-    cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ?", (target_username,))
-    total_consultas = cursor.fetchone()[0]
-    
-    # Consultas por dia
-    cursor.execute("""
-        SELECT DATE(searched_at) as data, COUNT(*) as total
-        FROM searches
-        WHERE username = ?
-        GROUP BY data
-        ORDER BY data DESC
-        LIMIT 30
-    """, (target_username,))
-    consultas_por_dia = cursor.fetchall()
-    
-    # Logs de auditoria
-    cursor.execute("""
-        SELECT action, timestamp, details
-        FROM audit_logs
-        WHERE username = ?
-        ORDER BY timestamp DESC
-        LIMIT 50
-    """, (target_username,))
-    logs = cursor.fetchall()
+    relatorio = await repositorio.relatorio_usuario(target_username)
     
     client_ip = get_client_ip(request)
     record_audit_log("GENERATE_USER_REPORT", username, client_ip, f"Relatório de: {target_username}")
     
-    return {
-        "username": target_username,
-        "total_consultas": total_consultas,
-        "consultas_por_dia": consultas_por_dia,
-        "logs": logs
-    }
+    return relatorio
 
 # ----------------------
 # BACKUP E MANUTENÇÃO
@@ -4740,21 +4230,20 @@ async def backup_database(request: Request):
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     username = request.cookies.get("auth_user")
     
     try:
-        import shutil
         from datetime import datetime as dt
         
         # Nome do arquivo de backup
         timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
         backup_file = f"{DB_FILE}.backup_{timestamp}.db"
         
-        # Copiar banco de dados
-        shutil.copy2(DB_FILE, backup_file)
+        # Cópia consistente com WAL (API de backup do SQLite), no executor do banco
+        await db.executar(db.backup, backup_file)
         
         client_ip = get_client_ip(request)
         record_audit_log("DATABASE_BACKUP", username, client_ip, f"Backup criado: {backup_file}")
@@ -4769,7 +4258,7 @@ async def cleanup_old_logs(request: Request, days: int = Form(90), csrf_token: s
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"error": "Acesso negado"}
     
     username = request.cookies.get("auth_user")
@@ -4782,10 +4271,7 @@ async def cleanup_old_logs(request: Request, days: int = Form(90), csrf_token: s
     
     try:
         # Remover logs de auditoria antigos
-        cursor.execute("DELETE FROM audit_logs WHERE timestamp < datetime('now', ?)", (f'-{days} days',))
-        deleted_logs = cursor.rowcount
-        
-        conn.commit()
+        deleted_logs = await repositorio.remover_logs_antigos(days)
         
         record_audit_log("CLEANUP_LOGS", username, client_ip, f"Removidos {deleted_logs} logs com mais de {days} dias")
         
@@ -4801,14 +4287,7 @@ async def health_check(request: Request):
     
     try:
         # Verificar banco de dados
-        cursor.execute("SELECT COUNT(*) FROM searches")
-        total_searches = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM audit_logs")
-        total_logs = cursor.fetchone()[0]
+        contagens = await repositorio.contagens_saude()
         
         # Tamanho do banco
         import os
@@ -4818,87 +4297,62 @@ async def health_check(request: Request):
             "status": "healthy",
             "database": {
                 "size_mb": round(db_size, 2),
-                "total_searches": total_searches,
-                "total_users": total_users,
-                "total_logs": total_logs
+                **contagens
             },
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/admin/enriquecimento")
+async def enrichment_sources_status(request: Request):
+    """Configuração, latência e taxa de acerto de cada fonte de enriquecimento"""
+    if not request.cookies.get("auth_user"):
+        return RedirectResponse(url="/login")
+    
+    if not await request_is_admin(request):
+        return {"error": "Acesso negado"}
+    
+    return {
+        "prazo_global": ENRIQUECIMENTO_PRAZO,
+        "fontes": registro_fontes.status(),
+        "limites_hosts": limite_taxa.limites.status(),
+        "coalescencia": coalescencia.coalescedor.status()
+    }
+
 # ----------------------
 # FILTROS NO HISTÓRICO
 # ----------------------
 @app.get("/historico/filtrar")
-async def filtrar_historico(request: Request, q: str = "", periodo: str = "30", ordem: str = "desc"):
-    """Filtra histórico por termo de busca e período"""
+async def filtrar_historico(request: Request, q: str = "", periodo: str = "30", ordem: str = "relevancia", cursor: str = ""):
+    """Filtra histórico por termo de busca (índice FTS5, ordenado por relevância) e período"""
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
     username = request.cookies.get("auth_user")
     
-    # Construir query com filtros
-    where_clauses = ["s.username = ?"]
-    params = [username, username]  # username para WHERE e para LEFT JOIN
-    
-    # Filtro de período
-    if periodo == "7":
-        where_clauses.append("DATE(s.searched_at) >= DATE('now', '-7 days')")
-    elif periodo == "30":
-        where_clauses.append("DATE(s.searched_at) >= DATE('now', '-30 days')")
-    elif periodo == "90":
-        where_clauses.append("DATE(s.searched_at) >= DATE('now', '-90 days')")
-    
-    # Filtro de busca
-    if q:
-        where_clauses.append("(s.identifier LIKE ? OR s.response LIKE ?)")
-        params.extend([f"%{q}%", f"%{q}%"])
-    
-    # Ordenação
-    order_by = "s.searched_at DESC" if ordem == "desc" else "s.searched_at ASC"
-    
-    where_sql = " AND ".join(where_clauses)
-    
-    cursor.execute(f"""
-        SELECT s.id, s.identifier, s.response, s.searched_at,
-               CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
-        FROM searches s
-        LEFT JOIN favorites f ON s.id = f.search_id AND f.username = ?
-        WHERE {where_sql}
-        ORDER BY {order_by}
-        LIMIT 100
-    """, params)
-    
-    searches = cursor.fetchall()
-    
-    consultas = []
-    for s in searches:
-        # Buscar notas
-        cursor.execute("SELECT note, created_at FROM notes WHERE search_id = ? ORDER BY created_at DESC LIMIT 1", (s[0],))
-        note_row = cursor.fetchone()
-        note_text = note_row[0] if note_row else None
-        note_date = format_timestamp_br(note_row[1]) if note_row else None
-        
-        # Buscar tags
-        cursor.execute("SELECT tag_name FROM tags WHERE search_id = ? ORDER BY created_at", (s[0],))
-        tags_rows = cursor.fetchall()
-        tags_list = [t[0] for t in tags_rows]
-        
-        consultas.append({
-            "id": s[0], 
-            "id_alvo": s[1], 
-            "data": format_timestamp_br(s[3]), 
-            "response": s[2],
-            "is_favorite": s[4] == 1,
-            "note": note_text,
-            "note_date": note_date,
-            "tags": tags_list
-        })
+    # Filtro de período (qualquer outro valor = sem limite)
+    dias = int(periodo) if periodo in ("7", "30", "90") else None
+    
+    pagina, proximo = await repositorio.listar_historico(
+        username,
+        dias=dias,
+        termo=q,
+        ordem=ordem,
+        limite=HISTORICO_POR_PAGINA,
+        apos=repositorio.decodificar_cursor(cursor)
+    )
+    consultas = [montar_consulta_historico(c) for c in pagina]
+    
+    proximo_url = None
+    if proximo:
+        filtros = {"q": q, "periodo": periodo, "ordem": ordem, "cursor": proximo}
+        proximo_url = f"/historico/filtrar?{urllib.parse.urlencode(filtros)}"
     
     return templates.TemplateResponse("historico.html", {
         "request": request, 
         "consultas": consultas,
+        "proximo_url": proximo_url,
         "filtro_q": q,
         "filtro_periodo": periodo,
         "filtro_ordem": ordem
@@ -4913,7 +4367,7 @@ async def backup_usuarios_csv(request: Request):
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/")
     
     if is_session_expired(request):
@@ -4923,8 +4377,7 @@ async def backup_usuarios_csv(request: Request):
     client_ip = get_client_ip(request)
     
     # Buscar todos os usuários
-    cursor.execute("SELECT id, username, is_admin, status FROM users ORDER BY id")
-    usuarios = cursor.fetchall()
+    usuarios = await repositorio.listar_usuarios_backup()
     
     # Criar CSV
     output = StringIO()
@@ -4947,7 +4400,7 @@ async def backup_usuarios_json(request: Request):
     if not request.cookies.get("auth_user"):
         return RedirectResponse(url="/login")
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return RedirectResponse(url="/")
     
     if is_session_expired(request):
@@ -4957,8 +4410,7 @@ async def backup_usuarios_json(request: Request):
     client_ip = get_client_ip(request)
     
     # Buscar todos os usuários
-    cursor.execute("SELECT id, username, is_admin, status FROM users ORDER BY id")
-    usuarios = cursor.fetchall()
+    usuarios = await repositorio.listar_usuarios_backup()
     
     # Criar JSON
     data = {
@@ -4990,7 +4442,7 @@ async def restore_usuarios(request: Request):
     if not request.cookies.get("auth_user"):
         return {"success": False, "error": "Não autenticado"}
     
-    if not request_is_admin(request):
+    if not await request_is_admin(request):
         return {"success": False, "error": "Acesso negado"}
     
     if is_session_expired(request):
@@ -5021,16 +4473,7 @@ async def restore_usuarios(request: Request):
             return {"success": False, "error": "Arquivo JSON inválido"}
         
         # Restaurar usuários
-        restored = 0
-        for user in data["usuarios"]:
-            try:
-                cursor.execute("INSERT OR REPLACE INTO users (id, username, password, is_admin) VALUES (?, ?, ?, ?)",
-                             (user["id"], user["username"], user["password"], 1 if user.get("is_admin", False) else 0))
-                restored += 1
-            except:
-                pass
-        
-        conn.commit()
+        restored = await repositorio.restaurar_usuarios(data["usuarios"])
         record_audit_log("RESTORE_USUARIOS", username, client_ip, f"{restored} usuários restaurados")
         
         return {"success": True, "message": f"✅ {restored} usuários restaurados com sucesso"}
@@ -5047,11 +4490,11 @@ def auto_cleanup_logs():
     while True:
         try:
             time.sleep(86400)  # Espera 24 horas
-            cursor.execute("DELETE FROM audit_logs WHERE timestamp < datetime('now', '-2 days')")
-            deleted = cursor.rowcount
-            conn.commit()
+            deleted = repositorio.remover_logs_antigos.sincrono(2)
             if deleted > 0:
                 record_audit_log("AUTO_CLEANUP", "system", "127.0.0.1", f"Limpeza automática: {deleted} logs removidos")
+            # Respostas das fontes de enriquecimento além da janela stale
+            repositorio.remover_cache_fontes_expirado.sincrono(time.time())
         except Exception as e:
             print(f"Erro na limpeza automática de logs: {e}")
 
@@ -0,0 +1,155 @@
+"""
+Gravação do log de auditoria em lote
+Fila limitada em memória + thread que grava a cada N ms ou M linhas numa única transação
+"""
+import time
+import queue
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import database
+import repositorio
+
+logger = logging.getLogger(__name__)
+
+
+class AuditoriaBuffer:
+    """Pipeline do audit_logs: a rota só enfileira, a thread de flush grava"""
+
+    # Modos de durabilidade
+    # - lote: enfileira e retorna; perda máxima = conteúdo da fila num crash
+    # - imediato: cada chamada vira um INSERT+COMMIT próprio, no executor do banco (sem lote)
+    MODOS = ('lote', 'imediato')
+
+    def __init__(
+        self,
+        modo: str = 'lote',
+        intervalo_ms: int = 200,
+        tamanho_lote: int = 100,
+        max_fila: int = 10000,
+    ):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de auditoria inválido: {modo} (use {', '.join(self.MODOS)})")
+        self.modo = modo
+        self.intervalo = intervalo_ms / 1000
+        self.tamanho_lote = tamanho_lote
+        self._fila: "queue.Queue[tuple]" = queue.Queue(maxsize=max_fila)
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.gravados = 0
+        self.descartados = 0
+        self.lotes = 0
+
+    def iniciar(self):
+        """Inicia a thread de flush (no modo 'lote')"""
+        if self.modo != 'lote' or (self._thread and self._thread.is_alive()):
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="auditoria-flush", daemon=True)
+        self._thread.start()
+
+    def registrar(self, action: str, username: str, ip_address: str, details: str = ""):
+        """Registra uma ação; o timestamp é o do momento da chamada, não o do flush"""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        linha = (action, username, ip_address, timestamp, details)
+
+        if self.modo == 'imediato' or not self._thread:
+            self._gravar_no_executor([linha])
+            return
+
+        try:
+            self._fila.put_nowait(linha)
+        except queue.Full:
+            # Fila cheia (banco travado?): não bloqueia a rota, descarta e contabiliza
+            self.descartados += 1
+            if self.descartados % 1000 == 1:
+                logger.warning(f"⚠️ Fila de auditoria cheia: {self.descartados} entradas descartadas")
+
+    def _coletar(self) -> List[tuple]:
+        """Junta linhas até 'tamanho_lote' ou até 'intervalo' após a primeira chegar"""
+        try:
+            linhas = [self._fila.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+        prazo = time.monotonic() + self.intervalo
+        while len(linhas) < self.tamanho_lote and not self._parar.is_set():
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                linhas.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return linhas
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._gravar(self._coletar())
+        self.flush()
+
+    def _drenar(self, limite: Optional[int] = None) -> List[tuple]:
+        linhas = []
+        while limite is None or len(linhas) < limite:
+            try:
+                linhas.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return linhas
+
+    def _gravar(self, linhas: List[tuple]):
+        if not linhas:
+            return
+        try:
+            self.gravados += repositorio.registrar_logs_lote(linhas)
+            self.lotes += 1
+        except Exception as e:
+            self.descartados += len(linhas)
+            logger.error(f"❌ Erro ao gravar {len(linhas)} entradas de auditoria: {e}")
+
+    def _gravar_no_executor(self, linhas: List[tuple]):
+        """Gravação sem a thread de flush: no executor do banco, nunca na thread do event loop"""
+        db = database.db
+        if db is not None:
+            try:
+                db.executor.submit(self._gravar, linhas)
+                return
+            except RuntimeError:
+                pass  # executor já encerrado (shutdown): grava na própria chamada
+        self._gravar(linhas)
+
+    def flush(self):
+        """Grava tudo o que estiver na fila (em lotes de 'tamanho_lote')"""
+        while linhas := self._drenar(self.tamanho_lote):
+            self._gravar(linhas)
+
+    def encerrar(self, timeout: float = 5.0):
+        """Para a thread e grava o restante da fila (chamar no shutdown)"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        logger.info(f"📝 Auditoria encerrada: {self.gravados} gravadas, {self.descartados} descartadas")
+
+    def status(self) -> dict:
+        """Métricas da fila de auditoria"""
+        return {
+            'modo': self.modo,
+            'pendentes': self._fila.qsize(),
+            'gravados': self.gravados,
+            'descartados': self.descartados,
+            'lotes': self.lotes,
+        }
+
+
+# Instância global
+auditoria = None
+
+def init_auditoria(modo: str = 'lote', intervalo_ms: int = 200, tamanho_lote: int = 100, max_fila: int = 10000) -> AuditoriaBuffer:
+    """Inicializa a fila de auditoria e a thread de flush"""
+    global auditoria
+    auditoria = AuditoriaBuffer(modo, intervalo_ms, tamanho_lote, max_fila)
+    auditoria.iniciar()
+    return auditoria
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark da listagem do histórico
+Compara a montagem antiga (2 consultas por linha) com a atual (IN em lote) por tamanho de página
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+
+import database
+import repositorio
+from migrations import aplicar_migracoes
+
+
+def popular(db, username: str, total: int):
+    """Cria consultas com notas, tags e favoritos para o usuário"""
+    with db.transacao() as cursor:
+        for i in range(total):
+            cursor.execute(
+                "INSERT INTO searches (identifier, response, username, searched_at) VALUES (?, ?, ?, datetime('now', ?))",
+                (f"{random.randint(10**10, 10**11 - 1)}", "x" * 2000, username, f"-{i} minutes")
+            )
+            search_id = cursor.lastrowid
+            if i % 3 == 0:
+                cursor.execute("INSERT INTO notes (search_id, username, note) VALUES (?, ?, ?)", (search_id, username, f"nota {i}"))
+            for t in range(i % 4):
+                cursor.execute("INSERT INTO tags (search_id, tag_name, username) VALUES (?, ?, ?)", (search_id, f"tag{t}", username))
+            if i % 5 == 0:
+                cursor.execute("INSERT INTO favorites (search_id, username) VALUES (?, ?)", (search_id, username))
+
+
+def historico_n_mais_um(db, username: str, limite: int):
+    """Montagem anterior: última nota e tags consultadas linha a linha"""
+    with db.transacao() as cursor:
+        cursor.execute("""
+            SELECT s.id, s.identifier, s.response, s.searched_at,
+                   CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
+            FROM searches s
+            LEFT JOIN favorites f ON s.id = f.search_id AND f.username = ?
+            WHERE s.username = ?
+            ORDER BY s.searched_at DESC
+            LIMIT ?
+        """, (username, username, limite))
+        consultas = []
+        for s in cursor.fetchall():
+            cursor.execute("SELECT note, created_at FROM notes WHERE search_id = ? ORDER BY created_at DESC LIMIT 1", (s[0],))
+            note_row = cursor.fetchone()
+            cursor.execute("SELECT tag_name FROM tags WHERE search_id = ? ORDER BY created_at", (s[0],))
+            consultas.append((s, note_row, [t[0] for t in cursor.fetchall()]))
+        return consultas
+
+
+def medir(func, *args, repeticoes: int = 20) -> float:
+    """Mediana em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func(*args)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    tamanhos = [10, 50, 100, 250, 500, 1000]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.init_db(os.path.join(tmp, "bench.db"))
+        aplicar_migracoes(db)
+        popular(db, "bench", total)
+
+        print(f"📊 Histórico com {total} consultas (mediana de 20 execuções)\n")
+        print(f"{'linhas':>8} {'N+1 (ms)':>10} {'lote (ms)':>10} {'ganho':>7}")
+        for limite in tamanhos:
+            antigo = medir(historico_n_mais_um, db, "bench", limite)
+            atual = medir(repositorio.listar_historico.sincrono, "bench", None, "", "desc", limite)
+            print(f"{limite:>8} {antigo:>10.2f} {atual:>10.2f} {antigo / atual:>6.1f}x")
+
+        db.encerrar()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark da normalização de colunas monetárias do extrator do Portal da Transparência
+Compara o caminho antigo (.apply de _converter_valor_monetario célula a célula) com o vetorizado
+"""
+import sys
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from portal_transparencia_extrator import PortalTransparenciaAPI
+
+
+def gerar_valor(rng: random.Random, misto: bool):
+    """Valor no formato da API ("12.345,67") ou, se misto, em qualquer formato aceito"""
+    v = rng.uniform(0, 50000)
+    formato = rng.randrange(6) if misto else 0
+    if formato == 0:
+        return f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")  # 12.345,67
+    if formato == 1:
+        return f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")  # R$ 12.345,67
+    if formato == 2:
+        return f"{v:.2f}"  # 12345.67
+    if formato == 3:
+        return f"{v:.2f}".replace(".", ",")  # 12345,67
+    if formato == 4:
+        return round(v, 2)  # número
+    return rng.choice([None, ""])
+
+
+def gerar_dataframe(linhas: int, colunas: list, misto: bool) -> pd.DataFrame:
+    rng = random.Random(42)
+    dados = {coluna: [gerar_valor(rng, misto) for _ in range(linhas)] for coluna in colunas}
+    dados["nome"] = ["Fulano"] * linhas
+    return pd.DataFrame(dados)
+
+
+def normalizar_por_celula(cliente: PortalTransparenciaAPI, df: pd.DataFrame, colunas: list) -> pd.DataFrame:
+    """Caminho anterior: uma chamada Python por célula"""
+    for coluna in colunas:
+        df[coluna] = df[coluna].apply(cliente._converter_valor_monetario)
+    return df
+
+
+def medir(func, df: pd.DataFrame, *args, repeticoes: int = 5):
+    """Mediana em milissegundos (cada execução recebe uma cópia do DataFrame)"""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        copia = df.copy()
+        inicio = time.perf_counter()
+        resultado = func(copia, *args)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return tempos[len(tempos) // 2], resultado
+
+
+if __name__ == "__main__":
+    maximo = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tamanhos = [n for n in (1000, 10000, 100000, 500000) if n <= maximo] or [maximo]
+
+    cliente = PortalTransparenciaAPI(api_token="benchmark")
+    colunas = PortalTransparenciaAPI.COLUNAS_PAGAMENTOS[:4]
+
+    print(f"📊 Normalização de {len(colunas)} colunas monetárias (mediana de 5 execuções)")
+    for misto in (False, True):
+        print(f"\n{'Formatos misturados (texto, número, vazio)' if misto else 'Formato da API (12.345,67)'}")
+        print(f"{'linhas':>8} {'célula (ms)':>12} {'vetor (ms)':>11} {'ganho':>7}")
+        for linhas in tamanhos:
+            df = gerar_dataframe(linhas, colunas, misto)
+            antigo, esperado = medir(lambda d: normalizar_por_celula(cliente, d, colunas), df)
+            atual, obtido = medir(lambda d: cliente._normalizar_dataframe(d, colunas), df)
+
+            for coluna in colunas:
+                if not np.array_equal(esperado[coluna].to_numpy(float), obtido[coluna].to_numpy(float), equal_nan=True):
+                    print(f"❌ Resultado divergente na coluna {coluna}")
+                    sys.exit(1)
+
+            print(f"{linhas:>8} {antigo:>12.2f} {atual:>11.2f} {antigo / atual:>6.1f}x")
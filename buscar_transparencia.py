@@ -2,20 +2,23 @@
 Integração com Portal da Transparência - Endpoints que funcionam
 Utiliza chave de API: chave-api-dados
 Base URL: http://api.portaldatransparencia.gov.br/api-de-dados
+
+Cliente assíncrono: usa o pool HTTP compartilhado (cliente_http), que aplica a quota
+do host (limite_taxa) no lugar de pausas fixas após cada requisição
 """
 
-import requests
-import time
 import logging
 from typing import Dict, List, Any
 from datetime import datetime, timedelta
 
+from cliente_http import cliente_http
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class PortalTransparencia:
-    """Cliente para consumir APIs do Portal da Transparência"""
+    """Cliente assíncrono para consumir APIs do Portal da Transparência"""
     
     def __init__(self, api_key: str):
         self.api_key = api_key
@@ -24,15 +27,14 @@ class PortalTransparencia:
             "Accept": "application/json",
             "chave-api-dados": api_key
         }
-        self.rate_limit_delay = 0.5  # segundos entre requisições
     
-    def _make_request(self, endpoint: str, params: dict = None) -> dict:
+    async def _make_request(self, endpoint: str, params: dict = None) -> dict:
         """Fazer requisição com tratamento de erros e rate limiting"""
         try:
             url = f"{self.base_url}{endpoint}"
             logger.info(f"🔍 GET {endpoint}")
             
-            response = requests.get(
+            response = await cliente_http.get(
                 url,
                 headers=self.headers,
                 params=params,
@@ -40,7 +42,6 @@ class PortalTransparencia:
             )
             
             if response.status_code == 200:
-                time.sleep(self.rate_limit_delay)
                 # Verificar se response está vazio (válido para alguns endpoints)
                 if len(response.text.strip()) == 0:
                     return None
@@ -61,7 +62,7 @@ class PortalTransparencia:
             logger.error(f"❌ Erro na requisição: {str(e)}")
             return None
     
-    def buscar_servidor_por_cpf(self, cpf: str) -> Dict[str, Any]:
+    async def buscar_servidor_por_cpf(self, cpf: str) -> Dict[str, Any]:
         """
         Busca informações de servidor público por CPF
         Retorna dados de remuneração, situação, órgão, etc.
@@ -71,7 +72,7 @@ class PortalTransparencia:
         
         logger.info(f"📋 Buscando servidor com CPF: {cpf_limpo}")
         
-        response = self._make_request(
+        response = await self._make_request(
             '/servidores',
             params={'cpf': cpf_limpo, 'pagina': 1}
         )
@@ -117,7 +118,7 @@ class PortalTransparencia:
             logger.error(f"❌ Erro ao processar dados: {e}")
             return None
     
-    def buscar_bolsa_familia_por_cpf(self, cpf: str) -> List[Dict[str, Any]]:
+    async def buscar_bolsa_familia_por_cpf(self, cpf: str) -> List[Dict[str, Any]]:
         """
         Busca benefícios de Bolsa Família para um CPF
         """
@@ -125,7 +126,7 @@ class PortalTransparencia:
         
         logger.info(f"💰 Buscando Bolsa Família para CPF: {cpf_limpo}")
         
-        response = self._make_request(
+        response = await self._make_request(
             '/bolsa-familia-por-cpf-ou-nis',
             params={'cpf': cpf_limpo, 'pagina': 1}
         )
@@ -162,7 +163,7 @@ class PortalTransparencia:
         
         return resultado if resultado else None
     
-    def buscar_convenios_por_cnpj(self, cnpj: str) -> List[Dict[str, Any]]:
+    async def buscar_convenios_por_cnpj(self, cnpj: str) -> List[Dict[str, Any]]:
         """
         Busca convênios federais associados a um CNPJ
         """
@@ -175,7 +176,7 @@ class PortalTransparencia:
         data_inicio = (hoje - timedelta(days=30)).strftime('%d/%m/%Y')
         data_fim = hoje.strftime('%d/%m/%Y')
         
-        response = self._make_request(
+        response = await self._make_request(
             '/convenios',
             params={
                 'cnpjConvenente': cnpj_limpo,
@@ -222,7 +223,7 @@ class PortalTransparencia:
         
         return resultado if resultado else None
     
-    def buscar_licitacoes_por_cnpj(self, cnpj: str, dias: int = 30) -> List[Dict[str, Any]]:
+    async def buscar_licitacoes_por_cnpj(self, cnpj: str, dias: int = 30) -> List[Dict[str, Any]]:
         """
         Busca licitações associadas a um CNPJ nos últimos N dias
         """
@@ -234,7 +235,7 @@ class PortalTransparencia:
         data_inicio = (hoje - timedelta(days=dias)).strftime('%d/%m/%Y')
         data_fim = hoje.strftime('%d/%m/%Y')
         
-        response = self._make_request(
+        response = await self._make_request(
             '/licitacoes',
             params={
                 'cnpj': cnpj_limpo,
@@ -275,7 +276,7 @@ class PortalTransparencia:
         
         return resultado if resultado else None
     
-    def buscar_dados_pessoa_fisica(self, cpf: str) -> Dict[str, Any]:
+    async def buscar_dados_pessoa_fisica(self, cpf: str) -> Dict[str, Any]:
         """
         Busca informações gerais de uma pessoa física
         Retorna: se é servidor, beneficiário, sancionado, etc.
@@ -285,7 +286,7 @@ class PortalTransparencia:
         
         logger.info(f"📊 Buscando informações de pessoa física: {cpf_limpo}")
         
-        response = self._make_request(
+        response = await self._make_request(
             '/pessoa-fisica',
             params={'cpf': cpf_limpo}
         )
@@ -376,7 +377,7 @@ class PortalTransparencia:
             logger.error(f"❌ Erro ao processar dados de pessoa física: {e}")
             return None
     
-    def buscar_despesas_por_cpf(self, cpf: str, mes_ano: str = None) -> Dict[str, Any]:
+    async def buscar_despesas_por_cpf(self, cpf: str, mes_ano: str = None) -> Dict[str, Any]:
         """
         Busca despesas associadas a um CPF em um período específico
         mes_ano: formato "202401" ou None para últimas
@@ -389,7 +390,7 @@ class PortalTransparencia:
         if mes_ano:
             params['mesAno'] = mes_ano
         
-        response = self._make_request(
+        response = await self._make_request(
             '/despesas-por-beneficiario',
             params=params
         )
@@ -440,7 +441,7 @@ class PortalTransparencia:
             logger.error(f"❌ Erro ao buscar despesas: {e}")
             return None
     
-    def buscar_dados_pessoa_juridica(self, cnpj: str) -> Dict[str, Any]:
+    async def buscar_dados_pessoa_juridica(self, cnpj: str) -> Dict[str, Any]:
         """
         Busca informações gerais de uma empresa (Pessoa Jurídica)
         Retorna: razão social, fantasia, sanções, participações, etc.
@@ -450,7 +451,7 @@ class PortalTransparencia:
         
         logger.info(f"🏢 Buscando informações de pessoa jurídica: {cnpj_limpo}")
         
-        response = self._make_request(
+        response = await self._make_request(
             '/pessoa-juridica',
             params={'cnpj': cnpj_limpo}
         )
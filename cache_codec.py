@@ -0,0 +1,177 @@
+"""
+Codec dos valores gravados no cache Redis
+Serialização compacta (orjson, ou msgpack) + compressão (zstd ou lz4) acima de um
+tamanho mínimo; o primeiro byte identifica o formato, então entradas antigas em JSON
+puro continuam legíveis
+"""
+import os
+import json
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+class CodecCache:
+    """
+    Codifica/decodifica valores do cache
+
+    Cabeçalho de 1 byte = serialização | compressão. Os valores escolhidos nunca
+    iniciam um JSON válido ('{', '[', '"', dígito...), que é como começam as entradas
+    gravadas antes do codec (decodificadas como JSON puro).
+    """
+
+    # Serializações (bits baixos do cabeçalho)
+    JSON = 0x01      # orjson quando instalado, senão json da stdlib (mesmo formato)
+    MSGPACK = 0x02
+
+    # Compressões (bits altos do cabeçalho)
+    ZSTD = 0x10
+    LZ4 = 0x40
+
+    SERIALIZACOES = {'json': JSON, 'msgpack': MSGPACK}
+    COMPRESSOES = {'nenhuma': 0, 'zstd': ZSTD, 'lz4': LZ4}
+
+    # Todos os cabeçalhos válidos (0x01, 0x02, 0x11, 0x12, 0x41 'A', 0x42 'B')
+    CABECALHOS = frozenset({JSON, MSGPACK, JSON | ZSTD, MSGPACK | ZSTD, JSON | LZ4, MSGPACK | LZ4})
+
+    # Abaixo disso comprimir não compensa o custo de CPU
+    COMPRESSAO_MIN_BYTES = 1024
+
+    NIVEL_ZSTD = 3
+
+    def __init__(
+        self,
+        serializacao: Optional[str] = None,
+        compressao: str = 'zstd',
+        compressao_min_bytes: int = COMPRESSAO_MIN_BYTES
+    ):
+        # Padrão: orjson (mais rápido e mesma semântica do JSON antigo); msgpack se só ele existir
+        if not serializacao:
+            serializacao = 'msgpack' if orjson is None and msgpack is not None else 'json'
+        # Pacote opcional ausente: cai para o que estiver disponível
+        if serializacao == 'msgpack' and msgpack is None:
+            serializacao = 'json'
+        if compressao == 'zstd' and zstandard is None:
+            compressao = 'lz4'
+        if compressao == 'lz4' and lz4_frame is None:
+            compressao = 'nenhuma'
+
+        self.serializacao = serializacao
+        self.compressao = compressao
+        self.compressao_min_bytes = compressao_min_bytes
+        self._formato = self.SERIALIZACOES[serializacao]
+        self._flag_compressao = self.COMPRESSOES[compressao]
+        self._zstd_c = zstandard.ZstdCompressor(level=self.NIVEL_ZSTD) if zstandard else None
+        self._zstd_d = zstandard.ZstdDecompressor() if zstandard else None
+
+    # ---------- serialização ----------
+
+    @staticmethod
+    def _json_dumps(dados: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(dados, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(dados, default=str, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _json_loads(dados: bytes) -> Any:
+        return orjson.loads(dados) if orjson is not None else json.loads(dados)
+
+    def _serializar(self, dados: Any) -> bytes:
+        if self._formato == self.MSGPACK:
+            return msgpack.packb(dados, default=str, use_bin_type=True)
+        return self._json_dumps(dados)
+
+    def _desserializar(self, formato: int, corpo: bytes) -> Any:
+        if formato == self.MSGPACK:
+            if msgpack is None:
+                raise ValueError("Entrada do cache em msgpack, mas o pacote msgpack não está instalado")
+            return msgpack.unpackb(corpo, raw=False, strict_map_key=False)
+        if formato == self.JSON:
+            return self._json_loads(corpo)
+        raise ValueError(f"Formato de cache desconhecido: {formato:#04x}")
+
+    # ---------- compressão ----------
+
+    def _comprimir(self, corpo: bytes) -> bytes:
+        if self._flag_compressao == self.ZSTD:
+            return self._zstd_c.compress(corpo)
+        return lz4_frame.compress(corpo)
+
+    def _descomprimir(self, flag: int, corpo: bytes) -> bytes:
+        if flag == self.ZSTD:
+            if self._zstd_d is None:
+                raise ValueError("Entrada do cache em zstd, mas o pacote zstandard não está instalado")
+            return self._zstd_d.decompress(corpo)
+        if flag == self.LZ4:
+            if lz4_frame is None:
+                raise ValueError("Entrada do cache em lz4, mas o pacote lz4 não está instalado")
+            return lz4_frame.decompress(corpo)
+        raise ValueError(f"Compressão de cache desconhecida: {flag:#04x}")
+
+    # ---------- API ----------
+
+    def codificar(self, dados: Any) -> bytes:
+        """Objeto -> cabeçalho + corpo (comprimido se passar de compressao_min_bytes)"""
+        corpo = self._serializar(dados)
+        cabecalho = self._formato
+        if self._flag_compressao and len(corpo) >= self.compressao_min_bytes:
+            comprimido = self._comprimir(corpo)
+            if len(comprimido) < len(corpo):
+                corpo = comprimido
+                cabecalho |= self._flag_compressao
+        return bytes((cabecalho,)) + corpo
+
+    def decodificar(self, valor: Optional[bytes]) -> Any:
+        """Valor lido do Redis -> objeto (aceita também o JSON puro gravado antes do codec)"""
+        if valor is None:
+            return None
+        if isinstance(valor, str):
+            return json.loads(valor)
+        cabecalho = valor[0]
+        if cabecalho not in self.CABECALHOS:
+            return self._json_loads(valor)  # legado: JSON em texto
+        corpo = valor[1:]
+        flag = cabecalho & 0xF0
+        if flag:
+            corpo = self._descomprimir(flag, corpo)
+        return self._desserializar(cabecalho & 0x0F, corpo)
+
+    def status(self) -> dict:
+        return {
+            'serializacao': self.serializacao,
+            'json': 'orjson' if orjson is not None else 'json',
+            'compressao': self.compressao,
+            'compressao_min_bytes': self.compressao_min_bytes,
+        }
+
+
+# Instância global (CACHE_SERIALIZACAO=json|msgpack, CACHE_COMPRESSAO=zstd|lz4|nenhuma)
+codec = CodecCache(
+    os.environ.get('CACHE_SERIALIZACAO'),
+    os.environ.get('CACHE_COMPRESSAO', 'zstd'),
+    int(os.environ.get('CACHE_COMPRESSAO_MIN_BYTES', str(CodecCache.COMPRESSAO_MIN_BYTES)))
+)
+
+
+def init_codec(serializacao: Optional[str] = None, compressao: str = 'zstd', compressao_min_bytes: int = CodecCache.COMPRESSAO_MIN_BYTES) -> CodecCache:
+    """Reconfigura o codec usado nas próximas gravações (a leitura aceita todos os formatos)"""
+    global codec
+    codec = CodecCache(serializacao, compressao, compressao_min_bytes)
+    return codec
@@ -0,0 +1,128 @@
+"""
+Cache das estatísticas da página inicial
+Com Redis: fica no CacheManager, cujo L1 em memória é invalidado entre workers via pub/sub.
+Sem Redis: LRU em memória do próprio worker com TTL curto; invalidar() só alcança o worker
+atual e os demais podem servir o snapshot antigo por até 'ttl' segundos.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import cache_manager as cache_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEstatisticas:
+    """Snapshot das estatísticas por usuário e papel (user/admin)"""
+
+    # Tipo usado nas chaves do CacheManager (consulta:v{N}:stats:{hash})
+    TIPO_REDIS = 'stats'
+
+    PAPEIS = ('user', 'admin')
+
+    def __init__(self, ttl: int = 60, max_entradas: int = 1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _chave(username: str, is_admin: bool) -> str:
+        return f"{username}:{'admin' if is_admin else 'user'}"
+
+    @staticmethod
+    def _redis():
+        """CacheManager ativo (ou None se o Redis não foi inicializado)"""
+        manager = cache_redis.cache_manager
+        return manager if manager and manager.redis_client else None
+
+    def _ler_local(self, chave: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            expira_em, valor = entrada
+            if expira_em <= time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def _gravar_local(self, chave: str, valor: dict):
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    async def get(self, username: str, is_admin: bool) -> Optional[dict]:
+        """Obtém o snapshot (CacheManager com L1 quando há Redis, senão a memória do worker)"""
+        chave = self._chave(username, is_admin)
+        # O LRU local não recebe as invalidações dos outros workers: só vale sem Redis
+        if manager := self._redis():
+            valor = await manager.get(self.TIPO_REDIS, chave)
+        else:
+            valor = self._ler_local(chave)
+
+        if valor is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Cópia rasa: quem chama pode acrescentar chaves sem alterar o snapshot em cache
+        return dict(valor)
+
+    async def set(self, username: str, is_admin: bool, stats: dict):
+        """Guarda o snapshot no Redis (se disponível) ou na memória do worker"""
+        chave = self._chave(username, is_admin)
+        stats = dict(stats)  # o chamador continua dono do dict que passou
+        if manager := self._redis():
+            await manager.set(self.TIPO_REDIS, chave, stats, ttl_override=self.ttl)
+        else:
+            self._gravar_local(chave, stats)
+
+    async def invalidar(self, username: str):
+        """
+        Descarta os snapshots do usuário (chamado após gravar em searches/favorites)
+
+        Com Redis, CacheManager.invalidate publica a chave e todos os workers descartam a
+        cópia do L1; sem Redis, só o worker atual é limpo (os outros expiram pelo TTL)
+        """
+        for papel in self.PAPEIS:
+            chave = f"{username}:{papel}"
+            with self._lock:
+                self._entradas.pop(chave, None)
+            if manager := self._redis():
+                await manager.invalidate(self.TIPO_REDIS, chave)
+
+    def limpar(self):
+        """Esvazia o cache em memória"""
+        with self._lock:
+            self._entradas.clear()
+
+    def status(self) -> dict:
+        """Métricas do cache em memória"""
+        with self._lock:
+            entradas = len(self._entradas)
+        return {
+            'entradas': entradas,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ttl': self.ttl,
+            'redis': self._redis() is not None,
+        }
+
+
+# Instância global (sem recursos externos: o Redis é resolvido a cada uso)
+cache_estatisticas = CacheEstatisticas()
+
+
+def init_cache_estatisticas(ttl: int = 60, max_entradas: int = 1024) -> CacheEstatisticas:
+    """Reconfigura o cache de estatísticas"""
+    global cache_estatisticas
+    cache_estatisticas = CacheEstatisticas(ttl, max_entradas)
+    return cache_estatisticas
@@ -1,17 +1,107 @@
 """
 Cache Manager com Redis
 Implementa cache inteligente com TTL dinâmico baseado no tipo de dado
+Cliente redis.asyncio com pool de conexões: nenhuma ida ao Redis bloqueia o event loop
+Cache em dois níveis: LRU em memória do worker (L1) na frente do Redis (L2),
+com invalidação entre workers via pub/sub
 """
-import json
+import os
+import time
+import uuid
+import asyncio
 import hashlib
-import redis
 import logging
+import threading
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from redis import asyncio as redis_async
+
+import cache_codec
 from datetime import datetime, timedelta
 from typing import Any, Optional, Tuple
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+
+class CacheLocal:
+    """
+    LRU em memória com TTL por entrada e limites de quantidade e de bytes
+
+    Guarda o objeto já desserializado: quem lê recebe a mesma instância (não alterar).
+    """
+
+    def __init__(self, max_entradas: int, max_bytes: int):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Incrementada a cada invalidação: leitura do Redis iniciada antes dela não entra no L1
+        self.geracao = 0
+        self.hits = 0
+        self.misses = 0
+
+    def ler(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            expira_em, tamanho, valor = entrada
+            if expira_em <= time.monotonic():
+                self._remover(chave)
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def gravar(self, chave: str, valor: Any, tamanho: int, ttl: float, geracao: Optional[int] = None):
+        """Guarda a entrada; com 'geracao', só se nenhuma invalidação chegou desde então"""
+        if ttl <= 0 or tamanho > self.max_bytes:
+            return
+        with self._lock:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self._remover(chave)
+            self._entradas[chave] = (time.monotonic() + ttl, tamanho, valor)
+            self._bytes += tamanho
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamanho_antiga, _) = self._entradas.popitem(last=False)
+                self._bytes -= tamanho_antiga
+
+    def _remover(self, chave: str):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada[1]
+
+    def invalidar(self, alvo: str):
+        """Remove uma chave ou todas as que casam com o padrão glob (ex: 'consulta:v2:cpf:*')"""
+        with self._lock:
+            self.geracao += 1
+            if any(c in alvo for c in '*?['):
+                for chave in [c for c in self._entradas if fnmatchcase(c, alvo)]:
+                    self._remover(chave)
+            else:
+                self._remover(alvo)
+
+    def limpar(self):
+        with self._lock:
+            self.geracao += 1
+            self._entradas.clear()
+            self._bytes = 0
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
 class CacheManager:
     """Gerenciador de cache com Redis"""
     
@@ -29,14 +119,115 @@ class CacheManager:
     # Versão do schema - incrementar quando mudança incompatível ocorrer
     CACHE_VERSION = 2
     
+    # Pool compartilhado pelas requisições do worker; acima do limite a chamada espera uma conexão livre
+    MAX_CONEXOES = int(os.environ.get('REDIS_MAX_CONEXOES', '32'))
+    
+    # Timeouts em segundos: com o Redis lento/fora o cache falha rápido e a consulta segue sem ele
+    TIMEOUT_SOCKET = 1.0
+    TIMEOUT_CONEXAO = 1.0
+    ESPERA_POOL = 2.0
+    
+    # L1 (memória do worker): limites e teto do TTL (o TTL da entrada no Redis vale se for menor)
+    L1_MAX_ENTRADAS = int(os.environ.get('CACHE_L1_MAX_ENTRADAS', '2048'))
+    L1_MAX_BYTES = int(os.environ.get('CACHE_L1_MAX_MB', '64')) * 1024 * 1024
+    L1_TTL_MAXIMO = int(os.environ.get('CACHE_L1_TTL', '600'))
+    
+    # Canal pub/sub: cada set/invalidate publica a chave (ou padrão) para os outros workers
+    CANAL_INVALIDACAO = f'consulta:v{CACHE_VERSION}:invalidacao'
+    
+    # Índice por tipo (sorted set chave -> expiração) para estatísticas sem varrer o keyspace;
+    # fica fora de 'consulta:*' para não ser apagado por invalidate_padrao
+    PREFIXO_INDICE = f'cache:v{CACHE_VERSION}:indice:'
+    CHAVE_TIPOS = f'cache:v{CACHE_VERSION}:tipos'
+    
+    # Chaves por iteração do SCAN e por UNLINK na invalidação por padrão
+    LOTE_SCAN = 1000
+    
     def __init__(self, redis_url: str = "redis://localhost:6379/0"):
+        self.redis_url = redis_url
+        self.l1 = CacheLocal(self.L1_MAX_ENTRADAS, self.L1_MAX_BYTES)
+        # O L1 só é usado enquanto o worker está inscrito no canal (senão perderia invalidações)
+        self._l1_ativo = False
+        self._origem = uuid.uuid4().hex[:12]
+        self._tarefa_invalidacao: Optional[asyncio.Task] = None
+        # Sem I/O aqui: a primeira conexão é aberta em conectar() ou no primeiro uso
+        self.pool = redis_async.BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=self.MAX_CONEXOES,
+            timeout=self.ESPERA_POOL,
+            socket_timeout=self.TIMEOUT_SOCKET,
+            socket_connect_timeout=self.TIMEOUT_CONEXAO,
+            health_check_interval=30,
+            decode_responses=False,  # valores binários (cache_codec)
+        )
+        self.redis_client = redis_async.Redis(connection_pool=self.pool)
+    
+    async def conectar(self) -> bool:
+        """Testa a conexão (startup); se o Redis não responder, o cache fica desativado"""
+        if not self.redis_client:
+            return False
         try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.redis_client.ping()
-            logger.info(f"✅ Cache Redis conectado: {redis_url}")
+            await self.redis_client.ping()
+            logger.info(f"✅ Cache Redis conectado: {self.redis_url}")
+            if self.L1_MAX_ENTRADAS > 0 and self._tarefa_invalidacao is None:
+                self._tarefa_invalidacao = asyncio.create_task(self._ouvir_invalidacoes())
+            return True
         except Exception as e:
             logger.error(f"❌ Falha ao conectar Redis: {e}")
-            self.redis_client = None
+            await self.fechar()
+            return False
+    
+    async def fechar(self):
+        """Fecha as conexões do pool (shutdown)"""
+        if self._tarefa_invalidacao:
+            self._tarefa_invalidacao.cancel()
+            try:
+                await self._tarefa_invalidacao
+            except asyncio.CancelledError:
+                pass
+            self._tarefa_invalidacao = None
+        if self.redis_client:
+            client, self.redis_client = self.redis_client, None
+            await client.aclose()
+            await self.pool.disconnect()
+    
+    async def _ouvir_invalidacoes(self):
+        """Tarefa de fundo: aplica no L1 as invalidações publicadas pelos outros workers"""
+        espera = 1
+        while True:
+            # Conexão própria e sem socket_timeout: a inscrição fica parada esperando mensagens
+            cliente = redis_async.from_url(
+                self.redis_url,
+                socket_connect_timeout=self.TIMEOUT_CONEXAO,
+                health_check_interval=30,
+                decode_responses=True,
+            )
+            try:
+                async with cliente.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CANAL_INVALIDACAO)
+                    self.l1.limpar()
+                    self._l1_ativo = True
+                    espera = 1
+                    async for mensagem in pubsub.listen():
+                        if mensagem['type'] != 'message':
+                            continue
+                        origem, _, alvo = mensagem['data'].partition('|')
+                        if origem != self._origem:
+                            self.l1.invalidar(alvo)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Canal de invalidação do cache caiu ({e}) - L1 desativado, reconectando em {espera}s")
+            finally:
+                # Sem inscrição o L1 pode ficar desatualizado: esvaziar e parar de usar
+                self._l1_ativo = False
+                self.l1.limpar()
+                await cliente.aclose()
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30)
+    
+    def _mensagem_invalidacao(self, alvo: str) -> str:
+        return f"{self._origem}|{alvo}"
     
     def _gerar_chave_cache(self, tipo_consulta: str, identificador: str) -> str:
         """Gera chave uniforme para cache"""
@@ -45,6 +236,12 @@ class CacheManager:
         chave = f"consulta:v{self.CACHE_VERSION}:{tipo_consulta}:{hash_id}"
         return chave
     
+    @staticmethod
+    def _tipo_da_chave(chave: str) -> str:
+        """'consulta:v2:cpf:ab12cd34' -> 'cpf'"""
+        partes = chave.split(':')
+        return partes[2] if len(partes) > 3 else ''
+    
     def _obter_ttl(self, tipo_consulta: str) -> int:
         """Retorna TTL em segundos baseado no tipo"""
         horas = self.CACHE_TTL.get(tipo_consulta, 24)
@@ -57,11 +254,26 @@ class CacheManager:
         
         try:
             chave = self._gerar_chave_cache(tipo_consulta, identificador)
-            valor = self.redis_client.get(chave)
+            if self._l1_ativo:
+                valor = self.l1.ler(chave)
+                if valor is not None:
+                    logger.debug(f"🔄 Cache HIT (L1): {chave}")
+                    return valor
+            
+            # Valor e TTL restante numa ida só; o L1 não guarda além do que o Redis guarda
+            geracao = self.l1.geracao
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(chave)
+                pipe.pttl(chave)
+                valor, pttl = await pipe.execute()
             
             if valor:
                 logger.debug(f"🔄 Cache HIT: {chave}")
-                return json.loads(valor)
+                dados = cache_codec.codec.decodificar(valor)
+                if self._l1_ativo:
+                    ttl_l1 = min(self.L1_TTL_MAXIMO, pttl / 1000 if pttl and pttl > 0 else self._obter_ttl(tipo_consulta))
+                    self.l1.gravar(chave, dados, len(valor), ttl_l1, geracao)
+                return dados
             
             logger.debug(f"🔄 Cache MISS: {chave}")
             return None
@@ -84,14 +296,22 @@ class CacheManager:
             chave = self._gerar_chave_cache(tipo_consulta, identificador)
             ttl = ttl_override or self._obter_ttl(tipo_consulta)
             
-            valor_json = json.dumps(dados, default=str, ensure_ascii=False)
-            self.redis_client.setex(
-                chave,
-                ttl,
-                valor_json
-            )
+            valor = cache_codec.codec.codificar(dados)
+            agora = time.time()
+            indice = f"{self.PREFIXO_INDICE}{tipo_consulta}"
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(chave, ttl, valor)
+                pipe.zadd(indice, {chave: agora + ttl})
+                pipe.zremrangebyscore(indice, '-inf', agora)  # poda incremental das expiradas
+                pipe.sadd(self.CHAVE_TIPOS, tipo_consulta)
+                pipe.publish(self.CANAL_INVALIDACAO, self._mensagem_invalidacao(chave))
+                await pipe.execute()
             
-            logger.debug(f"💾 Cache SET: {chave} (TTL: {ttl}s)")
+            # O L1 guarda o que o Redis devolveria (round trip do codec: datas viram texto etc.)
+            if self._l1_ativo:
+                self.l1.gravar(chave, cache_codec.codec.decodificar(valor), len(valor), min(ttl, self.L1_TTL_MAXIMO))
+            
+            logger.debug(f"💾 Cache SET: {chave} (TTL: {ttl}s, {len(valor)} bytes)")
             return True
         except Exception as e:
             logger.warning(f"⚠️ Erro ao salvar cache: {e}")
@@ -104,7 +324,12 @@ class CacheManager:
         
         try:
             chave = self._gerar_chave_cache(tipo_consulta, identificador)
-            self.redis_client.delete(chave)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.unlink(chave)
+                pipe.zrem(f"{self.PREFIXO_INDICE}{tipo_consulta}", chave)
+                pipe.publish(self.CANAL_INVALIDACAO, self._mensagem_invalidacao(chave))
+                await pipe.execute()
+            self.l1.invalidar(chave)
             logger.info(f"🗑️ Cache INVALIDADO: {chave}")
             return True
         except Exception as e:
@@ -112,14 +337,29 @@ class CacheManager:
             return False
     
     async def invalidate_padrao(self, padrao: str) -> int:
-        """Invalida múltiplas chaves por padrão (ex: 'consulta:v2:cpf:*')"""
+        """
+        Invalida múltiplas chaves por padrão (ex: 'consulta:v2:cpf:*')
+        
+        SCAN incremental + UNLINK em lotes: o Redis nunca fica bloqueado varrendo o keyspace
+        inteiro (como no KEYS) nem liberando a memória de uma vez (como no DEL)
+        """
         if not self.redis_client:
             return 0
         
         try:
-            chaves = self.redis_client.keys(padrao)
-            if chaves:
-                deletados = self.redis_client.delete(*chaves)
+            deletados = 0
+            lote = []
+            async for chave in self.redis_client.scan_iter(match=padrao, count=self.LOTE_SCAN):
+                lote.append(chave.decode() if isinstance(chave, bytes) else chave)
+                if len(lote) >= self.LOTE_SCAN:
+                    deletados += await self._apagar_lote(lote)
+                    lote = []
+            if lote:
+                deletados += await self._apagar_lote(lote)
+            # Depois de apagar no Redis: quem reler não traz o valor antigo de volta ao L1
+            await self.redis_client.publish(self.CANAL_INVALIDACAO, self._mensagem_invalidacao(padrao))
+            self.l1.invalidar(padrao)
+            if deletados:
                 logger.info(f"🗑️ Cache INVALIDADO ({deletados}): {padrao}")
                 return deletados
             return 0
@@ -127,13 +367,28 @@ class CacheManager:
             logger.warning(f"⚠️ Erro ao invalidar padrão: {e}")
             return 0
     
+    async def _apagar_lote(self, chaves: list) -> int:
+        """UNLINK das chaves e remoção dos índices por tipo, numa ida ao Redis"""
+        por_tipo = {}
+        for chave in chaves:
+            por_tipo.setdefault(self._tipo_da_chave(chave), []).append(chave)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.unlink(*chaves)
+            for tipo, chaves_tipo in por_tipo.items():
+                if tipo:
+                    pipe.zrem(f"{self.PREFIXO_INDICE}{tipo}", *chaves_tipo)
+            resultados = await pipe.execute()
+        return resultados[0]
+    
     async def clear_all(self) -> bool:
         """Limpa TODO o cache (usar com cuidado!)"""
         if not self.redis_client:
             return False
         
         try:
-            self.redis_client.flushdb()
+            await self.redis_client.flushdb()
+            await self.redis_client.publish(self.CANAL_INVALIDACAO, self._mensagem_invalidacao('*'))
+            self.l1.limpar()
             logger.warning("🗑️ Cache COMPLETAMENTE LIMPO")
             return True
         except Exception as e:
@@ -146,14 +401,27 @@ class CacheManager:
             return {}
         
         try:
-            info = self.redis_client.info('stats')
-            keys_consulta = len(self.redis_client.keys('consulta:*'))
+            tipos = sorted(t.decode() if isinstance(t, bytes) else t for t in await self.redis_client.smembers(self.CHAVE_TIPOS))
+            
+            # Contagem pelos índices (podados das expiradas antes do ZCARD): custo por tipo, não por chave
+            agora = time.time()
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.info('stats')
+                pipe.info('memory')
+                for tipo in tipos:
+                    pipe.zremrangebyscore(f"{self.PREFIXO_INDICE}{tipo}", '-inf', agora)
+                    pipe.zcard(f"{self.PREFIXO_INDICE}{tipo}")
+                info, memoria, *contagens = await pipe.execute()
+            por_tipo = dict(zip(tipos, contagens[1::2]))
             
             return {
-                'total_keys': keys_consulta,
+                'total_keys': sum(por_tipo.values()),
+                'por_tipo': por_tipo,
                 'hits': info.get('keyspace_hits', 0),
                 'misses': info.get('keyspace_misses', 0),
-                'memory_used': info.get('used_memory_human', 'N/A'),
+                'memory_used': memoria.get('used_memory_human', 'N/A'),
+                'l1': {**self.l1.status(), 'ativo': self._l1_ativo},
+                'codec': cache_codec.codec.status(),
             }
         except Exception as e:
             logger.warning(f"⚠️ Erro ao obter stats: {e}")
@@ -164,7 +432,7 @@ class CacheManager:
 cache_manager = None
 
 def init_cache(redis_url: str = "redis://localhost:6379/0") -> CacheManager:
-    """Inicializa o cache manager"""
+    """Inicializa o cache manager (a conexão é testada com 'await cache_manager.conectar()')"""
     global cache_manager
     cache_manager = CacheManager(redis_url)
     return cache_manager
@@ -0,0 +1,154 @@
+"""
+Cliente HTTP assíncrono compartilhado
+Um httpx.AsyncClient por processo, com pool de conexões (keep-alive) por host,
+HTTP/2 quando disponível e timeout por host - usado por todos os buscar_* do app
+"""
+import asyncio
+import logging
+import contextvars
+from http.cookiejar import CookieJar
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+import limite_taxa
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - dependência opcional do httpx para HTTP/2
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+
+# Registro de falhas transitórias (rede, timeout, 5xx, 429) da chamada em andamento.
+# Quem precisa distinguir "não encontrado" de "falhou" (ex.: cache negativo) define
+# um dict novo antes de chamar e lê depois: {'falhas': n}
+falhas_requisicao: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("falhas_requisicao", default=None)
+
+
+def marcar_falha():
+    """Registra uma falha transitória (também usado por buscar_* que caem para um fallback degradado)"""
+    registro = falhas_requisicao.get()
+    if registro is not None:
+        registro['falhas'] = registro.get('falhas', 0) + 1
+
+
+class _SemCookies(CookieJar):
+    """Jar que nunca guarda cookies: o cliente é compartilhado entre usuários e consultas"""
+
+    def extract_cookies(self, response, request):
+        pass
+
+
+class ClienteHTTP:
+    """Pool de conexões HTTP da aplicação (aberto no startup, fechado no shutdown)"""
+
+    # Configuração por host: timeout (s), conexões simultâneas, conexões ociosas mantidas, HTTP/2
+    HOSTS = {
+        'viacep.com.br':                   {'timeout': 5,  'max_conexoes': 10},
+        'nominatim.openstreetmap.org':     {'timeout': 5,  'max_conexoes': 2},   # política de uso: 1 req/s
+        'pt.wikipedia.org':                {'timeout': 5,  'max_conexoes': 10},
+        'www.wikidata.org':                {'timeout': 5,  'max_conexoes': 10},
+        'servicodados.ibge.gov.br':        {'timeout': 5,  'max_conexoes': 10},
+        'overpass-api.de':                 {'timeout': 10, 'max_conexoes': 2},   # servidor público limitado
+        'api.gravatar.com':                {'timeout': 5,  'max_conexoes': 10},
+        'dados.gov.br':                    {'timeout': 5,  'max_conexoes': 5},
+        'api.portaldatransparencia.gov.br': {'timeout': 5, 'max_conexoes': 5, 'http2': False},
+        'www.receitaws.com.br':            {'timeout': 5,  'max_conexoes': 3},   # 3 consultas/min no plano gratuito
+        'brasilapi.com.br':                {'timeout': 5,  'max_conexoes': 10},
+        'cna.oab.org.br':                  {'timeout': 15, 'max_conexoes': 5, 'http2': False},
+    }
+
+    # Valores para hosts fora da tabela
+    PADRAO = {
+        'timeout': 10,
+        'max_conexoes': 10,
+        'max_ociosas': 5,
+        'keepalive_expiry': 30,
+        'http2': True,
+    }
+
+    USER_AGENT = "Detetive-App/1.0"
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _config(self, host: str) -> dict:
+        return {**self.PADRAO, **self.HOSTS.get(host, {})}
+
+    def _transporte(self, config: dict) -> httpx.AsyncHTTPTransport:
+        return httpx.AsyncHTTPTransport(
+            http2=config['http2'] and HTTP2_DISPONIVEL,
+            limits=httpx.Limits(
+                max_connections=config['max_conexoes'],
+                max_keepalive_connections=min(config['max_ociosas'], config['max_conexoes']),
+                keepalive_expiry=config['keepalive_expiry'],
+            ),
+            retries=1,  # só reconexão (ex.: keep-alive fechado pelo servidor)
+        )
+
+    async def abrir(self):
+        """Cria o AsyncClient com um pool (transporte) separado por host"""
+        if self._client is not None:
+            return
+        if not HTTP2_DISPONIVEL:
+            logger.info("ℹ️ Pacote h2 não instalado - cliente HTTP usando apenas HTTP/1.1")
+
+        mounts = {f"all://{host}": self._transporte(self._config(host)) for host in self.HOSTS}
+        self._client = httpx.AsyncClient(
+            transport=self._transporte(self.PADRAO),
+            mounts=mounts,
+            headers={"User-Agent": self.USER_AGENT},
+            timeout=self.PADRAO['timeout'],
+            cookies=_SemCookies(),
+            follow_redirects=True,
+        )
+        self._loop = asyncio.get_running_loop()
+        logger.info(f"✅ Cliente HTTP compartilhado aberto ({len(self.HOSTS)} hosts configurados)")
+
+    async def fechar(self):
+        """Fecha todas as conexões do pool"""
+        if self._client is None:
+            return
+        client, self._client, self._loop = self._client, None, None
+        await client.aclose()
+        logger.info("👋 Cliente HTTP compartilhado fechado")
+
+    async def _obter(self) -> httpx.AsyncClient:
+        # Abre sob demanda (scripts, workers) e recria se o event loop mudou (asyncio.run repetido)
+        if self._client is not None and self._loop is not asyncio.get_running_loop():
+            self._client, self._loop = None, None
+        if self._client is None:
+            await self.abrir()
+        return self._client
+
+    async def request(self, metodo: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """Requisição com o timeout do host (ou o informado)"""
+        client = await self._obter()
+        host = urlsplit(url).hostname or ""
+        if timeout is None:
+            timeout = self._config(host)['timeout']
+        try:
+            # Quota do host compartilhada entre workers (no-op para hosts sem limite)
+            await limite_taxa.limites.adquirir(host)
+            response = await client.request(metodo, url, timeout=timeout, **kwargs)
+        except (httpx.HTTPError, limite_taxa.LimiteExcedido):
+            marcar_falha()
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            marcar_falha()
+        return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+# Instância global (o pool só é criado em abrir())
+cliente_http = ClienteHTTP()
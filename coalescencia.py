@@ -0,0 +1,155 @@
+"""
+Coalescência de chamadas idênticas em voo (single-flight)
+Chamadas concorrentes com a mesma chave (tipo + SHA-256 completo das entradas) aguardam
+uma única execução no worker; opcionalmente uma trava no Redis faz os outros workers
+esperarem o primeiro terminar e só então lerem o que ele deixou em cache
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+import cache_manager as cache_redis
+
+logger = logging.getLogger(__name__)
+
+# Apaga a trava só se ainda for do mesmo dono (não remove a de quem assumiu após o TTL)
+SCRIPT_LIBERAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class Coalescedor:
+    """
+    Single-flight por chave
+
+    A execução roda numa tarefa própria: se quem a iniciou for cancelado (prazo do
+    enriquecimento), os demais continuam aguardando e o resultado ainda vai para o cache.
+    """
+
+    PREFIXO_TRAVA = 'voo:'
+
+    # TTL da trava no Redis (cobre a chamada mais lenta; se o dono morrer, expira sozinha)
+    TTL_TRAVA = 30.0
+
+    # Espera máxima por outro worker; depois disso a chamada segue por conta própria
+    ESPERA_MAXIMA = 20.0
+
+    # Intervalo de consulta da trava (cresce até o máximo)
+    INTERVALO_MIN = 0.05
+    INTERVALO_MAX = 0.5
+
+    def __init__(self, distribuido: bool = True):
+        self.distribuido = distribuido
+        self._em_voo: Dict[str, asyncio.Task] = {}
+        self.execucoes = 0
+        self.coalescidas = 0
+        self.esperas_outro_worker = 0
+
+    @staticmethod
+    def chave(tipo: str, *entradas: Any) -> str:
+        """
+        Chave da chamada: tipo + SHA-256 completo de tudo de que o resultado depende
+
+        Não usa o hash curto do CacheManager (8 hex): uma colisão ali é só um cache miss,
+        aqui entregaria a um usuário o resultado da consulta de outro.
+        """
+        try:
+            conteudo = json.dumps(entradas, sort_keys=True, ensure_ascii=False, default=str)
+        except TypeError:  # chaves de tipos misturados não ordenam
+            conteudo = json.dumps(entradas, ensure_ascii=False, default=str)
+        return f"{tipo}:{hashlib.sha256(conteudo.encode()).hexdigest()}"
+
+    @staticmethod
+    def _redis():
+        """Cliente do CacheManager ativo (ou None se o Redis não foi inicializado)"""
+        manager = cache_redis.cache_manager
+        return manager.redis_client if manager else None
+
+    async def executar(self, chave: str, func: Callable[[], Awaitable[Any]], distribuido: bool = False) -> Any:
+        """
+        Executa func() uma vez por chave enquanto houver chamadas aguardando
+
+        Args:
+            chave: Identificação da chamada (ver chave())
+            func: Corrotina sem argumentos; com distribuido=True ela deve consultar o cache
+                  antes de ir à rede, pois pode rodar logo depois de outro worker preenchê-lo
+            distribuido: Esperar também por outro worker com a mesma chave (trava no Redis)
+        """
+        tarefa = self._em_voo.get(chave)
+        if tarefa is None:
+            self.execucoes += 1
+            tarefa = asyncio.create_task(self._lider(chave, func, distribuido), name=f"coalescencia:{chave}")
+            self._em_voo[chave] = tarefa
+            tarefa.add_done_callback(lambda _, chave=chave: self._em_voo.pop(chave, None))
+        else:
+            self.coalescidas += 1
+            logger.debug(f"🔗 Chamada coalescida: {chave}")
+        return await asyncio.shield(tarefa)
+
+    async def _lider(self, chave: str, func: Callable[[], Awaitable[Any]], distribuido: bool) -> Any:
+        redis_client = self._redis() if distribuido and self.distribuido else None
+        if redis_client is None:
+            return await func()
+
+        trava = f"{self.PREFIXO_TRAVA}{chave}"
+        token = uuid.uuid4().hex
+        try:
+            obtida = await redis_client.set(trava, token, nx=True, px=int(self.TTL_TRAVA * 1000))
+        except Exception as e:
+            logger.warning(f"⚠️ Trava de coalescência indisponível ({e}) - seguindo sem ela")
+            return await func()
+
+        if not obtida:
+            # Outro worker já está buscando: esperar a trava sumir e então ler o cache via func()
+            self.esperas_outro_worker += 1
+            await self._aguardar_liberacao(redis_client, trava)
+            return await func()
+
+        try:
+            return await func()
+        finally:
+            try:
+                await redis_client.eval(SCRIPT_LIBERAR, 1, trava, token)
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao liberar trava {trava}: {e}")
+
+    async def _aguardar_liberacao(self, redis_client, trava: str):
+        limite = time.monotonic() + self.ESPERA_MAXIMA
+        intervalo = self.INTERVALO_MIN
+        while time.monotonic() < limite:
+            await asyncio.sleep(intervalo)
+            try:
+                if not await redis_client.exists(trava):
+                    return
+            except Exception:
+                return
+            intervalo = min(intervalo * 2, self.INTERVALO_MAX)
+        logger.warning(f"⏱️ {trava} ainda travada após {self.ESPERA_MAXIMA:g}s - seguindo sem esperar")
+
+    def status(self) -> dict:
+        return {
+            'em_voo': len(self._em_voo),
+            'execucoes': self.execucoes,
+            'coalescidas': self.coalescidas,
+            'esperas_outro_worker': self.esperas_outro_worker,
+            'distribuido': self.distribuido and self._redis() is not None,
+        }
+
+
+# Instância global (COALESCENCIA_DISTRIBUIDA=0 desliga a trava no Redis)
+coalescedor = Coalescedor(os.environ.get('COALESCENCIA_DISTRIBUIDA', '1') != '0')
+
+
+def init_coalescedor(distribuido: bool = True) -> Coalescedor:
+    """Reconfigura o coalescedor"""
+    global coalescedor
+    coalescedor = Coalescedor(distribuido)
+    return coalescedor
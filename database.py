@@ -0,0 +1,169 @@
+"""
+Database Manager com SQLite
+Pool de conexões por thread com WAL, PRAGMAs ajustados e transações via context manager
+Executor dedicado (fila limitada) para acesso assíncrono sem bloquear o event loop
+"""
+import sqlite3
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseManager:
+    """Gerenciador de conexões SQLite (uma conexão por thread)"""
+
+    # PRAGMAs aplicados em toda conexão nova
+    PRAGMAS = {
+        'journal_mode': 'WAL',       # Leitores não bloqueiam escritor (e vice-versa)
+        'synchronous': 'NORMAL',     # Seguro com WAL, evita fsync a cada commit
+        'cache_size': -65536,        # 64 MB de page cache (negativo = KiB)
+        'mmap_size': 268435456,      # 256 MB mapeados em memória
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,       # Espera até 10s por lock antes de "database is locked"
+    }
+
+    def __init__(self, db_file: str, timeout: float = 10, max_workers: int = 4, max_fila: int = 64):
+        self.db_file = db_file
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexoes: List[sqlite3.Connection] = []
+
+        # Threads dedicadas ao SQLite (cada uma mantém sua própria conexão)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite")
+        # Limita operações pendentes (em execução + na fila) para aplicar backpressure
+        self.max_fila = max_fila
+        self._fila = None
+
+    def _criar_conexao(self) -> sqlite3.Connection:
+        """Abre uma nova conexão já configurada"""
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False)
+        # Autocommit: transações são abertas explicitamente em transacao()
+        conn.isolation_level = None
+        for pragma, valor in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {valor}")
+
+        with self._lock:
+            self._conexoes.append(conn)
+        logger.debug(f"🔌 Nova conexão SQLite ({threading.current_thread().name})")
+        return conn
+
+    def obter_conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual (cria na primeira chamada)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._criar_conexao()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def cursor(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor em modo autocommit - para leituras e escritas de um único comando"""
+        cur = self.obter_conexao().cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+    @contextmanager
+    def transacao(self, imediata: bool = False) -> Iterator[sqlite3.Cursor]:
+        """
+        Abre uma transação e retorna um cursor
+
+        Commit automático ao sair do bloco, rollback se houver exceção.
+        Transações aninhadas na mesma thread viram SAVEPOINTs.
+
+        Args:
+            imediata: Usa BEGIN IMMEDIATE (reserva o lock de escrita já no início)
+        """
+        conn = self.obter_conexao()
+        cur = conn.cursor()
+
+        if conn.in_transaction:
+            savepoint = f"sp_{id(cur)}"
+            cur.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield cur
+                cur.execute(f"RELEASE {savepoint}")
+            except BaseException:
+                cur.execute(f"ROLLBACK TO {savepoint}")
+                cur.execute(f"RELEASE {savepoint}")
+                raise
+            finally:
+                cur.close()
+            return
+
+        cur.execute("BEGIN IMMEDIATE" if imediata else "BEGIN")
+        try:
+            yield cur
+            cur.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.close()
+
+    async def executar(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Executa uma função síncrona de banco no executor dedicado
+
+        Aguarda vaga na fila limitada antes de enfileirar, então rotas lentas
+        não acumulam trabalho indefinidamente nem travam o event loop.
+        """
+        if self._fila is None:
+            self._fila = asyncio.Semaphore(self.max_fila)
+
+        async with self._fila:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+    def backup(self, destino: str, paginas_por_passo: int = 1024) -> str:
+        """
+        Cópia consistente do banco (API de backup do SQLite)
+
+        Inclui as páginas ainda no -wal e não é afetada por checkpoints em andamento,
+        ao contrário de copiar o arquivo; os passos liberam o banco entre si para os escritores.
+        """
+        destino_conn = sqlite3.connect(destino)
+        try:
+            with destino_conn:
+                self.obter_conexao().backup(destino_conn, pages=paginas_por_passo)
+        finally:
+            destino_conn.close()
+        logger.info(f"💾 Backup SQLite gravado em {destino}")
+        return destino
+
+    def fechar_todas(self):
+        """Fecha todas as conexões abertas (usar no shutdown)"""
+        with self._lock:
+            conexoes, self._conexoes = self._conexoes, []
+
+        for conn in conexoes:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao fechar conexão SQLite: {e}")
+
+        self._local = threading.local()
+        logger.info(f"🔌 {len(conexoes)} conexão(ões) SQLite fechada(s)")
+
+    def encerrar(self):
+        """Aguarda operações pendentes no executor e fecha as conexões"""
+        self.executor.shutdown(wait=True)
+        self.fechar_todas()
+
+
+# Instância global
+db = None
+
+def init_db(db_file: str, max_workers: int = 4, max_fila: int = 64) -> DatabaseManager:
+    """Inicializa o gerenciador de banco de dados"""
+    global db
+    db = DatabaseManager(db_file, max_workers=max_workers, max_fila=max_fila)
+    return db
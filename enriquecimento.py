@@ -0,0 +1,428 @@
+"""
+Motor de enriquecimento concorrente
+Cada fonte é uma etapa com dependências; etapas independentes rodam em paralelo
+sob um prazo global e o resultado traz tudo o que terminou a tempo.
+O registro de fontes declara, por fonte, tipos aceitos, timeout, tentativas,
+TTL de cache e limite de concorrência, e coleta latência e acertos de cada uma.
+Respostas das fontes com cache_ttl ficam no SQLite (cache_fontes), com cache
+negativo para "não encontrado" e stale-while-revalidate; misses iguais em voo
+viram uma única chamada (coalescencia).
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import repositorio
+import coalescencia
+from cliente_http import falhas_requisicao
+
+logger = logging.getLogger(__name__)
+
+
+class Etapa:
+    """
+    Uma fonte do enriquecimento
+
+    func recebe um dict {dependência: resultado} e retorna o dado (ou None).
+    Se alguma dependência terminar sem dado, a etapa é pulada.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Any]],
+        depende_de: Iterable[str] = (),
+    ):
+        self.nome = nome
+        self.func = func
+        self.depende_de = tuple(depende_de)
+
+
+class MotorEnriquecimento:
+    """Executa um grafo de etapas com prazo global"""
+
+    def __init__(self, prazo: float = 10.0):
+        self.prazo = prazo
+        self.etapas: Dict[str, Etapa] = {}
+
+    def adicionar(self, nome: str, func: Callable, depende_de: Iterable[str] = ()) -> "MotorEnriquecimento":
+        """Registra uma etapa (as dependências precisam ter sido registradas antes)"""
+        etapa = Etapa(nome, func, depende_de)
+        faltando = [dep for dep in etapa.depende_de if dep not in self.etapas]
+        if faltando:
+            raise ValueError(f"Etapa {nome} depende de etapas não registradas: {', '.join(faltando)}")
+        self.etapas[nome] = etapa
+        return self
+
+    async def _rodar(self, etapa: Etapa, tarefas: Dict[str, asyncio.Task]) -> Any:
+        entradas = {}
+        for dep in etapa.depende_de:
+            # shield: cancelar esta etapa não cancela a dependência (que pode servir a outras)
+            try:
+                resultado = await asyncio.shield(tarefas[dep])
+            except Exception:
+                return None  # a falha já é registrada na própria dependência
+            if resultado is None:
+                return None
+            entradas[dep] = resultado
+        return await etapa.func(entradas)
+
+    async def executar(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Roda todas as etapas
+
+        Returns:
+            (resultados com dado, na ordem de registro; etapas canceladas pelo prazo)
+        """
+        if not self.etapas:
+            return {}, []
+
+        inicio = time.monotonic()
+        tarefas: Dict[str, asyncio.Task] = {}
+        for nome, etapa in self.etapas.items():
+            tarefas[nome] = asyncio.create_task(self._rodar(etapa, tarefas), name=f"enriquecimento:{nome}")
+
+        _, pendentes = await asyncio.wait(tarefas.values(), timeout=self.prazo)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        if pendentes:
+            await asyncio.gather(*pendentes, return_exceptions=True)
+
+        resultados: Dict[str, Any] = {}
+        atrasadas: List[str] = []
+        for nome, tarefa in tarefas.items():
+            if tarefa in pendentes:
+                atrasadas.append(nome)
+                continue
+            erro = tarefa.exception()
+            if erro is not None:
+                logger.warning(f"⚠️ Enriquecimento {nome} falhou: {erro}")
+                continue
+            if tarefa.result() is not None:
+                resultados[nome] = tarefa.result()
+
+        decorrido = time.monotonic() - inicio
+        if atrasadas:
+            logger.warning(f"⏱️ Prazo de {self.prazo:g}s esgotado; sem resposta: {', '.join(atrasadas)}")
+        logger.info(f"✅ Enriquecimento: {len(resultados)}/{len(tarefas)} fontes com dados em {decorrido:.2f}s")
+        return resultados, atrasadas
+
+
+# ============================================
+# REGISTRO DE FONTES
+# ============================================
+
+class FonteEnriquecimento:
+    """
+    Declaração de uma fonte pública de enriquecimento
+
+    entrada(contexto, dependencias) extrai os argumentos de buscar a partir do
+    contexto da consulta; retornar None significa "fonte não se aplica".
+
+    Cache (cache_ttl > 0): a chave é chave_cache(args) (padrão: JSON dos args).
+    Respostas vazias sem falha de rede ficam cache_ttl_negativo segundos; depois
+    de vencer, a entrada ainda é servida por janela_stale segundos enquanto é
+    atualizada em segundo plano.
+    """
+
+    # TTL padrão do cache negativo (não encontrado)
+    TTL_NEGATIVO = 6 * 3600
+
+    def __init__(
+        self,
+        nome: str,
+        buscar: Callable[..., Awaitable[Any]],
+        entrada: Callable[[dict, Dict[str, Any]], Optional[tuple]],
+        tipos: Iterable[str] = ('cpf', 'cnpj'),
+        depende_de: Iterable[str] = (),
+        timeout: float = 5.0,
+        tentativas: int = 1,
+        espera_retry: float = 0.5,
+        cache_ttl: int = 0,
+        max_concorrencia: int = 5,
+        cache_ttl_negativo: Optional[int] = None,
+        janela_stale: Optional[int] = None,
+        cache_negativo: bool = True,
+        chave_cache: Optional[Callable[[tuple], str]] = None,
+    ):
+        self.nome = nome
+        self.buscar = buscar
+        self.entrada = entrada
+        self.tipos = tuple(tipos)
+        self.depende_de = tuple(depende_de)
+        self.timeout = timeout
+        self.tentativas = max(1, tentativas)
+        self.espera_retry = espera_retry
+        self.cache_ttl = cache_ttl
+        self.cache_ttl_negativo = min(cache_ttl, self.TTL_NEGATIVO) if cache_ttl_negativo is None else cache_ttl_negativo
+        self.janela_stale = cache_ttl if janela_stale is None else janela_stale
+        self.cache_negativo = cache_negativo
+        self.chave_cache = chave_cache or (lambda args: json.dumps(args, ensure_ascii=False, default=str))
+        self.max_concorrencia = max_concorrencia
+        self.ativa = True
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaforo(self) -> asyncio.Semaphore:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+        return self._semaforo
+
+
+class MetricasFonte:
+    """Contadores e latências recentes de uma fonte"""
+
+    AMOSTRAS = 200
+
+    def __init__(self):
+        self.chamadas = 0
+        self.com_dados = 0
+        self.sem_dados = 0
+        self.erros = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.cache_stale = 0
+        self.cache_misses = 0
+        self.latencias = deque(maxlen=self.AMOSTRAS)
+
+    def registrar(self, resultado: str, latencia: float):
+        self.chamadas += 1
+        setattr(self, resultado, getattr(self, resultado) + 1)
+        self.latencias.append(latencia)
+
+    def resumo(self) -> dict:
+        ordenadas = sorted(self.latencias)
+        return {
+            'chamadas': self.chamadas,
+            'com_dados': self.com_dados,
+            'sem_dados': self.sem_dados,
+            'erros': self.erros,
+            'timeouts': self.timeouts,
+            'cache_hits': self.cache_hits,
+            'cache_stale': self.cache_stale,
+            'cache_misses': self.cache_misses,
+            'taxa_acerto': round(self.com_dados / self.chamadas, 3) if self.chamadas else None,
+            'latencia_media_ms': round(sum(ordenadas) / len(ordenadas) * 1000, 1) if ordenadas else None,
+            'latencia_p95_ms': round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))] * 1000, 1) if ordenadas else None,
+        }
+
+
+class CacheFontes:
+    """Respostas das fontes no SQLite (tabela cache_fontes)"""
+
+    async def obter(self, fonte: FonteEnriquecimento, chave: str) -> Optional[Tuple[Any, bool]]:
+        """(valor, ainda_fresco) ou None se ausente/expirado; valor None = negativo"""
+        try:
+            linha = await repositorio.ler_cache_fonte(fonte.nome, chave)
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao ler cache da fonte {fonte.nome}: {e}")
+            return None
+        if not linha:
+            return None
+        valor_json, fresco_ate, expira_em = linha
+        agora = time.time()
+        if expira_em <= agora:
+            return None
+        return (json.loads(valor_json) if valor_json is not None else None), agora < fresco_ate
+
+    async def gravar(self, fonte: FonteEnriquecimento, chave: str, valor: Any):
+        ttl = fonte.cache_ttl if valor else fonte.cache_ttl_negativo
+        if ttl <= 0:
+            return
+        agora = time.time()
+        try:
+            await repositorio.gravar_cache_fonte(
+                fonte.nome,
+                chave,
+                json.dumps(valor, ensure_ascii=False, default=str) if valor else None,
+                agora + ttl,
+                agora + ttl + fonte.janela_stale,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao gravar cache da fonte {fonte.nome}: {e}")
+
+
+class RegistroFontes:
+    """Fontes disponíveis e o runner que aplica cache, timeout, retry, concorrência e métricas"""
+
+    def __init__(self, cache: Optional[CacheFontes] = None, prazo: float = 10.0):
+        self.fontes: Dict[str, FonteEnriquecimento] = {}
+        self.metricas: Dict[str, MetricasFonte] = {}
+        self.cache = cache
+        # Prazo global do enriquecimento: nenhuma fonte pode ter timeout maior que ele
+        self.prazo = prazo
+        self._revalidando: set = set()
+        self._tarefas: set = set()
+
+    def registrar(self, fonte: FonteEnriquecimento) -> FonteEnriquecimento:
+        faltando = [dep for dep in fonte.depende_de if dep not in self.fontes]
+        if faltando:
+            raise ValueError(f"Fonte {fonte.nome} depende de fontes não registradas: {', '.join(faltando)}")
+        if fonte.timeout > self.prazo:
+            raise ValueError(
+                f"Fonte {fonte.nome}: timeout de {fonte.timeout:g}s excede o prazo global de {self.prazo:g}s"
+            )
+        self.fontes[fonte.nome] = fonte
+        self.metricas[fonte.nome] = MetricasFonte()
+        return fonte
+
+    def desativar(self, *nomes: str):
+        """Tira fontes do enriquecimento sem remover o registro (métricas continuam visíveis)"""
+        for nome in nomes:
+            if nome in self.fontes:
+                self.fontes[nome].ativa = False
+                logger.info(f"🚫 Fonte de enriquecimento desativada: {nome}")
+
+    async def _chamar(self, fonte: FonteEnriquecimento, args: tuple) -> Tuple[Any, bool]:
+        """
+        Chama a fonte com timeout, tentativas e limite de concorrência, registrando métricas
+
+        Returns:
+            (resultado, confiável) - confiável = terminou sem erro/timeout/falha de rede,
+            então até um resultado vazio pode ir para o cache negativo
+        """
+        metricas = self.metricas[fonte.nome]
+        for tentativa in range(1, fonte.tentativas + 1):
+            falhas = {'falhas': 0}
+            falhas_requisicao.set(falhas)
+            inicio = time.monotonic()
+            try:
+                async with fonte.semaforo:
+                    resultado = await asyncio.wait_for(fonte.buscar(*args), timeout=fonte.timeout)
+            except asyncio.TimeoutError:
+                metricas.registrar('timeouts', time.monotonic() - inicio)
+                erro = f"timeout de {fonte.timeout:g}s"
+            except Exception as e:
+                metricas.registrar('erros', time.monotonic() - inicio)
+                erro = str(e)
+            else:
+                if not falhas['falhas']:
+                    metricas.registrar('com_dados' if resultado else 'sem_dados', time.monotonic() - inicio)
+                    return resultado, True
+                if resultado:
+                    # Resposta degradada (fallback após falha de rede/5xx): serve agora, mas não vai para o cache
+                    metricas.registrar('com_dados', time.monotonic() - inicio)
+                    return resultado, False
+                # buscar_* engoliu uma falha de rede/5xx e devolveu vazio
+                metricas.registrar('erros', time.monotonic() - inicio)
+                erro = "falha transitória na requisição"
+
+            if tentativa < fonte.tentativas:
+                await asyncio.sleep(fonte.espera_retry * 2 ** (tentativa - 1))
+
+        logger.warning(f"⚠️ Fonte {fonte.nome} sem resposta após {fonte.tentativas} tentativa(s): {erro}")
+        return None, False
+
+    def _revalidar(self, fonte: FonteEnriquecimento, args: tuple, chave: str):
+        """Atualiza uma entrada vencida em segundo plano (uma por chave)"""
+        identificacao = (fonte.nome, chave)
+        if identificacao in self._revalidando:
+            return
+        self._revalidando.add(identificacao)
+
+        async def revalidar():
+            try:
+                resultado, confiavel = await self._chamar(fonte, args)
+                if confiavel and (resultado or fonte.cache_negativo):
+                    await self.cache.gravar(fonte, chave, resultado)
+            finally:
+                self._revalidando.discard(identificacao)
+
+        tarefa = asyncio.create_task(revalidar(), name=f"revalidar:{fonte.nome}")
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def executar_fonte(self, fonte: FonteEnriquecimento, contexto: dict, dependencias: Dict[str, Any]) -> Any:
+        """Resposta da fonte: do cache quando possível, senão da rede"""
+        args = fonte.entrada(contexto, dependencias)
+        if args is None:
+            return None
+
+        if self.cache is None or fonte.cache_ttl <= 0:
+            return await coalescencia.coalescedor.executar(
+                coalescencia.Coalescedor.chave(fonte.nome, fonte.chave_cache(args)),
+                lambda: self._chamar_sem_cache(fonte, args),
+            )
+
+        metricas = self.metricas[fonte.nome]
+        chave = fonte.chave_cache(args)
+        em_cache = await self.cache.obter(fonte, chave)
+        if em_cache is not None:
+            valor, fresco = em_cache
+            if fresco:
+                metricas.cache_hits += 1
+            else:
+                metricas.cache_stale += 1
+                self._revalidar(fonte, args, chave)
+            return valor
+
+        metricas.cache_misses += 1
+        # Mesma chave já em voo (aqui ou, via trava no Redis, em outro worker): uma chamada só
+        return await coalescencia.coalescedor.executar(
+            coalescencia.Coalescedor.chave(fonte.nome, chave),
+            lambda: self._buscar_e_gravar(fonte, args, chave),
+            distribuido=True,
+        )
+
+    async def _chamar_sem_cache(self, fonte: FonteEnriquecimento, args: tuple) -> Any:
+        return (await self._chamar(fonte, args))[0]
+
+    async def _buscar_e_gravar(self, fonte: FonteEnriquecimento, args: tuple, chave: str) -> Any:
+        """Miss do cache: chama a fonte e grava a resposta"""
+        # Outro worker pode ter preenchido o cache enquanto esta chamada esperava a trava
+        em_cache = await self.cache.obter(fonte, chave)
+        if em_cache is not None:
+            return em_cache[0]
+
+        resultado, confiavel = await self._chamar(fonte, args)
+        if confiavel and (resultado or fonte.cache_negativo):
+            await self.cache.gravar(fonte, chave, resultado)
+        return resultado
+
+    def montar_motor(self, contexto: dict, prazo: Optional[float] = None) -> MotorEnriquecimento:
+        """Motor com as fontes ativas que aceitam o tipo do contexto (e cujas dependências entraram)"""
+        motor = MotorEnriquecimento(prazo=self.prazo if prazo is None else prazo)
+        tipo = str(contexto.get('tipo', '')).lower()
+        for nome, fonte in self.fontes.items():
+            if not fonte.ativa or tipo not in fonte.tipos:
+                continue
+            if any(dep not in motor.etapas for dep in fonte.depende_de):
+                continue
+            motor.adicionar(
+                nome,
+                lambda dep, fonte=fonte: self.executar_fonte(fonte, contexto, dep),
+                depende_de=fonte.depende_de,
+            )
+        return motor
+
+    async def enriquecer(self, contexto: dict, prazo: Optional[float] = None) -> Dict[str, Any]:
+        """Roda todas as fontes aplicáveis e retorna {fonte: dado} das que responderam a tempo"""
+        resultados, _ = await self.montar_motor(contexto, prazo).executar()
+        return resultados
+
+    def status(self) -> Dict[str, dict]:
+        """Configuração e métricas de cada fonte"""
+        return {
+            nome: {
+                'ativa': fonte.ativa,
+                'tipos': list(fonte.tipos),
+                'timeout': fonte.timeout,
+                'tentativas': fonte.tentativas,
+                'cache_ttl': fonte.cache_ttl,
+                'cache_ttl_negativo': fonte.cache_ttl_negativo,
+                'max_concorrencia': fonte.max_concorrencia,
+                **self.metricas[nome].resumo(),
+            }
+            for nome, fonte in self.fontes.items()
+        }
+
+
+# Instância global (as fontes são registradas pelo app, onde vivem os buscar_*)
+registro_fontes = RegistroFontes(cache=CacheFontes())
+
+# Fontes desligadas por configuração, ex.: ENRIQUECIMENTO_FONTES_DESATIVADAS=overpass,gravatar
+FONTES_DESATIVADAS = [f.strip() for f in os.environ.get("ENRIQUECIMENTO_FONTES_DESATIVADAS", "").split(",") if f.strip()]
@@ -20,7 +20,9 @@ celery_app = Celery(
 
 # Configuração Celery
 celery_app.conf.update(
-    # Rate limiting: máximo de tarefas processadas por minuto
+    # Rate limiting: máximo de tarefas processadas por minuto (por worker).
+    # Quotas das APIs externas ficam no limite_taxa (Redis, compartilhado entre workers):
+    # tarefas que chamam um host usam limite_taxa.limites.adquirir_sincrono(host)
     task_default_rate_limit='100/m',
     
     # Timeout para tarefas: 5 minutos
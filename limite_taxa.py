@@ -0,0 +1,260 @@
+"""
+Limite de taxa por host de API externa
+Token bucket no Redis (script Lua atômico) compartilhado por todos os workers do
+uvicorn e do Celery; sem Redis, cai para um token bucket local por processo
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+try:
+    import redis
+    from redis import asyncio as redis_async
+except ImportError:  # scripts avulsos sem o pacote redis: só o limite local
+    redis = None
+    redis_async = None
+
+logger = logging.getLogger(__name__)
+
+
+class LimiteExcedido(Exception):
+    """A espera pela próxima ficha passaria de 'max_espera' (quota esgotada)"""
+
+
+class LimitadorTaxa:
+    """
+    Token bucket: 'taxa' fichas por segundo, acumulando até 'capacidade' (rajada)
+
+    Cada chamada reserva uma ficha e dorme só o necessário; a reserva é feita sob
+    um threading.Lock sem await, então o mesmo limitador vale para qualquer event loop.
+    """
+
+    def __init__(self, taxa: float, capacidade: int = 1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reservar(self, max_espera: Optional[float] = None) -> Optional[float]:
+        """Consome uma ficha e retorna quantos segundos esperar por ela (None = passaria de max_espera)"""
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            espera = 0.0 if self._fichas >= 1 else (1 - self._fichas) / self.taxa
+            if max_espera is not None and espera > max_espera:
+                return None
+            self._fichas -= 1
+            return espera
+
+    def devolver(self):
+        """Desfaz uma reserva cuja requisição não chegou a ser feita"""
+        with self._lock:
+            self._fichas = min(self.capacidade, self._fichas + 1)
+
+    async def adquirir(self):
+        espera = self._reservar()
+        if espera:
+            try:
+                await asyncio.sleep(espera)
+            except asyncio.CancelledError:
+                self.devolver()
+                raise
+
+
+# Mesmo algoritmo do LimitadorTaxa, executado atomicamente no Redis.
+# O relógio é o do Redis (TIME): workers em máquinas diferentes não precisam estar sincronizados.
+SCRIPT_TOKEN_BUCKET = """
+if redis.replicate_commands then redis.replicate_commands() end
+local taxa = tonumber(ARGV[1])
+local capacidade = tonumber(ARGV[2])
+local max_espera = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'fichas', 'ts')
+local fichas = tonumber(estado[1]) or capacidade
+local ts = tonumber(estado[2]) or agora
+fichas = math.min(capacidade, fichas + math.max(0, agora - ts) * taxa)
+local espera = 0
+if fichas < 1 then espera = (1 - fichas) / taxa end
+if espera > max_espera then return '-1' end
+fichas = fichas - 1
+redis.call('HMSET', KEYS[1], 'fichas', tostring(fichas), 'ts', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacidade - fichas) / taxa * 1000) + 1000)
+return tostring(espera)
+"""
+
+# Devolve uma ficha reservada e não usada (ex.: a espera foi cancelada pelo timeout de quem chamou)
+SCRIPT_DEVOLVER = """
+local fichas = tonumber(redis.call('HGET', KEYS[1], 'fichas'))
+if fichas then
+    redis.call('HSET', KEYS[1], 'fichas', tostring(math.min(tonumber(ARGV[1]), fichas + 1)))
+end
+return 1
+"""
+
+
+class LimitesHosts:
+    """Quota por host de API externa, compartilhada via Redis entre processos"""
+
+    # Quotas publicadas (ou conservadoras quando não há): fichas por segundo e rajada
+    LIMITES = {
+        'api.portaldatransparencia.gov.br': {'taxa': int(os.environ.get('TRANSPARENCIA_REQ_POR_MINUTO', '90')) / 60, 'rajada': 4},   # 90 req/min (06h-24h) por chave
+        'nominatim.openstreetmap.org':      {'taxa': 1.0,    'rajada': 1},   # política de uso: máx. 1 req/s
+        'overpass-api.de':                  {'taxa': 0.5,    'rajada': 2},   # slots por IP no servidor público
+        'www.receitaws.com.br':             {'taxa': 3 / 60, 'rajada': 3},   # 3 consultas/min no plano gratuito
+    }
+
+    PREFIXO = 'limite:'
+
+    # Espera máxima por uma ficha; acima disso a chamada falha em vez de enfileirar
+    MAX_ESPERA = 30.0
+
+    # Depois de uma falha do Redis, usa o limite local por este tempo antes de tentar de novo
+    PAUSA_REDIS = 30.0
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+        self._redis_client = None
+        self._script = None
+        # Cliente redis.asyncio para adquirir(): nenhuma ida ao Redis bloqueia o event loop
+        self._redis_async = None
+        self._script_async = None
+        self._script_devolver_async = None
+        self._loop = None
+        self._redis_pausado_ate = 0.0
+        self._locais: Dict[str, LimitadorTaxa] = {}
+        self._lock = threading.Lock()
+
+    def _obter_redis(self):
+        """Cliente Redis (conectado sob demanda) ou None enquanto indisponível"""
+        if redis is None or time.monotonic() < self._redis_pausado_ate:
+            return None
+        if self._redis_client is None:
+            with self._lock:
+                if self._redis_client is None:
+                    client = redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                    self._script = client.register_script(SCRIPT_TOKEN_BUCKET)
+                    self._redis_client = client
+        return self._redis_client
+
+    def _obter_redis_async(self):
+        """Cliente redis.asyncio do event loop atual (recriado se o loop mudou) ou None"""
+        if redis_async is None or time.monotonic() < self._redis_pausado_ate:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._redis_async is None or self._loop is not loop:
+            client = redis_async.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._script_async = client.register_script(SCRIPT_TOKEN_BUCKET)
+            self._script_devolver_async = client.register_script(SCRIPT_DEVOLVER)
+            self._redis_async, self._loop = client, loop
+        return self._redis_async
+
+    def _pausar_redis(self, erro: Exception):
+        self._redis_pausado_ate = time.monotonic() + self.PAUSA_REDIS
+        logger.warning(f"⚠️ Redis indisponível para limite de taxa ({erro}) - usando limite local por {self.PAUSA_REDIS:g}s")
+
+    @staticmethod
+    def _espera_redis(resposta) -> Optional[float]:
+        espera = float(resposta)
+        return None if espera < 0 else espera  # -1: a espera passaria de MAX_ESPERA
+
+    def _local(self, host: str, limite: dict) -> LimitadorTaxa:
+        with self._lock:
+            limitador = self._locais.get(host)
+            if limitador is None:
+                limitador = self._locais[host] = LimitadorTaxa(limite['taxa'], limite['rajada'])
+            return limitador
+
+    def _reservar(self, host: str) -> float:
+        """Reserva uma ficha do host e retorna a espera em segundos (0 para hosts sem limite)"""
+        limite = self.LIMITES.get(host)
+        if limite is None:
+            return 0.0
+
+        if self._obter_redis() is None:
+            espera = self._local(host, limite)._reservar(self.MAX_ESPERA)
+        else:
+            try:
+                espera = self._espera_redis(self._script(
+                    keys=[f"{self.PREFIXO}{host}"],
+                    args=[limite['taxa'], limite['rajada'], self.MAX_ESPERA]
+                ))
+            except Exception as e:
+                self._pausar_redis(e)
+                espera = self._local(host, limite)._reservar(self.MAX_ESPERA)
+
+        if espera is None:
+            raise LimiteExcedido(f"Quota de {host} esgotada (espera > {self.MAX_ESPERA:g}s)")
+        return espera
+
+    async def adquirir(self, host: str):
+        """
+        Espera (sem bloquear o event loop) pela vez de chamar o host
+
+        Se a espera for cancelada (timeout de quem chamou), a ficha é devolvida:
+        a quota só é gasta por requisições que de fato saem.
+        """
+        limite = self.LIMITES.get(host)
+        if limite is None:
+            return
+
+        chave = f"{self.PREFIXO}{host}"
+        client = self._obter_redis_async()
+        no_redis = client is not None
+        if no_redis:
+            try:
+                espera = self._espera_redis(await self._script_async(
+                    keys=[chave],
+                    args=[limite['taxa'], limite['rajada'], self.MAX_ESPERA]
+                ))
+            except Exception as e:
+                self._pausar_redis(e)
+                no_redis = False
+        if not no_redis:
+            espera = self._local(host, limite)._reservar(self.MAX_ESPERA)
+
+        if espera is None:
+            raise LimiteExcedido(f"Quota de {host} esgotada (espera > {self.MAX_ESPERA:g}s)")
+        if not espera:
+            return
+
+        try:
+            await asyncio.sleep(espera)
+        except asyncio.CancelledError:
+            if no_redis:
+                try:
+                    await self._script_devolver_async(keys=[chave], args=[limite['rajada']])
+                except Exception:
+                    pass
+            else:
+                self._local(host, limite).devolver()
+            raise
+
+    def adquirir_sincrono(self, host: str):
+        """Versão bloqueante para threads e tarefas do Celery"""
+        espera = self._reservar(host)
+        if espera:
+            time.sleep(espera)
+
+    def status(self) -> dict:
+        return {
+            'redis': (self._redis_client is not None or self._redis_async is not None) and time.monotonic() >= self._redis_pausado_ate,
+            'hosts': {host: {'por_minuto': round(limite['taxa'] * 60, 1), 'rajada': limite['rajada']}
+                      for host, limite in self.LIMITES.items()},
+        }
+
+
+# Instância global (Redis do REDIS_URL, conectado no primeiro uso)
+limites = LimitesHosts()
+
+
+def init_limites(redis_url: Optional[str] = None) -> LimitesHosts:
+    """Reconfigura os limites por host (ex.: outro Redis)"""
+    global limites
+    limites = LimitesHosts(redis_url)
+    return limites
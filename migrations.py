@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+Migrações versionadas do history.db
+Cada migração roda uma única vez, em transação própria, e fica registrada em schema_migrations
+"""
+import re
+import logging
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (versão, descrição, função que recebe o cursor)
+MIGRACOES: List[Tuple[int, str, Callable]] = []
+
+
+def migracao(versao: int, descricao: str):
+    """Registra uma função como migração de schema"""
+    def decorator(func):
+        MIGRACOES.append((versao, descricao, func))
+        MIGRACOES.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _colunas(cursor, tabela: str) -> set:
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _adicionar_coluna(cursor, tabela: str, coluna: str, tipo: str):
+    """ALTER TABLE ADD COLUMN apenas se a coluna ainda não existir (bancos antigos)"""
+    if coluna not in _colunas(cursor, tabela):
+        cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+
+# ============================================
+# MIGRAÇÕES
+# ============================================
+
+@migracao(1, "Schema base (searches, users, audit_logs, favorites, notes, tags, user_settings)")
+def _schema_base(cursor):
+    # Tabela de Buscas
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS searches (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        identifier   TEXT,
+        response     TEXT,
+        searched_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+        username     TEXT
+    )
+    """)
+
+    # Bancos muito antigos não tinham estas colunas
+    _adicionar_coluna(cursor, "searches", "response", "TEXT")
+    _adicionar_coluna(cursor, "searches", "username", "TEXT")
+
+    # Tabela de Usuários
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        is_admin INTEGER DEFAULT 0,
+        data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        ultimo_login DATETIME,
+        ip_acesso TEXT,
+        status INTEGER DEFAULT 1,
+        numero_consultas INTEGER DEFAULT 0
+    )
+    """)
+
+    _adicionar_coluna(cursor, "users", "data_criacao", "DATETIME")
+    _adicionar_coluna(cursor, "users", "ultimo_login", "DATETIME")
+    _adicionar_coluna(cursor, "users", "ip_acesso", "TEXT")
+    _adicionar_coluna(cursor, "users", "status", "INTEGER")
+    _adicionar_coluna(cursor, "users", "numero_consultas", "INTEGER")
+    _adicionar_coluna(cursor, "users", "senha_temporaria", "INTEGER DEFAULT 0")
+
+    # Tabela de Logs de Auditoria
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT,
+        username TEXT,
+        ip_address TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        details TEXT
+    )
+    """)
+
+    # Tabela de Favoritos
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS favorites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        search_id INTEGER,
+        username TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (search_id) REFERENCES searches(id)
+    )
+    """)
+
+    # Tabela de Notas/Comentários
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        search_id INTEGER,
+        username TEXT,
+        note TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (search_id) REFERENCES searches(id)
+    )
+    """)
+
+    # Tabela de Tags
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS tags (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        search_id INTEGER,
+        tag_name TEXT,
+        username TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (search_id) REFERENCES searches(id)
+    )
+    """)
+
+    # Tabela de Configurações do Usuário
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        dark_mode INTEGER DEFAULT 0,
+        notifications_enabled INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+@migracao(2, "Índices para histórico, dashboards, favoritos, notas, tags e auditoria")
+def _indices_consultas(cursor):
+    # Histórico do usuário (WHERE username = ? ORDER BY searched_at DESC)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_searches_username_searched_at ON searches(username, searched_at DESC)")
+    # Dashboards globais (faixas de data e agrupamentos por dia/hora)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_searches_searched_at ON searches(searched_at)")
+
+    # JOIN do histórico e listagem de favoritos
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_favorites_search_username ON favorites(search_id, username)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_favorites_username_created_at ON favorites(username, created_at DESC)")
+
+    # Última nota e tags de cada consulta
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_search_id ON notes(search_id, created_at DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tags_search_id ON tags(search_id, created_at)")
+
+    # Painel de logs, limpeza por data e relatório por usuário
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_username_timestamp ON audit_logs(username, timestamp DESC)")
+
+
+@migracao(3, "Índice do histórico com id para paginação keyset (searched_at, id)")
+def _indice_keyset_historico(cursor):
+    # ORDER BY searched_at DESC, id DESC direto do índice, sem ordenação parcial em memória
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_searches_username_searched_at_id ON searches(username, searched_at DESC, id DESC)")
+    cursor.execute("DROP INDEX IF EXISTS idx_searches_username_searched_at")
+
+
+@migracao(4, "Índice full-text (FTS5) do histórico: identificador, resposta, notas e tags")
+def _fts_historico(cursor):
+    # Tabela FTS própria (rowid = searches.id); notas e tags ficam concatenadas por consulta
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS searches_fts USING fts5(
+        identifier,
+        response,
+        notas,
+        tags,
+        username UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """)
+
+    # Consultas
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_searches_fts_insert AFTER INSERT ON searches BEGIN
+        INSERT INTO searches_fts (rowid, identifier, response, notas, tags, username)
+        VALUES (new.id, new.identifier, new.response, '', '', new.username);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_searches_fts_delete AFTER DELETE ON searches BEGIN
+        DELETE FROM searches_fts WHERE rowid = old.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_searches_fts_update AFTER UPDATE OF identifier, response, username ON searches BEGIN
+        UPDATE searches_fts
+        SET identifier = new.identifier, response = new.response, username = new.username
+        WHERE rowid = new.id;
+    END
+    """)
+
+    # Notas e tags: recalcula o texto agregado da consulta afetada
+    agregados = {
+        "notes": ("notas", "note", "note, search_id"),
+        "tags": ("tags", "tag_name", "tag_name, search_id"),
+    }
+    for tabela, (coluna_fts, coluna, colunas_update) in agregados.items():
+        recalcular = f"""
+            UPDATE searches_fts
+            SET {coluna_fts} = (SELECT COALESCE(group_concat({coluna}, ' '), '') FROM {tabela} WHERE search_id = {{ref}}.search_id)
+            WHERE rowid = {{ref}}.search_id;
+        """
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_fts_insert AFTER INSERT ON {tabela} BEGIN
+            {recalcular.format(ref="new")}
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_fts_update AFTER UPDATE OF {colunas_update} ON {tabela} BEGIN
+            {recalcular.format(ref="old")}
+            {recalcular.format(ref="new")}
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_fts_delete AFTER DELETE ON {tabela} BEGIN
+            {recalcular.format(ref="old")}
+        END
+        """)
+
+    # Carga inicial com o histórico existente
+    cursor.execute("""
+    INSERT INTO searches_fts (rowid, identifier, response, notas, tags, username)
+    SELECT s.id, s.identifier, s.response,
+           COALESCE((SELECT group_concat(n.note, ' ') FROM notes n WHERE n.search_id = s.id), ''),
+           COALESCE((SELECT group_concat(t.tag_name, ' ') FROM tags t WHERE t.search_id = s.id), ''),
+           s.username
+    FROM searches s
+    WHERE s.id NOT IN (SELECT rowid FROM searches_fts)
+    """)
+
+
+@migracao(5, "Tabelas de estatísticas agregadas (rollups) por usuário, dia e hora")
+def _rollups_estatisticas(cursor):
+    # Total por usuário (username NULL vira '')
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_consultas_usuario (
+        username TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+    # Consultas por usuário e dia (DATE(searched_at))
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_consultas_dia (
+        username TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (username, dia)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stats_consultas_dia_dia ON stats_consultas_dia(dia)")
+    # Consultas por usuário e hora do dia (0-23, todo o período)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_consultas_hora (
+        username TEXT NOT NULL,
+        hora INTEGER NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (username, hora)
+    ) WITHOUT ROWID
+    """)
+
+    # Contadores incrementais: +1 na inserção, -1 na remoção
+    for evento, ref, delta in (("INSERT", "new", "+ 1"), ("DELETE", "old", "- 1")):
+        valor_inicial = 1 if delta == "+ 1" else 0
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_searches_stats_{evento.lower()} AFTER {evento} ON searches BEGIN
+            INSERT INTO stats_consultas_usuario (username, total)
+            VALUES (COALESCE({ref}.username, ''), {valor_inicial})
+            ON CONFLICT (username) DO UPDATE SET total = total {delta};
+
+            INSERT INTO stats_consultas_dia (username, dia, total)
+            VALUES (COALESCE({ref}.username, ''), DATE({ref}.searched_at), {valor_inicial})
+            ON CONFLICT (username, dia) DO UPDATE SET total = total {delta};
+
+            INSERT INTO stats_consultas_hora (username, hora, total)
+            VALUES (COALESCE({ref}.username, ''), CAST(strftime('%H', {ref}.searched_at) AS INTEGER), {valor_inicial})
+            ON CONFLICT (username, hora) DO UPDATE SET total = total {delta};
+        END
+        """)
+
+    recalcular_estatisticas(cursor)
+
+
+def recalcular_estatisticas(cursor):
+    """Reconstrói os rollups a partir de searches (carga inicial ou correção de divergência)"""
+    cursor.execute("DELETE FROM stats_consultas_usuario")
+    cursor.execute("DELETE FROM stats_consultas_dia")
+    cursor.execute("DELETE FROM stats_consultas_hora")
+
+    cursor.execute("""
+    INSERT INTO stats_consultas_usuario (username, total)
+    SELECT COALESCE(username, ''), COUNT(*) FROM searches GROUP BY 1
+    """)
+    cursor.execute("""
+    INSERT INTO stats_consultas_dia (username, dia, total)
+    SELECT COALESCE(username, ''), DATE(searched_at), COUNT(*) FROM searches GROUP BY 1, 2
+    """)
+    cursor.execute("""
+    INSERT INTO stats_consultas_hora (username, hora, total)
+    SELECT COALESCE(username, ''), CAST(strftime('%H', searched_at) AS INTEGER), COUNT(*) FROM searches GROUP BY 1, 2
+    """)
+
+
+# ============================================
+# PARTIÇÕES MENSAIS DO audit_logs
+# ============================================
+
+PREFIXO_PARTICAO_AUDITORIA = "audit_logs_"
+_PARTICAO_AUDITORIA = re.compile(r"^audit_logs_(\d{6})$")
+
+
+def particao_auditoria(mes: str) -> str:
+    """Nome da tabela da partição do mês 'AAAAMM'"""
+    if not re.fullmatch(r"\d{6}", mes):
+        raise ValueError(f"Mês de partição inválido: {mes}")
+    return f"{PREFIXO_PARTICAO_AUDITORIA}{mes}"
+
+
+def mes_do_timestamp(timestamp: str) -> str:
+    """'AAAA-MM-DD HH:MM:SS' -> 'AAAAMM'"""
+    return f"{timestamp[:4]}{timestamp[5:7]}"
+
+
+def particoes_auditoria(cursor) -> List[str]:
+    """Meses ('AAAAMM') com partição criada, do mais antigo para o mais recente"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'audit_logs_[0-9]*'")
+    meses = [m.group(1) for (nome,) in cursor.fetchall() if (m := _PARTICAO_AUDITORIA.match(nome))]
+    return sorted(meses)
+
+
+def recriar_view_auditoria(cursor):
+    """audit_logs = UNION ALL de todas as partições (somente leitura)"""
+    meses = particoes_auditoria(cursor)
+    cursor.execute("DROP VIEW IF EXISTS audit_logs")
+    if not meses:
+        return
+    partes = " UNION ALL ".join(
+        f"SELECT id, action, username, ip_address, timestamp, details FROM {particao_auditoria(mes)}"
+        for mes in meses
+    )
+    cursor.execute(f"CREATE VIEW audit_logs AS {partes}")
+
+
+def criar_particao_auditoria(cursor, mes: str, recriar_view: bool = True) -> bool:
+    """
+    Cria a partição do mês se ainda não existir
+
+    A sequência AUTOINCREMENT da nova tabela começa no maior id já usado
+    pelas outras partições, então os ids continuam únicos na view.
+
+    Returns:
+        True se a partição foi criada agora
+    """
+    tabela = particao_auditoria(mes)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,))
+    if cursor.fetchone():
+        return False
+
+    cursor.execute(f"""
+    CREATE TABLE {tabela} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT,
+        username TEXT,
+        ip_address TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        details TEXT
+    )
+    """)
+    cursor.execute(f"CREATE INDEX idx_{tabela}_timestamp ON {tabela}(timestamp)")
+    cursor.execute(f"CREATE INDEX idx_{tabela}_username_timestamp ON {tabela}(username, timestamp DESC)")
+
+    cursor.execute("""
+    SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence
+    WHERE name = 'audit_logs' OR name GLOB 'audit_logs_[0-9]*'
+    """)
+    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (tabela, cursor.fetchone()[0]))
+
+    if recriar_view:
+        recriar_view_auditoria(cursor)
+    return True
+
+
+@migracao(6, "audit_logs particionado por mês (tabelas audit_logs_AAAAMM atrás de uma view)")
+def _particionar_auditoria(cursor):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'audit_logs'")
+    row = cursor.fetchone()
+    if row and row[0] == "table":
+        # Timestamp nulo ou que não é data (strftime devolve NULL) vai para o mês corrente
+        cursor.execute("""
+        SELECT DISTINCT COALESCE(strftime('%Y%m', timestamp), strftime('%Y%m', 'now')) FROM audit_logs
+        """)
+        for (mes,) in cursor.fetchall():
+            criar_particao_auditoria(cursor, mes, recriar_view=False)
+            cursor.execute(f"""
+            INSERT INTO {particao_auditoria(mes)} (id, action, username, ip_address, timestamp, details)
+            SELECT id, action, username, ip_address, COALESCE(timestamp, CURRENT_TIMESTAMP), details
+            FROM audit_logs
+            WHERE COALESCE(strftime('%Y%m', timestamp), strftime('%Y%m', 'now')) = ?
+            """, (mes,))
+        cursor.execute("DROP TABLE audit_logs")
+
+    cursor.execute("SELECT strftime('%Y%m', 'now')")
+    criar_particao_auditoria(cursor, cursor.fetchone()[0], recriar_view=False)
+    recriar_view_auditoria(cursor)
+
+
+@migracao(7, "Cache de respostas das fontes públicas de enriquecimento")
+def _cache_fontes(cursor):
+    # valor NULL = resposta negativa (não encontrado); tempos em epoch (segundos)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cache_fontes (
+        fonte TEXT NOT NULL,
+        chave TEXT NOT NULL,
+        valor TEXT,
+        fresco_ate REAL NOT NULL,
+        expira_em REAL NOT NULL,
+        atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (fonte, chave)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_fontes_expira_em ON cache_fontes(expira_em)")
+
+
+# ============================================
+# EXECUÇÃO
+# ============================================
+
+def versao_atual(cursor) -> int:
+    """Maior versão aplicada (0 se banco novo)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        descricao TEXT,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def aplicar_migracoes(db) -> int:
+    """
+    Aplica as migrações pendentes em ordem
+
+    Cada migração roda em BEGIN IMMEDIATE; a versão é relida dentro da
+    transação, então vários workers subindo juntos não aplicam duas vezes.
+
+    Returns:
+        Versão do schema após a execução
+    """
+    for versao, descricao, func in MIGRACOES:
+        with db.transacao(imediata=True) as cursor:
+            if versao <= versao_atual(cursor):
+                continue
+
+            func(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, descricao) VALUES (?, ?)",
+                (versao, descricao)
+            )
+            cursor.execute(f"PRAGMA user_version = {int(versao)}")
+            logger.info(f"🗄️ Migração {versao} aplicada: {descricao}")
+
+    with db.cursor() as cursor:
+        # Atualiza estatísticas do planner apenas quando necessário
+        cursor.execute("PRAGMA optimize")
+        return versao_atual(cursor)
+
+
+# ============================================
+# REGRESSÃO DE PLANOS (EXPLAIN QUERY PLAN)
+# ============================================
+
+# Consultas quentes que não podem voltar a fazer full table scan
+CONSULTAS_CRITICAS: Dict[str, Tuple[str, tuple]] = {
+    "historico_usuario": ("""
+        SELECT s.id, s.identifier, s.response, s.searched_at,
+               CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
+        FROM searches s
+        LEFT JOIN favorites f ON s.id = f.search_id AND f.username = ?
+        WHERE s.username = ?
+        ORDER BY s.searched_at DESC, s.id DESC
+        LIMIT 51
+    """, ("u", "u")),
+    "historico_proxima_pagina": ("""
+        SELECT s.id, s.identifier, substr(s.response, 1, 501), s.searched_at
+        FROM searches s
+        WHERE s.username = ? AND (s.searched_at, s.id) < (?, ?)
+        ORDER BY s.searched_at DESC, s.id DESC
+        LIMIT 51
+    """, ("u", "2026-01-01 00:00:00", 10)),
+    "historico_proxima_pagina_asc": ("""
+        SELECT s.id FROM searches s
+        WHERE s.username = ? AND (s.searched_at, s.id) > (?, ?)
+        ORDER BY s.searched_at ASC, s.id ASC
+        LIMIT 51
+    """, ("u", "2026-01-01 00:00:00", 10)),
+    "api_historico_admin": ("""
+        SELECT s.id FROM searches s
+        WHERE (s.searched_at, s.id) < (?, ?)
+        ORDER BY s.searched_at DESC, s.id DESC
+        LIMIT 51
+    """, ("2026-01-01 00:00:00", 10)),
+    "favoritos_usuario": ("""
+        SELECT s.id FROM searches s
+        INNER JOIN favorites f ON s.id = f.search_id
+        WHERE f.username = ?
+        ORDER BY f.created_at DESC
+    """, ("u",)),
+    "notas_da_pagina": ("""
+        SELECT search_id, note, created_at FROM notes
+        WHERE search_id IN (?, ?, ?)
+        ORDER BY search_id, created_at DESC
+    """, (1, 2, 3)),
+    "tags_da_pagina": ("""
+        SELECT search_id, tag_name FROM tags
+        WHERE search_id IN (?, ?, ?)
+        ORDER BY search_id, created_at
+    """, (1, 2, 3)),
+    "consultas_hoje_usuario": ("""
+        SELECT COUNT(*) FROM searches
+        WHERE username = ? AND searched_at >= DATE('now', 'localtime') AND searched_at < DATE('now', 'localtime', '+1 day')
+    """, ("u",)),
+    "dashboard_30_dias": ("""
+        SELECT DATE(searched_at) as dia, COUNT(*) as total
+        FROM searches
+        WHERE searched_at >= DATE('now', '-30 days')
+        GROUP BY DATE(searched_at)
+    """, ()),
+    "rollup_dashboard_30_dias": ("""
+        SELECT dia, SUM(total) FROM stats_consultas_dia
+        WHERE dia >= DATE('now', '-30 days')
+        GROUP BY dia
+        ORDER BY dia
+    """, ()),
+    "rollup_por_dia_usuario": ("""
+        SELECT dia, total FROM stats_consultas_dia
+        WHERE username = ? AND dia >= DATE('now', 'localtime', '-7 days')
+        ORDER BY dia DESC
+    """, ("u",)),
+    "cache_fonte": ("SELECT valor, fresco_ate, expira_em FROM cache_fontes WHERE fonte = ? AND chave = ?", ("cnae", "6201501")),
+    "limpeza_cache_fontes": ("SELECT chave FROM cache_fontes WHERE expira_em < ?", (0,)),
+    # {particao_auditoria} = partição mais recente do audit_logs
+    "logs_recentes": ("SELECT id FROM {particao_auditoria} ORDER BY timestamp DESC LIMIT 500", ()),
+    "limpeza_logs": ("SELECT id FROM {particao_auditoria} WHERE timestamp < datetime('now', '-2 days')", ()),
+    "logs_usuario": ("SELECT action FROM {particao_auditoria} WHERE username = ? ORDER BY timestamp DESC LIMIT 50", ("u",)),
+}
+
+# "SCAN tabela" sem "USING ... INDEX" = leitura da tabela inteira
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# Ordenação (total ou parcial) feita em memória em vez de pelo índice
+_TEMP_BTREE = re.compile(r"^USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY$")
+
+
+def verificar_planos(db) -> Dict[str, List[str]]:
+    """
+    Roda EXPLAIN QUERY PLAN nas consultas críticas
+
+    Returns:
+        {nome_da_consulta: [problemas]} - vazio se todas usam índices
+    """
+    problemas = {}
+    with db.cursor() as cursor:
+        particao = particao_auditoria(particoes_auditoria(cursor)[-1])
+        for nome, (sql, params) in CONSULTAS_CRITICAS.items():
+            sql = sql.replace("{particao_auditoria}", particao)
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            detalhes = [row[3] for row in cursor.fetchall()]
+            erros = [d for d in detalhes if _FULL_SCAN.match(d) or _TEMP_BTREE.match(d)]
+            if erros:
+                problemas[nome] = erros
+    return problemas
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from database import DatabaseManager
+
+    if len(sys.argv) < 2:
+        print("""
+Migrações do history.db
+
+Uso:
+  python migrations.py aplicar [arquivo.db]    - Aplicar migrações pendentes
+  python migrations.py status [arquivo.db]     - Mostrar versão e histórico
+  python migrations.py verificar [arquivo.db]  - Checar EXPLAIN QUERY PLAN (padrão: banco em memória)
+  python migrations.py recalcular [arquivo.db] - Reconstruir as estatísticas agregadas (rollups)
+        """)
+        sys.exit(0)
+
+    action = sys.argv[1].lower()
+    db_file = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("DB_FILE", "history.db")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if action == "aplicar":
+        versao = aplicar_migracoes(DatabaseManager(db_file))
+        print(f"✅ Schema na versão {versao}")
+    elif action == "status":
+        db = DatabaseManager(db_file)
+        with db.cursor() as cursor:
+            print(f"📌 Versão atual: {versao_atual(cursor)} (última disponível: {MIGRACOES[-1][0]})")
+            cursor.execute("SELECT version, descricao, applied_at FROM schema_migrations ORDER BY version")
+            for version, descricao, applied_at in cursor.fetchall():
+                print(f"   {version:>3}  {applied_at}  {descricao}")
+    elif action == "recalcular":
+        db = DatabaseManager(db_file)
+        aplicar_migracoes(db)
+        with db.transacao(imediata=True) as cursor:
+            recalcular_estatisticas(cursor)
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(total), 0) FROM stats_consultas_usuario")
+            usuarios, total = cursor.fetchone()
+        print(f"✅ Estatísticas recalculadas: {total} consultas de {usuarios} usuário(s)")
+    elif action == "verificar":
+        db = DatabaseManager(sys.argv[2] if len(sys.argv) > 2 else ":memory:")
+        aplicar_migracoes(db)
+        problemas = verificar_planos(db)
+        for nome, erros in problemas.items():
+            print(f"❌ {nome}: {'; '.join(erros)}")
+        if problemas:
+            sys.exit(1)
+        print(f"✅ {len(CONSULTAS_CRITICAS)} consultas críticas usando índices")
+    else:
+        print(f"❌ Ação desconhecida: {action}")
+        sys.exit(1)
@@ -4,12 +4,20 @@ Script robusto para extrair dados do Portal da Transparência
 - Pagamentos por CNPJ favorecido
 """
 
+import os
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 import time
-from typing import List, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, Union
+from urllib.parse import urlsplit
 import logging
 
+import limite_taxa
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,16 +26,149 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# ============================================================================
+# CONVERSÃO MONETÁRIA VETORIZADA
+# ============================================================================
+
+# Palavras que identificam colunas monetárias na auto-detecção
+PALAVRAS_MONETARIAS = ("valor", "remuner", "pagamento", "salario", "bonus", "auxilio")
+
+
+@lru_cache(maxsize=256)
+def _detectar_colunas_monetarias(colunas: Tuple) -> Tuple:
+    """Colunas cujo nome sugere valor monetário (memoizado: os lotes de uma extração repetem o schema)"""
+    return tuple(
+        coluna for coluna in colunas
+        if any(palavra in str(coluna).lower() for palavra in PALAVRAS_MONETARIAS)
+    )
+
+
+# Classe de cada byte para o parser: dígito, ponto, vírgula, sinal, ignorado (espaço/padding), R, $
+_INVALIDO, _DIGITO, _PONTO, _VIRGULA, _MENOS, _IGNORADO, _LETRA_R, _CIFRAO = range(8)
+_CLASSE_BYTE = np.full(256, _INVALIDO, dtype=np.int8)
+_CLASSE_BYTE[ord("0"):ord("9") + 1] = _DIGITO
+_CLASSE_BYTE[ord(".")] = _PONTO
+_CLASSE_BYTE[ord(",")] = _VIRGULA
+_CLASSE_BYTE[ord("-")] = _MENOS
+_CLASSE_BYTE[ord(" ")] = _IGNORADO
+_CLASSE_BYTE[0] = _IGNORADO  # padding do dtype de tamanho fixo
+_CLASSE_BYTE[ord("R")] = _LETRA_R
+_CLASSE_BYTE[ord("$")] = _CIFRAO
+
+_POTENCIAS_10 = 10.0 ** np.arange(23)
+
+# Até 15 dígitos a mantissa inteira é exata em float64, e mantissa / 10^casas dá o
+# mesmo float que float("...") (divisão IEEE de dois valores exatos é arredondada uma vez)
+_MAX_DIGITOS = 15
+_MAX_LARGURA = 32
+_BLOCO = 16384
+
+
+def _parse_monetario(textos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converter textos monetários ("1.250,50", "R$ 1250.50", "-R$ 12,5") sem laço por célula
+    
+    Os textos viram uma matriz de bytes (n x largura) percorrida coluna a coluna, com as
+    mesmas regras do _converter_valor_monetario: "R$" e espaços ignorados; com vírgula,
+    ela é o separador decimal e os pontos são de milhar; sem vírgula, o ponto é decimal.
+    
+    Returns:
+        (valores, ok): ok=False marca o que não está no formato simples (letras, expoente,
+        dois separadores, mais de 15 dígitos...) e deve ir para o conversor por célula
+    """
+    if len(textos) <= _BLOCO:
+        return _parse_bloco(textos)
+    # Blocos pequenos mantêm as colunas da matriz no cache do processador
+    partes = [_parse_bloco(textos[i:i + _BLOCO]) for i in range(0, len(textos), _BLOCO)]
+    return np.concatenate([p[0] for p in partes]), np.concatenate([p[1] for p in partes])
+
+
+def _parse_bloco(textos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Parser de um bloco de textos (ver _parse_monetario)"""
+    n = len(textos)
+    try:
+        bytes_ = np.asarray(textos, dtype="S")
+    except UnicodeEncodeError:
+        # Texto não ASCII (ex: espaço inseparável): coluna inteira pelo caminho por célula
+        return np.zeros(n), np.zeros(n, dtype=bool)
+    largura = bytes_.dtype.itemsize
+    if largura > _MAX_LARGURA:
+        return np.zeros(n), np.zeros(n, dtype=bool)
+    matriz = bytes_.view(np.uint8).reshape(n, largura)
+    
+    # Ordem Fortran: cada coluna de bytes é contígua no laço abaixo
+    classes = np.asfortranarray(_CLASSE_BYTE[matriz])
+    digitos = np.asfortranarray(matriz) - ord("0")
+    brasileiro = (classes == _VIRGULA).any(axis=1)
+    
+    mantissa = np.zeros(n)
+    n_digitos = np.zeros(n, dtype=np.int64)
+    casas = np.zeros(n, dtype=np.int64)
+    viu_separador = np.zeros(n, dtype=bool)
+    negativo = np.zeros(n, dtype=bool)
+    r_aberto = np.zeros(n, dtype=bool)
+    ok = np.ones(n, dtype=bool)
+    
+    for j in range(largura):
+        classe = classes[:, j]
+        
+        digito = classe == _DIGITO
+        mantissa = np.where(digito, mantissa * 10 + digitos[:, j], mantissa)
+        n_digitos += digito
+        casas += digito & viu_separador
+        
+        # Um único separador decimal
+        separador = np.where(brasileiro, classe == _VIRGULA, classe == _PONTO)
+        ok &= ~(separador & viu_separador)
+        viu_separador |= separador
+        
+        # Sinal só antes de qualquer dígito ou separador, e uma vez
+        menos = classe == _MENOS
+        ok &= ~(menos & ((n_digitos > 0) | viu_separador | negativo))
+        negativo |= menos
+        
+        # "R" só como parte de "R$"
+        ok &= ~(r_aberto ^ (classe == _CIFRAO))
+        r_aberto = classe == _LETRA_R
+        
+        ok &= classe != _INVALIDO
+    
+    ok &= ~r_aberto & (n_digitos > 0) & (n_digitos <= _MAX_DIGITOS)
+    
+    valores = mantissa / _POTENCIAS_10[np.minimum(casas, len(_POTENCIAS_10) - 1)]
+    return np.where(negativo, -valores, valores), ok
+
+
 class PortalTransparenciaAPI:
     """Cliente para Portal da Transparência com tratamento de paginação e dados"""
     
-    def __init__(self, api_token: str, base_url: str = "https://api.portaldatransparencia.gov.br"):
+    # Colunas monetárias comuns em remuneração
+    COLUNAS_REMUNERACAO = [
+        'salario', 'valor', 'remuneracao', 'bonus', 
+        'auxilio', 'gratificacao', 'abono', 'deducao',
+        'vale_refeicao', 'vale_transporte', 'insalubridade'
+    ]
+    
+    # Colunas monetárias comuns em despesas/pagamentos
+    COLUNAS_PAGAMENTOS = [
+        'valor', 'valor_liquido', 'valor_bruto', 'valor_documento',
+        'valor_pagamento', 'valor_desconto', 'valor_diaria',
+        'valor_empenho', 'valor_liquidacao'
+    ]
+    
+    def __init__(
+        self,
+        api_token: str,
+        base_url: str = "https://api.portaldatransparencia.gov.br",
+        paginas_em_voo: int = 4
+    ):
         """
         Inicializar cliente da API
         
         Args:
             api_token: Token/chave de autenticação da API
             base_url: URL base da API (padrão: Portal da Transparência oficial)
+            paginas_em_voo: Páginas requisitadas em paralelo na paginação (1 = sequencial)
         """
         self.api_token = api_token
         self.base_url = base_url
@@ -35,9 +176,15 @@ class PortalTransparenciaAPI:
             "Accept": "application/json",
             "api-token": api_token
         }
+        self.paginas_em_voo = max(1, paginas_em_voo)
         self.session = requests.Session()
         self.session.headers.update(self.headers)
-        self.rate_limit_delay = 0.5  # segundos entre requisições
+        # Uma conexão keep-alive por página em voo
+        adaptador = HTTPAdapter(pool_maxsize=max(10, self.paginas_em_voo))
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+        # Quota do host compartilhada com o app e os workers (limite_taxa)
+        self.host = urlsplit(base_url).hostname or ""
     
     def _converter_valor_monetario(self, valor: any) -> float:
         """
@@ -79,6 +226,52 @@ class PortalTransparenciaAPI:
             logger.warning(f"Não foi possível converter valor: {valor}")
             return 0.0
     
+    def _converter_coluna_monetaria(self, serie: pd.Series) -> pd.Series:
+        """
+        Versão vetorizada de _converter_valor_monetario para uma coluna inteira
+        
+        Números são convertidos direto; textos passam pelo parser em bytes (_parse_monetario);
+        só os valores fora do formato simples (ex: "1e5", lixo) caem no conversor por célula,
+        que mantém as mesmas regras e avisos
+        """
+        if pd.api.types.is_numeric_dtype(serie):
+            return serie.astype(float)
+        
+        valores = serie.to_numpy(dtype=object)
+        
+        # Caso comum (coluna só de textos, como a API devolve): direto para o parser
+        if pd.api.types.infer_dtype(valores, skipna=False) == "string":
+            resultado, ok = _parse_monetario(valores)
+            for i in np.flatnonzero(~ok):
+                resultado[i] = self._converter_valor_monetario(valores[i])
+            return pd.Series(resultado, index=serie.index, name=serie.name)
+        
+        resultado = np.zeros(len(valores))
+        tipos = np.fromiter(map(type, valores), dtype=object, count=len(valores))
+        eh_texto = tipos == str
+        eh_numero = (tipos == float) | (tipos == int)
+        if eh_numero.any():
+            resultado[eh_numero] = valores[eh_numero].astype(float)
+        
+        # None e vazios ficam 0.0 (NaN de float continua NaN, como no .apply antigo);
+        # o resto (bool, Decimal...) vai célula a célula
+        pendentes = ~(eh_texto | eh_numero | pd.isna(valores))
+        
+        if eh_texto.any():
+            posicoes = np.flatnonzero(eh_texto)
+            textos = valores[posicoes]
+            nao_vazios = textos != ""
+            posicoes, textos = posicoes[nao_vazios], textos[nao_vazios]
+            if len(textos):
+                convertidos, ok = _parse_monetario(textos)
+                resultado[posicoes[ok]] = convertidos[ok]
+                pendentes[posicoes[~ok]] = True
+        
+        for i in np.flatnonzero(pendentes):
+            resultado[i] = self._converter_valor_monetario(valores[i])
+        
+        return pd.Series(resultado, index=serie.index, name=serie.name)
+    
     def _normalizar_dataframe(self, df: pd.DataFrame, colunas_monetarias: List[str] = None) -> pd.DataFrame:
         """
         Normalizar DataFrame com tratamento de colunas monetárias
@@ -86,6 +279,7 @@ class PortalTransparenciaAPI:
         Args:
             df: DataFrame original
             colunas_monetarias: Lista de nomes de colunas que contêm valores monetários
+                (None = auto-detectar pelo nome da coluna)
             
         Returns:
             pd.DataFrame: DataFrame normalizado
@@ -97,43 +291,112 @@ class PortalTransparenciaAPI:
         if colunas_monetarias:
             for coluna in colunas_monetarias:
                 if coluna in df.columns:
-                    df[coluna] = df[coluna].apply(self._converter_valor_monetario)
+                    df[coluna] = self._converter_coluna_monetaria(df[coluna])
         else:
             # Auto-detectar colunas monetárias (contêm "valor", "remuner", "pagamento", etc)
-            colunas_suspeitas = [col for col in df.columns if any(
-                palavra in col.lower() for palavra in 
-                ["valor", "remuner", "pagamento", "salario", "bonus", "auxilio"]
-            )]
-            for coluna in colunas_suspeitas:
+            for coluna in _detectar_colunas_monetarias(tuple(df.columns)):
                 try:
-                    df[coluna] = df[coluna].apply(self._converter_valor_monetario)
+                    df[coluna] = self._converter_coluna_monetaria(df[coluna])
                 except:
                     pass
         
         return df
     
-    def buscar_remuneracao_cpf(
-        self, 
-        cpfs: List[str], 
+    @staticmethod
+    def _registros_pagina(dados_pagina) -> List[Dict]:
+        """Registros de uma página (lista direta ou dict com 'data'/'items'); [] = fim"""
+        if isinstance(dados_pagina, list):
+            return dados_pagina
+        if isinstance(dados_pagina, dict):
+            items = dados_pagina.get('data', dados_pagina.get('items', []))
+            if not items:
+                return []
+            return items if isinstance(items, list) else [items]
+        return []
+    
+    def _buscar_pagina(self, url: str, params: Dict, pagina: int, timeout: int) -> List[Dict]:
+        """Requisitar uma página (respeitando a quota do host) e extrair os registros"""
+        requisicao = {**params, "pagina": pagina}
+        logger.debug(f"Requisição: {url} | Parâmetros: {requisicao}")
+        
+        limite_taxa.limites.adquirir_sincrono(self.host)
+        response = self.session.get(
+            url,
+            params=requisicao,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        
+        return self._registros_pagina(response.json())
+    
+    def _paginas(self, url: str, params: Dict, rotulo: str, timeout: int) -> Iterator[List[Dict]]:
+        """
+        Gerar os registros de cada página até a primeira página vazia
+        
+        Mantém 'paginas_em_voo' requisições adiantadas (a quota do host continua valendo
+        para cada uma) e entrega as páginas sempre na ordem 1, 2, 3...; na primeira página
+        vazia ou com erro a paginação termina e as requisições adiantadas são descartadas
+        
+        Args:
+            url: Endpoint paginado
+            params: Parâmetros fixos (o número da página é acrescentado aqui)
+            rotulo: Identificação nos logs (ex: "CPF 123...")
+            timeout: Tempo limite por requisição em segundos
+        """
+        executor = ThreadPoolExecutor(max_workers=self.paginas_em_voo, thread_name_prefix="portal-paginacao")
+        em_voo: Dict[int, Future] = {}
+        proxima = 1
+        pagina = 1
+        try:
+            while True:
+                # Completar a janela de páginas adiantadas
+                while len(em_voo) < self.paginas_em_voo:
+                    em_voo[proxima] = executor.submit(self._buscar_pagina, url, params, proxima, timeout)
+                    proxima += 1
+                
+                try:
+                    registros = em_voo.pop(pagina).result()
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Erro na requisição ({rotulo}, página {pagina}): {str(e)}")
+                    return
+                except Exception as e:
+                    logger.error(f"Erro ao processar dados ({rotulo}, página {pagina}): {str(e)}")
+                    return
+                
+                # Lista vazia = final da paginação
+                if not registros:
+                    logger.info(f"{rotulo}: Fim da paginação na página {pagina - 1}")
+                    return
+                
+                logger.info(f"{rotulo}: Página {pagina} - {len(registros)} registros")
+                yield registros
+                pagina += 1
+        finally:
+            # Fim dos dados, erro ou consumidor parou de iterar: não esperar as adiantadas
+            for futuro in em_voo.values():
+                futuro.cancel()
+            executor.shutdown(wait=False)
+    
+    def iterar_remuneracao_cpf(
+        self,
+        cpfs: List[str],
         mes_ano: str,
         timeout: int = 15
-    ) -> pd.DataFrame:
+    ) -> Iterator[pd.DataFrame]:
         """
-        Extrair dados de remuneração de servidor público por CPF
+        Extrair remuneração por CPF em lotes (um DataFrame normalizado por página)
         
-        Paginação automática até lista vazia
+        Memória limitada ao tamanho de uma página; use com salvar_dados para gravar
+        extrações grandes de forma incremental
         
         Args:
             cpfs: Lista de CPFs (ex: ["11122233344", "55566677788"])
             mes_ano: Mês e ano (ex: "202401" para janeiro 2024)
             timeout: Tempo limite para requisição em segundos
-            
-        Returns:
-            pd.DataFrame: Dados consolidados de todos os CPFs
         """
         logger.info(f"Iniciando busca de remuneração para {len(cpfs)} CPF(s) - {mes_ano}")
         
-        todos_dados = []
+        url = f"{self.base_url}/api-v1/servidores/remuneracao"
         
         for cpf in cpfs:
             logger.info(f"Processando CPF: {cpf}")
@@ -141,216 +404,238 @@ class PortalTransparenciaAPI:
             # Limpar CPF (remover caracteres especiais)
             cpf_limpo = ''.join(c for c in cpf if c.isdigit())
             
-            pagina = 1
+            total = 0
             tempo_inicio = time.time()
             
-            while True:
-                try:
-                    # Construir URL
-                    url = f"{self.base_url}/api-v1/servidores/remuneracao"
-                    params = {
-                        "cpf": cpf_limpo,
-                        "mesAno": mes_ano,
-                        "pagina": pagina
-                    }
-                    
-                    logger.debug(f"Requisição: {url} | Parâmetros: {params}")
-                    
-                    # Fazer requisição
-                    response = self.session.get(
-                        url,
-                        params=params,
-                        timeout=timeout
-                    )
-                    response.raise_for_status()
-                    
-                    # Parsear resposta
-                    dados_pagina = response.json()
-                    
-                    # Verificar se é lista vazia (final da paginação)
-                    if isinstance(dados_pagina, list):
-                        if len(dados_pagina) == 0:
-                            logger.info(f"CPF {cpf}: Fim da paginação na página {pagina - 1}")
-                            break
-                        todos_dados.extend(dados_pagina)
-                    elif isinstance(dados_pagina, dict):
-                        # Se retornar dict com 'data' ou 'items'
-                        items = dados_pagina.get('data', dados_pagina.get('items', []))
-                        if not items:
-                            logger.info(f"CPF {cpf}: Fim da paginação na página {pagina - 1}")
-                            break
-                        todos_dados.extend(items if isinstance(items, list) else [items])
-                    
-                    logger.info(f"CPF {cpf}: Página {pagina} - {len(dados_pagina) if isinstance(dados_pagina, list) else 'dict'} registros")
-                    
-                    pagina += 1
-                    
-                    # Rate limiting
-                    time.sleep(self.rate_limit_delay)
-                    
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Erro na requisição (CPF {cpf}, página {pagina}): {str(e)}")
-                    break
-                except Exception as e:
-                    logger.error(f"Erro ao processar dados (CPF {cpf}, página {pagina}): {str(e)}")
-                    break
+            for registros in self._paginas(url, {"cpf": cpf_limpo, "mesAno": mes_ano}, f"CPF {cpf}", timeout):
+                total += len(registros)
+                yield self._normalizar_dataframe(pd.DataFrame(registros), self.COLUNAS_REMUNERACAO)
             
             tempo_total = time.time() - tempo_inicio
-            logger.info(f"CPF {cpf}: {len([d for d in todos_dados if d.get('cpf') == cpf_limpo])} registros obtidos em {tempo_total:.2f}s")
-        
-        # Converter para DataFrame
-        if not todos_dados:
-            logger.warning("Nenhum dado obtido")
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(todos_dados)
-        
-        # Colunas monetárias comuns em remuneração
-        colunas_monetarias = [
-            'salario', 'valor', 'remuneracao', 'bonus', 
-            'auxilio', 'gratificacao', 'abono', 'deducao',
-            'vale_refeicao', 'vale_transporte', 'insalubridade'
-        ]
-        
-        df = self._normalizar_dataframe(df, colunas_monetarias)
-        
-        logger.info(f"DataFrame final: {len(df)} linhas, {len(df.columns)} colunas")
-        
-        return df
+            logger.info(f"CPF {cpf}: {total} registros obtidos em {tempo_total:.2f}s")
     
-    def buscar_pagamentos_cnpj(
+    def iterar_pagamentos_cnpj(
         self,
         cnpj: str,
         ano: str = None,
         timeout: int = 15
-    ) -> pd.DataFrame:
+    ) -> Iterator[pd.DataFrame]:
         """
-        Extrair dados de pagamentos recebidos por CNPJ favorecido
-        
-        Paginação automática até lista vazia
+        Extrair pagamentos por CNPJ favorecido em lotes (um DataFrame normalizado por página)
         
         Args:
             cnpj: CNPJ favorecido (ex: "09464032000112")
             ano: Ano opcional (ex: "2024")
             timeout: Tempo limite para requisição em segundos
-            
-        Returns:
-            pd.DataFrame: Dados consolidados de pagamentos
         """
         logger.info(f"Iniciando busca de pagamentos para CNPJ: {cnpj}")
         
         # Limpar CNPJ
         cnpj_limpo = ''.join(c for c in cnpj if c.isdigit())
         
-        todos_dados = []
-        pagina = 1
+        url = f"{self.base_url}/api-v1/despesas/documentos-por-favorecido"
+        params = {"codigo": cnpj_limpo}
+        
+        # Adicionar ano se fornecido
+        if ano:
+            params["ano"] = ano
+        
+        total = 0
         tempo_inicio = time.time()
         
-        while True:
-            try:
-                # Construir URL
-                url = f"{self.base_url}/api-v1/despesas/documentos-por-favorecido"
-                params = {
-                    "codigo": cnpj_limpo,
-                    "pagina": pagina
-                }
-                
-                # Adicionar ano se fornecido
-                if ano:
-                    params["ano"] = ano
-                
-                logger.debug(f"Requisição: {url} | Parâmetros: {params}")
-                
-                # Fazer requisição
-                response = self.session.get(
-                    url,
-                    params=params,
-                    timeout=timeout
-                )
-                response.raise_for_status()
-                
-                # Parsear resposta
-                dados_pagina = response.json()
-                
-                # Verificar se é lista vazia (final da paginação)
-                if isinstance(dados_pagina, list):
-                    if len(dados_pagina) == 0:
-                        logger.info(f"CNPJ {cnpj}: Fim da paginação na página {pagina - 1}")
-                        break
-                    todos_dados.extend(dados_pagina)
-                elif isinstance(dados_pagina, dict):
-                    # Se retornar dict com 'data' ou 'items'
-                    items = dados_pagina.get('data', dados_pagina.get('items', []))
-                    if not items:
-                        logger.info(f"CNPJ {cnpj}: Fim da paginação na página {pagina - 1}")
-                        break
-                    todos_dados.extend(items if isinstance(items, list) else [items])
-                
-                logger.info(f"CNPJ {cnpj}: Página {pagina} - {len(dados_pagina) if isinstance(dados_pagina, list) else 'dict'} registros")
-                
-                pagina += 1
-                
-                # Rate limiting
-                time.sleep(self.rate_limit_delay)
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Erro na requisição (CNPJ {cnpj}, página {pagina}): {str(e)}")
-                break
-            except Exception as e:
-                logger.error(f"Erro ao processar dados (CNPJ {cnpj}, página {pagina}): {str(e)}")
-                break
+        for registros in self._paginas(url, params, f"CNPJ {cnpj}", timeout):
+            total += len(registros)
+            yield self._normalizar_dataframe(pd.DataFrame(registros), self.COLUNAS_PAGAMENTOS)
         
         tempo_total = time.time() - tempo_inicio
-        logger.info(f"CNPJ {cnpj}: {len(todos_dados)} registros obtidos em {tempo_total:.2f}s")
-        
-        # Converter para DataFrame
-        if not todos_dados:
+        logger.info(f"CNPJ {cnpj}: {total} registros obtidos em {tempo_total:.2f}s")
+    
+    @staticmethod
+    def _concatenar(lotes: List[pd.DataFrame]) -> pd.DataFrame:
+        if not lotes:
             logger.warning("Nenhum dado obtido")
             return pd.DataFrame()
         
-        df = pd.DataFrame(todos_dados)
+        df = pd.concat(lotes, ignore_index=True)
+        logger.info(f"DataFrame final: {len(df)} linhas, {len(df.columns)} colunas")
+        return df
+    
+    def buscar_remuneracao_cpf(
+        self, 
+        cpfs: List[str], 
+        mes_ano: str,
+        timeout: int = 15
+    ) -> pd.DataFrame:
+        """
+        Extrair dados de remuneração de servidor público por CPF
         
-        # Colunas monetárias comuns em despesas/pagamentos
-        colunas_monetarias = [
-            'valor', 'valor_liquido', 'valor_bruto', 'valor_documento',
-            'valor_pagamento', 'valor_desconto', 'valor_diaria',
-            'valor_empenho', 'valor_liquidacao'
-        ]
+        Paginação automática até lista vazia
         
-        df = self._normalizar_dataframe(df, colunas_monetarias)
+        Args:
+            cpfs: Lista de CPFs (ex: ["11122233344", "55566677788"])
+            mes_ano: Mês e ano (ex: "202401" para janeiro 2024)
+            timeout: Tempo limite para requisição em segundos
+            
+        Returns:
+            pd.DataFrame: Dados consolidados de todos os CPFs
+        """
+        return self._concatenar(list(self.iterar_remuneracao_cpf(cpfs, mes_ano, timeout)))
+    
+    def buscar_pagamentos_cnpj(
+        self,
+        cnpj: str,
+        ano: str = None,
+        timeout: int = 15
+    ) -> pd.DataFrame:
+        """
+        Extrair dados de pagamentos recebidos por CNPJ favorecido
         
-        logger.info(f"DataFrame final: {len(df)} linhas, {len(df.columns)} colunas")
+        Paginação automática até lista vazia
         
-        return df
+        Args:
+            cnpj: CNPJ favorecido (ex: "09464032000112")
+            ano: Ano opcional (ex: "2024")
+            timeout: Tempo limite para requisição em segundos
+            
+        Returns:
+            pd.DataFrame: Dados consolidados de pagamentos
+        """
+        return self._concatenar(list(self.iterar_pagamentos_cnpj(cnpj, ano, timeout)))
     
-    def salvar_dados(self, df: pd.DataFrame, caminho_arquivo: str, formato: str = 'csv') -> bool:
+    def salvar_dados(
+        self,
+        dados: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        caminho_arquivo: str,
+        formato: str = 'csv'
+    ) -> bool:
         """
-        Salvar DataFrame em arquivo
+        Salvar DataFrame (ou lotes de DataFrames) em arquivo
+        
+        Com lotes (ex: iterar_pagamentos_cnpj), CSV, JSON e Parquet são gravados
+        incrementalmente: as colunas do primeiro lote definem o arquivo e os lotes
+        seguintes são alinhados a elas. A gravação vai para um arquivo temporário
+        renomeado só no sucesso: em caso de erro não fica arquivo parcial
         
         Args:
-            df: DataFrame a salvar
+            dados: DataFrame ou iterável de DataFrames
             caminho_arquivo: Caminho do arquivo (ex: "dados.csv")
             formato: Formato ('csv', 'excel', 'json', 'parquet')
             
         Returns:
             bool: Sucesso da operação
         """
+        # Mesma extensão no temporário (o pandas escolhe o engine do Excel por ela)
+        raiz, extensao = os.path.splitext(caminho_arquivo)
+        temporario = f"{raiz}.parcial{extensao}"
         try:
+            if not isinstance(dados, pd.DataFrame):
+                if formato == 'excel':
+                    # Excel não tem gravação incremental
+                    dados = self._concatenar(list(dados))
+                else:
+                    linhas = self._salvar_lotes(dados, temporario, formato)
+                    os.replace(temporario, caminho_arquivo)
+                    logger.info(f"Dados salvos em: {caminho_arquivo} ({linhas} linhas)")
+                    return True
+            
+            df = dados
             if formato == 'csv':
-                df.to_csv(caminho_arquivo, index=False, encoding='utf-8')
+                df.to_csv(temporario, index=False, encoding='utf-8')
             elif formato == 'excel':
-                df.to_excel(caminho_arquivo, index=False)
+                df.to_excel(temporario, index=False)
             elif formato == 'json':
-                df.to_json(caminho_arquivo, orient='records', force_ascii=False)
+                df.to_json(temporario, orient='records', force_ascii=False)
             elif formato == 'parquet':
-                df.to_parquet(caminho_arquivo, index=False)
+                df.to_parquet(temporario, index=False)
+            else:
+                raise ValueError(f"Formato desconhecido: {formato}")
+            os.replace(temporario, caminho_arquivo)
             
             logger.info(f"Dados salvos em: {caminho_arquivo}")
             return True
         except Exception as e:
             logger.error(f"Erro ao salvar arquivo: {str(e)}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
             return False
     
+    @staticmethod
+    def _alinhar_lotes(lotes: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Lotes não vazios com as colunas do primeiro (o arquivo tem um único cabeçalho/schema)"""
+        colunas = None
+        for lote in lotes:
+            if lote.empty:
+                continue
+            if colunas is None:
+                colunas = list(lote.columns)
+            else:
+                extras = [c for c in lote.columns if c not in colunas]
+                if extras:
+                    logger.warning(f"Colunas fora do primeiro lote descartadas: {extras}")
+                lote = lote.reindex(columns=colunas)
+            yield lote
+    
+    @staticmethod
+    def _schema_parquet(schema):
+        """
+        Schema do arquivo a partir do primeiro lote, tolerante aos lotes seguintes:
+        coluna toda nula vira texto e inteiro vira float (NaN ou 3.5 em página posterior)
+        """
+        import pyarrow as pa
+        
+        campos = []
+        for campo in schema:
+            if pa.types.is_null(campo.type):
+                campo = campo.with_type(pa.large_string())
+            elif pa.types.is_integer(campo.type):
+                campo = campo.with_type(pa.float64())
+            campos.append(campo)
+        return pa.schema(campos)
+    
+    def _salvar_lotes(self, lotes: Iterable[pd.DataFrame], caminho_arquivo: str, formato: str) -> int:
+        """Gravar lotes um a um (só um lote em memória por vez); retorna o total de linhas"""
+        linhas = 0
+        lotes = self._alinhar_lotes(lotes)
+        
+        if formato == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            escritor = None
+            try:
+                for lote in lotes:
+                    # Cada lote com os tipos inferidos dele, convertidos para o schema do arquivo
+                    tabela = pa.Table.from_pandas(lote, preserve_index=False).replace_schema_metadata(None)
+                    if escritor is None:
+                        escritor = pq.ParquetWriter(caminho_arquivo, self._schema_parquet(tabela.schema))
+                    escritor.write_table(tabela.cast(escritor.schema))
+                    linhas += len(lote)
+            finally:
+                if escritor is not None:
+                    escritor.close()
+            if escritor is None:
+                pd.DataFrame().to_parquet(caminho_arquivo, index=False)
+            return linhas
+        
+        if formato not in ('csv', 'json'):
+            raise ValueError(f"Formato sem gravação incremental: {formato}")
+        
+        with open(caminho_arquivo, 'w', encoding='utf-8', newline='') as arquivo:
+            if formato == 'json':
+                arquivo.write('[')
+            for lote in lotes:
+                if formato == 'csv':
+                    lote.to_csv(arquivo, index=False, header=(linhas == 0))
+                else:
+                    # Lista JSON única: registros de cada lote sem os colchetes
+                    registros = lote.to_json(orient='records', force_ascii=False)[1:-1]
+                    arquivo.write((',' if linhas else '') + registros)
+                linhas += len(lote)
+            if formato == 'json':
+                arquivo.write(']')
+        
+        return linhas
+    
     def obter_estatisticas(self, df: pd.DataFrame) -> Dict:
         """
         Gerar estatísticas do DataFrame
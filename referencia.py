@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Dados de referência locais (CNAE/IBGE e CEP)
+Importador para um SQLite próprio (referencia.db) + índice em memória consultado
+antes de qualquer chamada de rede por buscar_cnae_ibge e buscar_cep_viacep
+"""
+import os
+import csv
+import json
+import bisect
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+URL_CNAE_SUBCLASSES = "https://servicodados.ibge.gov.br/api/v2/cnae/subclasses"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cnae (
+    codigo TEXT PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    nivel TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cep_faixas (
+    cep_inicial INTEGER PRIMARY KEY,
+    cep_final INTEGER NOT NULL,
+    localidade TEXT NOT NULL,
+    uf TEXT NOT NULL,
+    ibge TEXT
+);
+
+CREATE TABLE IF NOT EXISTS ceps (
+    cep TEXT PRIMARY KEY,
+    logradouro TEXT,
+    complemento TEXT,
+    bairro TEXT,
+    localidade TEXT,
+    uf TEXT
+) WITHOUT ROWID;
+"""
+
+
+class ReferenciaLocal:
+    """
+    Índice em memória dos dados de referência
+
+    CNAE (~2 mil códigos) e faixas de CEP por localidade (~10 mil) ficam em memória;
+    CEPs individuais (tabela grande, opcional) são lidos do SQLite pela chave primária.
+    """
+
+    def __init__(self, db_file: str = "referencia.db"):
+        self.db_file = db_file
+        self._local = threading.local()
+        self.cnae: Dict[str, Tuple[str, str]] = {}
+        self._faixas_inicio: List[int] = []
+        self._faixas: List[Tuple[int, int, str, str]] = []
+        self.tem_ceps = False
+
+    def _conexao(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.db_file):
+                return None
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def carregar(self) -> dict:
+        """(Re)carrega CNAE e faixas de CEP para a memória"""
+        conn = self._conexao()
+        if conn is None:
+            logger.info(f"ℹ️ Dados de referência não encontrados ({self.db_file}) - usando só as APIs")
+            return self.status()
+
+        self.cnae = {codigo: (descricao, nivel) for codigo, descricao, nivel in conn.execute("SELECT codigo, descricao, nivel FROM cnae")}
+        self._faixas = conn.execute("SELECT cep_inicial, cep_final, localidade, uf FROM cep_faixas ORDER BY cep_inicial").fetchall()
+        self._faixas_inicio = [faixa[0] for faixa in self._faixas]
+        self.tem_ceps = conn.execute("SELECT EXISTS (SELECT 1 FROM ceps)").fetchone()[0] == 1
+
+        logger.info(f"✅ Referência local: {len(self.cnae)} CNAE, {len(self._faixas)} faixas de CEP")
+        return self.status()
+
+    def buscar_cnae(self, codigo: str) -> Optional[dict]:
+        """Código só com dígitos (subclasse 7, classe 5, grupo 3, divisão 2) -> mesmo formato do IBGE"""
+        encontrado = self.cnae.get(codigo)
+        if not encontrado:
+            return None
+        descricao, nivel = encontrado
+        return {
+            "codigo": codigo,
+            "descricao": descricao,
+            "nivel": nivel,
+            "fonte": "IBGE CNAE (local)"
+        }
+
+    def buscar_cep(self, cep: str) -> Optional[dict]:
+        """CEP com 8 dígitos -> mesmo formato do buscar_cep_viacep (logradouro vazio se só houver a faixa)"""
+        if self.tem_ceps and (conn := self._conexao()):
+            row = conn.execute(
+                "SELECT cep, logradouro, complemento, bairro, localidade, uf FROM ceps WHERE cep = ?", (cep,)
+            ).fetchone()
+            if row:
+                return {
+                    "cep": row[0],
+                    "logradouro": row[1] or "",
+                    "bairro": row[3] or "",
+                    "localidade": row[4] or "",
+                    "uf": row[5] or "",
+                    "complemento": row[2] or ""
+                }
+        return self.localidade_cep(cep)
+
+    def localidade_cep(self, cep: str) -> Optional[dict]:
+        """Localidade/UF pela faixa de CEP (busca binária no índice em memória)"""
+        if not cep.isdigit() or not self._faixas:
+            return None
+        numero = int(cep)
+        posicao = bisect.bisect_right(self._faixas_inicio, numero) - 1
+        if posicao < 0:
+            return None
+        inicio, fim, localidade, uf = self._faixas[posicao]
+        if numero > fim:
+            return None
+        return {"cep": cep, "logradouro": "", "bairro": "", "localidade": localidade, "uf": uf, "complemento": ""}
+
+    def status(self) -> dict:
+        return {
+            "arquivo": self.db_file,
+            "cnae": len(self.cnae),
+            "faixas_cep": len(self._faixas),
+            "ceps": self.tem_ceps,
+        }
+
+
+# ============================================
+# IMPORTAÇÃO
+# ============================================
+
+def _abrir_para_escrita(db_file: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_file)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def importar_cnae(db_file: str, origem: Optional[str] = None) -> int:
+    """
+    Importa as subclasses CNAE do IBGE (e suas classes, grupos, divisões e seções)
+
+    origem: arquivo JSON no formato de /api/v2/cnae/subclasses; sem origem, baixa da API
+    """
+    if origem:
+        with open(origem, encoding="utf-8") as f:
+            subclasses = json.load(f)
+    else:
+        import requests
+        response = requests.get(URL_CNAE_SUBCLASSES, timeout=60)
+        response.raise_for_status()
+        subclasses = response.json()
+
+    registros: Dict[str, Tuple[str, str]] = {}
+    for subclasse in subclasses:
+        registros[str(subclasse["id"])] = (subclasse["descricao"], "Subclasse")
+        classe = subclasse.get("classe") or {}
+        grupo = classe.get("grupo") or {}
+        divisao = grupo.get("divisao") or {}
+        secao = divisao.get("secao") or {}
+        for item, nivel in ((classe, "Classe"), (grupo, "Grupo"), (divisao, "Divisão"), (secao, "Seção")):
+            if item.get("id"):
+                registros.setdefault(str(item["id"]), (item.get("descricao", ""), nivel))
+
+    conn = _abrir_para_escrita(db_file)
+    with conn:
+        conn.execute("DELETE FROM cnae")
+        conn.executemany(
+            "INSERT INTO cnae (codigo, descricao, nivel) VALUES (?, ?, ?)",
+            ((codigo, descricao, nivel) for codigo, (descricao, nivel) in registros.items())
+        )
+    conn.close()
+    return len(registros)
+
+
+def _so_digitos(valor: str) -> str:
+    return "".join(c for c in str(valor) if c.isdigit())
+
+
+def importar_faixas_cep(db_file: str, arquivo_csv: str) -> int:
+    """CSV com cabeçalho: cep_inicial,cep_final,localidade,uf[,ibge]"""
+    with open(arquivo_csv, encoding="utf-8", newline="") as f:
+        linhas = [
+            (int(_so_digitos(r["cep_inicial"])), int(_so_digitos(r["cep_final"])), r["localidade"].strip(), r["uf"].strip().upper(), r.get("ibge"))
+            for r in csv.DictReader(f)
+        ]
+
+    conn = _abrir_para_escrita(db_file)
+    with conn:
+        conn.execute("DELETE FROM cep_faixas")
+        conn.executemany(
+            "INSERT OR REPLACE INTO cep_faixas (cep_inicial, cep_final, localidade, uf, ibge) VALUES (?, ?, ?, ?, ?)",
+            linhas
+        )
+    conn.close()
+    return len(linhas)
+
+
+def importar_ceps(db_file: str, arquivo_csv: str, lote: int = 50000) -> int:
+    """CSV com cabeçalho: cep,logradouro,complemento,bairro,localidade,uf (lido em lotes)"""
+    conn = _abrir_para_escrita(db_file)
+    total = 0
+    with open(arquivo_csv, encoding="utf-8", newline="") as f, conn:
+        conn.execute("DELETE FROM ceps")
+        buffer = []
+        for r in csv.DictReader(f):
+            buffer.append((
+                _so_digitos(r["cep"]).zfill(8), r.get("logradouro"), r.get("complemento"),
+                r.get("bairro"), r.get("localidade"), (r.get("uf") or "").upper()
+            ))
+            if len(buffer) >= lote:
+                conn.executemany("INSERT OR REPLACE INTO ceps VALUES (?, ?, ?, ?, ?, ?)", buffer)
+                total += len(buffer)
+                buffer = []
+        if buffer:
+            conn.executemany("INSERT OR REPLACE INTO ceps VALUES (?, ?, ?, ?, ?, ?)", buffer)
+            total += len(buffer)
+    conn.execute("VACUUM")
+    conn.close()
+    return total
+
+
+# Instância global (índice vazio até carregar()); padrão ao lado do app, como o history.db
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+referencia = ReferenciaLocal(os.environ.get("REFERENCIA_DB", os.path.join(BASE_DIR, "referencia.db")))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("""
+Dados de referência locais (CNAE e CEP)
+
+Uso:
+  python referencia.py importar-cnae [subclasses.json]  - Importar CNAE (sem arquivo: baixa da API do IBGE)
+  python referencia.py importar-faixas-cep <arquivo.csv> - Faixas de CEP por localidade (cep_inicial,cep_final,localidade,uf[,ibge])
+  python referencia.py importar-ceps <arquivo.csv>       - CEPs individuais (cep,logradouro,complemento,bairro,localidade,uf)
+  python referencia.py status                            - Quantidade de registros carregados
+  python referencia.py cnae <codigo> | cep <cep>         - Consultar o índice local
+
+Arquivo: REFERENCIA_DB (padrão: referencia.db ao lado deste script)
+        """)
+        sys.exit(0)
+
+    action = sys.argv[1].lower()
+    db_file = referencia.db_file
+
+    if action == "importar-cnae":
+        total = importar_cnae(db_file, sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"✅ {total} códigos CNAE importados em {db_file}")
+    elif action in ("importar-faixas-cep", "importar-ceps"):
+        if len(sys.argv) < 3:
+            print("❌ Especifique o arquivo CSV")
+            sys.exit(1)
+        importar = importar_faixas_cep if action == "importar-faixas-cep" else importar_ceps
+        total = importar(db_file, sys.argv[2])
+        print(f"✅ {total} registros importados em {db_file}")
+    elif action == "status":
+        print(referencia.carregar())
+    elif action in ("cnae", "cep") and len(sys.argv) > 2:
+        referencia.carregar()
+        codigo = _so_digitos(sys.argv[2])
+        print(referencia.buscar_cnae(codigo) if action == "cnae" else referencia.buscar_cep(codigo))
+    else:
+        print(f"❌ Ação desconhecida: {action}")
+        sys.exit(1)
@@ -0,0 +1,984 @@
+"""
+Repositório de dados (camada assíncrona de acesso ao SQLite)
+Cada função contém o SQL síncrono e é exposta como corrotina que roda no
+executor dedicado do DatabaseManager - as rotas async nunca bloqueiam o event loop.
+A versão síncrona continua disponível em `funcao.sincrono` (threads, scripts).
+"""
+import re
+import sqlite3
+import base64
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+from migrations import (
+    criar_particao_auditoria, mes_do_timestamp, particao_auditoria,
+    particoes_auditoria, recriar_view_auditoria,
+)
+
+
+def em_executor(func):
+    """Transforma uma função SQL síncrona em corrotina executada no executor do banco"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await database.db.executar(func, *args, **kwargs)
+
+    wrapper.sincrono = func
+    return wrapper
+
+
+# ============================================
+# USUÁRIOS
+# ============================================
+
+@em_executor
+def buscar_usuario_login(username: str) -> Optional[tuple]:
+    """Retorna (id, is_admin, status, senha_temporaria, password) do usuário"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT id, is_admin, status, senha_temporaria, password FROM users WHERE username = ?", (username,))
+        return cursor.fetchone()
+
+
+@em_executor
+def buscar_papel_usuario(username: str) -> Optional[tuple]:
+    """Retorna (is_admin, status) do usuário"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT is_admin, status FROM users WHERE username = ?", (username,))
+        return cursor.fetchone()
+
+
+@em_executor
+def buscar_usuario_por_id(user_id: int) -> Optional[tuple]:
+    """Retorna (username,) do usuário"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
+        return cursor.fetchone()
+
+
+@em_executor
+def atualizar_senha(user_id: int, senha_hash: str):
+    """Grava nova senha (já em hash) pelo id"""
+    with database.db.transacao() as cursor:
+        cursor.execute("UPDATE users SET password = ? WHERE id = ?", (senha_hash, user_id))
+
+
+@em_executor
+def atualizar_senha_temporaria(username: str, senha_hash: str):
+    """Grava nova senha e remove a marcação de senha temporária"""
+    with database.db.transacao() as cursor:
+        cursor.execute(
+            "UPDATE users SET password = ?, senha_temporaria = 0 WHERE username = ?",
+            (senha_hash, username)
+        )
+
+
+@em_executor
+def registrar_ultimo_login(user_id: int):
+    """Atualiza a data do último login"""
+    with database.db.cursor() as cursor:
+        cursor.execute("UPDATE users SET ultimo_login = CURRENT_TIMESTAMP WHERE id = ?", (user_id,))
+
+
+@em_executor
+def listar_usuarios() -> List[tuple]:
+    """Lista usuários para o painel de gestão (compatível com bancos antigos)"""
+    with database.db.cursor() as cursor:
+        try:
+            # Tentar com as novas colunas
+            cursor.execute("SELECT id, username, is_admin, data_criacao, ultimo_login, status, numero_consultas FROM users ORDER BY data_criacao DESC")
+            return cursor.fetchall()
+        except sqlite3.OperationalError:
+            # Se falhar, usar query com colunas básicas + valores padrão
+            cursor.execute("SELECT id, username, is_admin, CURRENT_TIMESTAMP, NULL, 1, 0 FROM users ORDER BY id DESC")
+            return cursor.fetchall()
+
+
+@em_executor
+def criar_usuario(username: str, senha_hash: str, is_admin: bool, senha_temporaria: bool):
+    """Cria um novo usuário"""
+    with database.db.transacao() as cursor:
+        cursor.execute(
+            "INSERT INTO users (username, password, is_admin, senha_temporaria) VALUES (?, ?, ?, ?)",
+            (username, senha_hash, 1 if is_admin else 0, 1 if senha_temporaria else 0)
+        )
+
+
+@em_executor
+def remover_usuario(user_id: int):
+    """Remove um usuário (nunca remove admins)"""
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM users WHERE id = ? AND is_admin = 0", (user_id,))
+
+
+@em_executor
+def importar_usuarios(usuarios: List[Tuple[str, str, int]]) -> Tuple[int, int]:
+    """Insere (username, senha_hash, is_admin) em uma transação. Retorna (adicionados, ignorados)"""
+    added = 0
+    skipped = 0
+    with database.db.transacao() as cursor:
+        for new_user, hashed_password, is_admin in usuarios:
+            try:
+                cursor.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)",
+                             (new_user, hashed_password, is_admin))
+                added += 1
+            except sqlite3.IntegrityError:
+                skipped += 1
+    return added, skipped
+
+
+@em_executor
+def restaurar_usuarios(usuarios: List[dict]) -> int:
+    """Restaura usuários de um backup JSON. Retorna quantidade restaurada"""
+    restored = 0
+    with database.db.transacao() as cursor:
+        for user in usuarios:
+            try:
+                cursor.execute("INSERT OR REPLACE INTO users (id, username, password, is_admin) VALUES (?, ?, ?, ?)",
+                             (user["id"], user["username"], user["password"], 1 if user.get("is_admin", False) else 0))
+                restored += 1
+            except:
+                pass
+    return restored
+
+
+@em_executor
+def alternar_permissao(user_id: int) -> Optional[Tuple[str, int]]:
+    """Alterna admin/operador. Retorna (username, novo_is_admin) ou None se não encontrado/protegido"""
+    with database.db.transacao(imediata=True) as cursor:
+        cursor.execute("SELECT is_admin, username FROM users WHERE id = ?", (user_id,))
+        user = cursor.fetchone()
+
+        if not user or user[1] == "admin":  # Não permitir mudar admin padrão
+            return None
+
+        novo_admin = 0 if user[0] == 1 else 1
+        cursor.execute("UPDATE users SET is_admin = ? WHERE id = ?", (novo_admin, user_id))
+    return user[1], novo_admin
+
+
+@em_executor
+def alternar_status(user_id: int) -> Optional[Tuple[str, int]]:
+    """Ativa/desativa usuário. Retorna (username, novo_status) ou None se não encontrado"""
+    with database.db.transacao(imediata=True) as cursor:
+        cursor.execute("SELECT status, username FROM users WHERE id = ?", (user_id,))
+        user = cursor.fetchone()
+
+        if not user:
+            return None
+
+        novo_status = 0 if user[0] == 1 else 1
+        cursor.execute("UPDATE users SET status = ? WHERE id = ?", (novo_status, user_id))
+    return user[1], novo_status
+
+
+@em_executor
+def exportar_usuarios() -> List[tuple]:
+    """Retorna (username, is_admin, data_criacao, status) de todos os usuários"""
+    with database.db.cursor() as cursor:
+        try:
+            # Tentar com todas as colunas novas primeiro
+            cursor.execute("SELECT username, is_admin, data_criacao, status FROM users")
+            return cursor.fetchall()
+        except sqlite3.OperationalError:
+            # Fallback para bancos antigos - sem data_criacao
+            cursor.execute("SELECT username, is_admin, status FROM users")
+            resultado_antigo = cursor.fetchall()
+            return [(u[0], u[1], None, u[2] if len(u) > 2 else 1) for u in resultado_antigo]
+
+
+@em_executor
+def listar_usuarios_backup() -> List[tuple]:
+    """Retorna (id, username, is_admin, status) sem senha"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT id, username, is_admin, status FROM users ORDER BY id")
+        return cursor.fetchall()
+
+
+@em_executor
+def estatisticas_usuarios() -> Dict[str, Any]:
+    """Contadores de usuários para o painel de gestão"""
+    with database.db.transacao() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM users")
+        total_users = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
+        total_admins = cursor.fetchone()[0]
+
+        # Tentar com a coluna 'status', se não existir usar valor padrão
+        try:
+            cursor.execute("SELECT COUNT(*) FROM users WHERE status = 1")
+            total_ativos = cursor.fetchone()[0]
+        except sqlite3.OperationalError:
+            total_ativos = total_users
+
+        # Tentar com a coluna 'data_criacao', se não existir usar 0
+        try:
+            cursor.execute("SELECT COUNT(*) FROM users WHERE DATE(data_criacao) = DATE('now')")
+            users_hoje = cursor.fetchone()[0]
+        except sqlite3.OperationalError:
+            users_hoje = 0
+
+        # Tentar com a coluna 'numero_consultas', se não existir usar 0
+        try:
+            cursor.execute("SELECT SUM(numero_consultas) FROM users")
+            total_consultas = cursor.fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            total_consultas = 0
+
+    return {
+        "total_users": total_users,
+        "total_admins": total_admins,
+        "total_operadores": total_users - total_admins,
+        "total_ativos": total_ativos,
+        "users_hoje": users_hoje,
+        "total_consultas": total_consultas
+    }
+
+
+# ============================================
+# CONSULTAS (searches)
+# ============================================
+
+@em_executor
+def salvar_consulta(identifier: str, response: str, username: str) -> int:
+    """Grava uma consulta no histórico. Retorna o id"""
+    with database.db.transacao() as cursor:
+        cursor.execute(
+            "INSERT INTO searches (identifier, response, username) VALUES (?, ?, ?)",
+            (identifier, response, username)
+        )
+        return cursor.lastrowid
+
+
+@em_executor
+def buscar_consulta(search_id: int, username: str) -> Optional[tuple]:
+    """Retorna (id, identifier, response, searched_at) se a consulta pertence ao usuário"""
+    with database.db.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, identifier, response, searched_at FROM searches WHERE id = ? AND username = ?",
+            (search_id, username)
+        )
+        return cursor.fetchone()
+
+
+@em_executor
+def listar_consultas(username: Optional[str] = None, limite: Optional[int] = None) -> List[tuple]:
+    """
+    Retorna (id, identifier, response, searched_at) mais recentes primeiro
+
+    Args:
+        username: Filtra pelo usuário (None = todos, apenas admin)
+        limite: Máximo de linhas (None = sem limite)
+    """
+    sql = "SELECT id, identifier, response, searched_at FROM searches"
+    params: list = []
+    if username is not None:
+        sql += " WHERE username = ?"
+        params.append(username)
+    sql += " ORDER BY searched_at DESC"
+    if limite:
+        sql += " LIMIT ?"
+        params.append(limite)
+
+    with database.db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+@em_executor
+def listar_respostas(username: Optional[str] = None) -> List[tuple]:
+    """Retorna (id, identifier, response) para busca reversa (None = todos)"""
+    with database.db.cursor() as cursor:
+        if username is None:
+            cursor.execute("SELECT id, identifier, response FROM searches")
+        else:
+            cursor.execute("SELECT id, identifier, response FROM searches WHERE username = ?", (username,))
+        return cursor.fetchall()
+
+
+@em_executor
+def limpar_historico(username: str):
+    """Remove todas as consultas do usuário"""
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM searches WHERE username = ?", (username,))
+
+
+# Máximo de parâmetros por IN (...) - abaixo do limite de variáveis do SQLite
+_LOTE_IN = 500
+
+
+def _em_lotes(ids: List[int]):
+    for i in range(0, len(ids), _LOTE_IN):
+        yield ids[i:i + _LOTE_IN]
+
+
+# Caracteres da resposta enviados na listagem (o texto completo vem de /api/consulta/{id})
+TAMANHO_RESUMO = 500
+
+# Resumo + 1 caractere para saber se a resposta foi cortada
+_RESUMO_SQL = f"substr(s.response, 1, {TAMANHO_RESUMO + 1})"
+
+
+def codificar_cursor(searched_at: str, search_id: int) -> str:
+    """Cursor opaco da paginação keyset (searched_at, id)"""
+    return base64.urlsafe_b64encode(f"{searched_at}|{search_id}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Retorna (searched_at, id) ou None se o cursor for inválido"""
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        searched_at, search_id = texto.rsplit("|", 1)
+        return searched_at, int(search_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _filtro_keyset(apos: Optional[Tuple[str, int]], ordem: str, prefixo: str = "s.") -> Tuple[str, list]:
+    """Condição para continuar depois do cursor, no mesmo sentido da ordenação"""
+    operador = "<" if ordem == "desc" else ">"
+    return f"({prefixo}searched_at, {prefixo}id) {operador} (?, ?)", [apos[0], apos[1]]
+
+
+def _pagina(linhas: List[tuple], limite: int, chave=None) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Corta a linha extra (limite + 1) e gera o cursor da próxima página
+
+    Args:
+        chave: Extrai (posição, id) da última linha (padrão: searched_at, id)
+    """
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    posicao, search_id = chave(linhas[-1]) if chave else (linhas[-1][3], linhas[-1][0])
+    return linhas, codificar_cursor(posicao, search_id)
+
+
+# Delimitadores do trecho encontrado pelo FTS (trocados por <mark> depois de escapar o HTML)
+MARCA_INICIO = "\x02"
+MARCA_FIM = "\x03"
+
+
+def _como_float(valor: str) -> Optional[float]:
+    try:
+        return float(valor)
+    except ValueError:
+        return None
+
+
+def _consulta_fts(termo: str) -> Optional[str]:
+    """
+    Converte o texto digitado em consulta FTS5 segura
+
+    Cada palavra vira um prefixo entre aspas ("joao"*), todas obrigatórias;
+    operadores e aspas digitados pelo usuário não são interpretados.
+    """
+    palavras = re.findall(r"\w+", termo or "")
+    if not palavras:
+        return None
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def _anexar_notas_tags(cursor, searches: List[tuple]) -> List[dict]:
+    """
+    Monta as linhas do histórico com resumo, última nota e tags de cada consulta
+
+    Notas e tags vêm em duas consultas IN (...) para a página inteira,
+    em vez de duas consultas por linha.
+    """
+    ids = [s[0] for s in searches]
+    ultima_nota: Dict[int, tuple] = {}
+    tags: Dict[int, List[str]] = {}
+
+    for lote in _em_lotes(ids):
+        marcadores = ",".join("?" * len(lote))
+
+        # Mais recente primeiro: a primeira nota vista de cada consulta é a última escrita
+        cursor.execute(f"""
+            SELECT search_id, note, created_at FROM notes
+            WHERE search_id IN ({marcadores})
+            ORDER BY search_id, created_at DESC
+        """, lote)
+        for search_id, note, created_at in cursor.fetchall():
+            ultima_nota.setdefault(search_id, (note, created_at))
+
+        cursor.execute(f"""
+            SELECT search_id, tag_name FROM tags
+            WHERE search_id IN ({marcadores})
+            ORDER BY search_id, created_at
+        """, lote)
+        for search_id, tag_name in cursor.fetchall():
+            tags.setdefault(search_id, []).append(tag_name)
+
+    consultas = []
+    for s in searches:
+        note_row = ultima_nota.get(s[0])
+        resumo = s[2] or ""
+        consultas.append({
+            "id": s[0],
+            "identifier": s[1],
+            "resumo": resumo[:TAMANHO_RESUMO],
+            "truncado": len(resumo) > TAMANHO_RESUMO,
+            "searched_at": s[3],
+            "is_favorite": s[4] == 1,
+            "trecho": s[5] if len(s) > 5 else None,
+            "note": note_row[0] if note_row else None,
+            "note_created_at": note_row[1] if note_row else None,
+            "tags": tags.get(s[0], [])
+        })
+    return consultas
+
+
+@em_executor
+def listar_historico(username: str, dias: Optional[int] = None, termo: str = "",
+                     ordem: str = "desc", limite: int = 50,
+                     apos: Optional[Tuple[str, int]] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Página do histórico do usuário com resumo, favorito, última nota e tags
+
+    Paginação keyset em (searched_at, id): o custo de cada página é o mesmo
+    independente da profundidade, ao contrário de OFFSET. Com termo de busca,
+    o filtro usa o índice FTS5 e cada linha traz o trecho encontrado.
+
+    Args:
+        dias: Limita aos últimos N dias (None = sem filtro de período)
+        termo: Busca no identificador, resposta, notas e tags
+        ordem: "desc" (mais recentes primeiro), "asc" ou "relevancia" (só com termo)
+        apos: Posição da última linha da página anterior (vinda do cursor)
+
+    Returns:
+        (consultas, cursor da próxima página ou None)
+    """
+    consulta_fts = _consulta_fts(termo)
+    if ordem == "relevancia" and not consulta_fts:
+        ordem = "desc"
+
+    join_params: list = []
+    join_fts = ""
+    colunas_fts = "NULL, NULL"
+    if consulta_fts:
+        # bm25: identificador pesa mais, depois notas/tags, por último o texto da resposta
+        join_fts = f"""
+            JOIN (
+                SELECT rowid AS search_id,
+                       bm25(searches_fts, 10.0, 1.0, 5.0, 5.0) AS relevancia,
+                       snippet(searches_fts, -1, ?, ?, '…', 16) AS trecho
+                FROM searches_fts
+                WHERE searches_fts MATCH ? AND username = ?
+            ) b ON b.search_id = s.id
+        """
+        join_params.extend([MARCA_INICIO, MARCA_FIM, consulta_fts, username])
+        colunas_fts = "b.trecho, b.relevancia"
+
+    where_clauses = ["s.username = ?"]
+    params: list = join_params + [username, username]  # JOIN FTS, LEFT JOIN favoritos e WHERE
+
+    # Filtro de período
+    if dias:
+        where_clauses.append("s.searched_at >= DATE('now', ?)")
+        params.append(f"-{int(dias)} days")
+
+    # Continuação a partir do cursor
+    if ordem == "relevancia":
+        chave = lambda linha: (repr(linha[6]), linha[0])
+        relevancia_anterior = _como_float(apos[0]) if apos else None
+        if relevancia_anterior is not None:
+            where_clauses.append("(b.relevancia, s.id) > (?, ?)")
+            params.extend([relevancia_anterior, apos[1]])
+        order_by = "b.relevancia ASC, s.id ASC"
+    else:
+        chave = lambda linha: (linha[3], linha[0])
+        if apos:
+            condicao, valores = _filtro_keyset(apos, ordem)
+            where_clauses.append(condicao)
+            params.extend(valores)
+        # id desempata consultas no mesmo segundo
+        order_by = "s.searched_at DESC, s.id DESC" if ordem == "desc" else "s.searched_at ASC, s.id ASC"
+
+    where_sql = " AND ".join(where_clauses)
+    params.append(limite + 1)
+
+    with database.db.transacao() as cursor:
+        cursor.execute(f"""
+            SELECT s.id, s.identifier, {_RESUMO_SQL}, s.searched_at,
+                   CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite,
+                   {colunas_fts}
+            FROM searches s
+            {join_fts}
+            LEFT JOIN favorites f ON s.id = f.search_id AND f.username = ?
+            WHERE {where_sql}
+            ORDER BY {order_by}
+            LIMIT ?
+        """, params)
+        linhas, proximo = _pagina(cursor.fetchall(), limite, chave)
+        return _anexar_notas_tags(cursor, linhas), proximo
+
+
+@em_executor
+def listar_resumos(username: Optional[str] = None, limite: int = 50,
+                   apos: Optional[Tuple[str, int]] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Página de consultas (id, identificador, resumo, data) para a API, mais recentes primeiro
+
+    Args:
+        username: Filtra pelo usuário (None = todos, apenas admin)
+        apos: Posição (searched_at, id) da última linha da página anterior
+    """
+    where_clauses = []
+    params: list = []
+    if username is not None:
+        where_clauses.append("s.username = ?")
+        params.append(username)
+    if apos:
+        condicao, valores = _filtro_keyset(apos, "desc")
+        where_clauses.append(condicao)
+        params.extend(valores)
+    where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    params.append(limite + 1)
+
+    with database.db.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT s.id, s.identifier, {_RESUMO_SQL}, s.searched_at
+            FROM searches s
+            {where_sql}
+            ORDER BY s.searched_at DESC, s.id DESC
+            LIMIT ?
+        """, params)
+        linhas, proximo = _pagina(cursor.fetchall(), limite)
+
+    return [
+        {
+            "id": s[0],
+            "identifier": s[1],
+            "resumo": (s[2] or "")[:TAMANHO_RESUMO],
+            "truncado": len(s[2] or "") > TAMANHO_RESUMO,
+            "searched_at": s[3]
+        }
+        for s in linhas
+    ], proximo
+
+
+@em_executor
+def listar_favoritos(username: str) -> List[dict]:
+    """Consultas favoritas do usuário com última nota e tags"""
+    with database.db.transacao() as cursor:
+        cursor.execute(f"""
+            SELECT s.id, s.identifier, {_RESUMO_SQL}, s.searched_at,
+                   CASE WHEN f.id IS NOT NULL THEN 1 ELSE 0 END as is_favorite
+            FROM searches s
+            INNER JOIN favorites f ON s.id = f.search_id
+            WHERE f.username = ?
+            ORDER BY f.created_at DESC
+        """, (username,))
+        return _anexar_notas_tags(cursor, cursor.fetchall())
+
+
+@em_executor
+def estatisticas_consultas(username: str, is_admin: bool = False) -> Dict[str, Any]:
+    """Estatísticas de consultas do usuário ou do sistema inteiro (admin)
+
+    Lê apenas os rollups (stats_consultas_*), mantidos por triggers em searches,
+    então o custo não cresce com o tamanho do histórico.
+    """
+    stats = {}
+    filtro_usuario = "" if is_admin else "username = ? AND "
+    params = () if is_admin else (username,)
+
+    with database.db.transacao() as cursor:
+        # Total de consultas
+        if is_admin:
+            cursor.execute("SELECT COALESCE(SUM(total), 0) FROM stats_consultas_usuario")
+        else:
+            cursor.execute("SELECT COALESCE(SUM(total), 0) FROM stats_consultas_usuario WHERE username = ?", (username,))
+        stats['total_consultas'] = cursor.fetchone()[0]
+
+        # Consultas por dia (últimos 30 dias); hoje, semana e mês saem da mesma leitura
+        cursor.execute(f"""
+            SELECT dia, SUM(total) as total,
+                   dia >= DATE('now', 'localtime') AS hoje,
+                   dia >= DATE('now', 'localtime', '-7 days') AS semana
+            FROM stats_consultas_dia
+            WHERE {filtro_usuario}dia >= DATE('now', 'localtime', '-30 days')
+            GROUP BY dia
+            ORDER BY dia DESC
+        """, params)
+        por_dia = cursor.fetchall()
+        stats['consultas_hoje'] = sum(total for _, total, hoje, _ in por_dia if hoje)
+        stats['consultas_semana'] = sum(total for _, total, _, semana in por_dia if semana)
+        stats['consultas_mes'] = sum(total for _, total, _, _ in por_dia)
+        stats['consultas_por_dia'] = [(dia, total) for dia, total, _, semana in por_dia if semana]
+
+        # Horário de pico (hora com mais consultas)
+        cursor.execute(f"""
+            SELECT hora, SUM(total) as total
+            FROM stats_consultas_hora
+            {"WHERE username = ?" if not is_admin else ""}
+            GROUP BY hora
+            HAVING SUM(total) > 0
+            ORDER BY total DESC
+            LIMIT 1
+        """, params)
+        pico = cursor.fetchone()
+        stats['horario_pico'] = f"{pico[0]:02d}:00" if pico else "N/A"
+        stats['consultas_pico'] = pico[1] if pico else 0
+
+        # Se for admin, busca top usuários
+        if is_admin:
+            stats['top_usuarios'] = _top_usuarios(cursor, 5)
+        else:
+            stats['top_usuarios'] = []
+
+        # Total de favoritos
+        cursor.execute("SELECT COUNT(*) FROM favorites WHERE username = ?", (username,))
+        stats['total_favoritos'] = cursor.fetchone()[0]
+
+    return stats
+
+
+def _top_usuarios(cursor, limite: int) -> List[Tuple[str, int]]:
+    """Usuários com mais consultas (excluindo admin, None, T), a partir do rollup"""
+    cursor.execute("""
+        SELECT username, total
+        FROM stats_consultas_usuario
+        WHERE username NOT IN ('', 'admin', 'None', 'T') AND total > 0
+        ORDER BY total DESC
+        LIMIT ?
+    """, (limite,))
+    return cursor.fetchall()
+
+
+@em_executor
+def estatisticas_dashboard() -> Dict[str, Any]:
+    """Dados dos gráficos do dashboard administrativo (lidos dos rollups)"""
+    with database.db.transacao() as cursor:
+        # Consultas dos últimos 30 dias
+        cursor.execute("""
+            SELECT dia, SUM(total) as total
+            FROM stats_consultas_dia
+            WHERE dia >= DATE('now', '-30 days')
+            GROUP BY dia
+            HAVING SUM(total) > 0
+            ORDER BY dia
+        """)
+        consultas_30_dias = cursor.fetchall()
+
+        # Top 10 usuários (excluindo admin, None, T)
+        top_usuarios = _top_usuarios(cursor, 10)
+
+        # Consultas por hora do dia
+        cursor.execute("""
+            SELECT hora, SUM(total) as total
+            FROM stats_consultas_hora
+            GROUP BY hora
+            HAVING SUM(total) > 0
+            ORDER BY hora
+        """)
+        consultas_por_hora = cursor.fetchall()
+
+        # Total de usuários
+        cursor.execute("SELECT COUNT(*) FROM users")
+        total_usuarios = cursor.fetchone()[0]
+
+    return {
+        'consultas_ultimos_30_dias': [(row[0], row[1]) for row in consultas_30_dias],
+        'top_usuarios': top_usuarios,
+        'consultas_por_hora': consultas_por_hora,
+        'total_usuarios': total_usuarios
+    }
+
+
+@em_executor
+def relatorio_mensal() -> Dict[str, Any]:
+    """Consultas por mês, usuários mais ativos e resumo de auditoria do mês"""
+    with database.db.transacao() as cursor:
+        # Consultas por mês
+        cursor.execute("""
+            SELECT strftime('%Y-%m', searched_at) as mes, COUNT(*) as total
+            FROM searches
+            WHERE searched_at >= DATE('now', '-12 months')
+            GROUP BY mes
+            ORDER BY mes DESC
+        """)
+        consultas_mes = cursor.fetchall()
+
+        # Usuários mais ativos no mês atual
+        cursor.execute("""
+            SELECT username, COUNT(*) as total
+            FROM searches
+            WHERE searched_at >= strftime('%Y-%m-01', 'now')
+            GROUP BY username
+            ORDER BY total DESC
+            LIMIT 10
+        """)
+        usuarios_ativos = cursor.fetchall()
+
+        # Logs de auditoria críticos (só a partição do mês atual)
+        cursor.execute("SELECT strftime('%Y%m', 'now')")
+        mes_atual = cursor.fetchone()[0]
+        logs_resumo = []
+        if mes_atual in particoes_auditoria(cursor):
+            cursor.execute(f"""
+                SELECT action, COUNT(*) as total
+                FROM {particao_auditoria(mes_atual)}
+                GROUP BY action
+                ORDER BY total DESC
+            """)
+            logs_resumo = cursor.fetchall()
+
+    return {
+        "consultas_por_mes": consultas_mes,
+        "usuarios_ativos": usuarios_ativos,
+        "logs_resumo": logs_resumo
+    }
+
+
+@em_executor
+def relatorio_usuario(target_username: str) -> Dict[str, Any]:
+    """Total, consultas por dia e últimos logs de um usuário"""
+    with database.db.transacao() as cursor:
+        # Total de consultas
+        cursor.execute("SELECT COUNT(*) FROM searches WHERE username = ?", (target_username,))
+        total_consultas = cursor.fetchone()[0]
+
+        # Consultas por dia
+        cursor.execute("""
+            SELECT DATE(searched_at) as data, COUNT(*) as total
+            FROM searches
+            WHERE username = ?
+            GROUP BY data
+            ORDER BY data DESC
+            LIMIT 30
+        """, (target_username,))
+        consultas_por_dia = cursor.fetchall()
+
+        # Logs de auditoria
+        logs = _logs_recentes(cursor, "action, timestamp, details", 50, "username = ?", (target_username,))
+
+    return {
+        "username": target_username,
+        "total_consultas": total_consultas,
+        "consultas_por_dia": consultas_por_dia,
+        "logs": logs
+    }
+
+
+@em_executor
+def contagens_saude() -> Dict[str, int]:
+    """Contadores usados no health check"""
+    with database.db.transacao() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM searches")
+        total_searches = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM users")
+        total_users = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM audit_logs")
+        total_logs = cursor.fetchone()[0]
+
+    return {
+        "total_searches": total_searches,
+        "total_users": total_users,
+        "total_logs": total_logs
+    }
+
+
+# ============================================
+# AUDITORIA
+# ============================================
+
+# Partições já conhecidas por este processo (evita consultar sqlite_master a cada lote)
+_particoes_criadas: set = set()
+
+
+def _logs_recentes(cursor, colunas: str, limite: int, filtro: str = "", params: tuple = ()) -> List[tuple]:
+    """Logs mais recentes percorrendo as partições do mês atual para trás, só até completar o limite"""
+    where = f"WHERE {filtro}" if filtro else ""
+    logs = []
+    for mes in reversed(particoes_auditoria(cursor)):
+        cursor.execute(f"""
+            SELECT {colunas}
+            FROM {particao_auditoria(mes)}
+            {where}
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (*params, limite - len(logs)))
+        logs.extend(cursor.fetchall())
+        if len(logs) >= limite:
+            break
+    return logs
+
+
+def registrar_logs_lote(linhas: List[tuple]) -> int:
+    """Grava várias entradas (action, username, ip_address, timestamp, details) numa transação"""
+    if not linhas:
+        return 0
+
+    por_mes: Dict[str, List[tuple]] = {}
+    for linha in linhas:
+        por_mes.setdefault(mes_do_timestamp(linha[3]), []).append(linha)
+
+    with database.db.transacao(imediata=True) as cursor:
+        for mes, linhas_mes in por_mes.items():
+            if mes not in _particoes_criadas:
+                criar_particao_auditoria(cursor, mes)
+                _particoes_criadas.add(mes)
+            cursor.executemany(
+                f"INSERT INTO {particao_auditoria(mes)} (action, username, ip_address, timestamp, details) VALUES (?, ?, ?, ?, ?)",
+                linhas_mes
+            )
+    return len(linhas)
+
+
+@em_executor
+def listar_logs(limite: int = 500) -> List[tuple]:
+    """Retorna (id, action, username, ip_address, timestamp, details) mais recentes"""
+    with database.db.cursor() as cursor:
+        return _logs_recentes(cursor, "id, action, username, ip_address, timestamp, details", limite)
+
+
+@em_executor
+def remover_logs_antigos(dias: int) -> int:
+    """
+    Remove logs com mais de N dias. Retorna quantidade removida
+
+    Meses inteiramente anteriores ao corte saem com DROP TABLE; só a partição
+    do mês do corte recebe um DELETE (pelo índice de timestamp). A partição mais
+    recente nunca é removida, para a sequência de ids continuar crescente.
+    """
+    with database.db.transacao(imediata=True) as cursor:
+        cursor.execute("SELECT datetime('now', ?)", (f'-{dias} days',))
+        corte = cursor.fetchone()[0]
+        mes_corte = mes_do_timestamp(corte)
+        meses = particoes_auditoria(cursor)
+
+        removidos = 0
+        descartadas = [mes for mes in meses[:-1] if mes < mes_corte]
+        for mes in descartadas:
+            tabela = particao_auditoria(mes)
+            cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+            removidos += cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE {tabela}")
+            _particoes_criadas.discard(mes)
+
+        for mes in meses:
+            if mes >= mes_corte or mes == meses[-1]:
+                cursor.execute(f"DELETE FROM {particao_auditoria(mes)} WHERE timestamp < ?", (corte,))
+                removidos += cursor.rowcount
+                break
+
+        if descartadas:
+            recriar_view_auditoria(cursor)
+        return removidos
+
+
+# ============================================
+# CACHE DAS FONTES DE ENRIQUECIMENTO
+# ============================================
+
+@em_executor
+def ler_cache_fonte(fonte: str, chave: str) -> Optional[Tuple[Optional[str], float, float]]:
+    """Retorna (valor_json ou None se negativo, fresco_ate, expira_em) ou None se ausente"""
+    with database.db.cursor() as cursor:
+        cursor.execute(
+            "SELECT valor, fresco_ate, expira_em FROM cache_fontes WHERE fonte = ? AND chave = ?",
+            (fonte, chave)
+        )
+        return cursor.fetchone()
+
+
+@em_executor
+def gravar_cache_fonte(fonte: str, chave: str, valor: Optional[str], fresco_ate: float, expira_em: float):
+    with database.db.transacao() as cursor:
+        cursor.execute("""
+            INSERT INTO cache_fontes (fonte, chave, valor, fresco_ate, expira_em)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (fonte, chave) DO UPDATE SET
+                valor = excluded.valor,
+                fresco_ate = excluded.fresco_ate,
+                expira_em = excluded.expira_em,
+                atualizado_em = CURRENT_TIMESTAMP
+        """, (fonte, chave, valor, fresco_ate, expira_em))
+
+
+@em_executor
+def remover_cache_fontes_expirado(agora: float) -> int:
+    """Remove entradas além da janela stale. Retorna quantidade removida"""
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM cache_fontes WHERE expira_em < ?", (agora,))
+        return cursor.rowcount
+
+
+# ============================================
+# FAVORITOS
+# ============================================
+
+@em_executor
+def adicionar_favorito(search_id: int, username: str):
+    with database.db.transacao() as cursor:
+        cursor.execute("INSERT INTO favorites (search_id, username) VALUES (?, ?)", (search_id, username))
+
+
+@em_executor
+def remover_favorito(search_id: int, username: str):
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM favorites WHERE search_id = ? AND username = ?", (search_id, username))
+
+
+# ============================================
+# NOTAS
+# ============================================
+
+@em_executor
+def salvar_nota(search_id: int, username: str, note: str):
+    """Cria ou atualiza a nota do usuário na consulta"""
+    with database.db.transacao(imediata=True) as cursor:
+        # Verificar se já existe nota
+        cursor.execute("SELECT id FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
+        existing = cursor.fetchone()
+
+        if existing:
+            # Atualizar nota existente
+            cursor.execute("UPDATE notes SET note = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (note, existing[0]))
+        else:
+            # Criar nova nota
+            cursor.execute("INSERT INTO notes (search_id, username, note) VALUES (?, ?, ?)", (search_id, username, note))
+
+
+@em_executor
+def buscar_nota(search_id: int, username: str) -> Optional[tuple]:
+    """Retorna (note, updated_at)"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT note, updated_at FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
+        return cursor.fetchone()
+
+
+@em_executor
+def remover_nota(search_id: int, username: str):
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM notes WHERE search_id = ? AND username = ?", (search_id, username))
+
+
+# ============================================
+# TAGS
+# ============================================
+
+@em_executor
+def adicionar_tag(search_id: int, tag_name: str, username: str):
+    with database.db.transacao() as cursor:
+        cursor.execute("INSERT INTO tags (search_id, tag_name, username) VALUES (?, ?, ?)", (search_id, tag_name, username))
+
+
+@em_executor
+def remover_tag(tag_id: int, username: str):
+    with database.db.transacao() as cursor:
+        cursor.execute("DELETE FROM tags WHERE id = ? AND username = ?", (tag_id, username))
+
+
+@em_executor
+def listar_tags(search_id: int, username: str) -> List[tuple]:
+    """Retorna (id, tag_name) das tags do usuário na consulta"""
+    with database.db.cursor() as cursor:
+        cursor.execute("SELECT id, tag_name FROM tags WHERE search_id = ? AND username = ?", (search_id, username))
+        return cursor.fetchall()
@@ -0,0 +1,35 @@
+"""Snapshots do cache de estatísticas não podem ser alterados por quem os lê"""
+import asyncio
+
+import cache_manager as cache_redis
+from cache_estatisticas import CacheEstatisticas
+
+
+def _rodar(coro):
+    return asyncio.run(coro)
+
+
+def test_dashboard_nao_altera_snapshot(monkeypatch):
+    monkeypatch.setattr(cache_redis, 'cache_manager', None)
+    cache = CacheEstatisticas(ttl=60)
+    _rodar(cache.set('admin', True, {'total_consultas': 3}))
+
+    # Mesmo fluxo de admin_dashboard: lê o snapshot e acrescenta os dados dos gráficos
+    stats = _rodar(cache.get('admin', True))
+    stats = {**stats, **{'consultas_por_dia': [1, 2]}}
+    stats['total_consultas'] = 99
+
+    assert _rodar(cache.get('admin', True)) == {'total_consultas': 3}
+
+
+def test_get_e_set_copiam_o_dict(monkeypatch):
+    monkeypatch.setattr(cache_redis, 'cache_manager', None)
+    cache = CacheEstatisticas(ttl=60)
+    original = {'total_consultas': 1}
+    _rodar(cache.set('ana', False, original))
+    original['extra'] = True
+
+    lido = _rodar(cache.get('ana', False))
+    lido['outro'] = True
+
+    assert _rodar(cache.get('ana', False)) == {'total_consultas': 1}
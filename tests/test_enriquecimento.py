@@ -0,0 +1,20 @@
+"""Registro de fontes de enriquecimento"""
+import pytest
+
+from enriquecimento import FonteEnriquecimento, RegistroFontes
+
+
+async def _buscar(*args):
+    return {}
+
+
+def _fonte(nome: str, timeout: float) -> FonteEnriquecimento:
+    return FonteEnriquecimento(nome, _buscar, entrada=lambda ctx, dep: (), timeout=timeout)
+
+
+def test_registrar_recusa_timeout_acima_do_prazo():
+    registro = RegistroFontes(prazo=10)
+    registro.registrar(_fonte("no_limite", 10))
+    with pytest.raises(ValueError, match="excede o prazo global"):
+        registro.registrar(_fonte("lenta", 15))
+    assert "lenta" not in registro.fontes
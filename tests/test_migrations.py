@@ -0,0 +1,43 @@
+"""Migrações do history.db"""
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+from migrations import MIGRACOES, aplicar_migracoes, particoes_auditoria, verificar_planos
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "history.db"))
+    yield db
+    db.encerrar()
+
+
+def test_particionar_auditoria_aceita_timestamp_invalido(db):
+    # Banco antigo: audit_logs ainda é tabela, com timestamps nulos e que não são data
+    conn = sqlite3.connect(db.db_file)
+    conn.execute("""
+    CREATE TABLE audit_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT, username TEXT,
+        ip_address TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, details TEXT
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO audit_logs (action, timestamp) VALUES (?, ?)",
+        [("LOGIN", "2024-03-05 10:00:00"), ("LOGIN", None), ("LOGIN", "lixo")],
+    )
+    conn.commit()
+    conn.close()
+
+    aplicar_migracoes(db)
+
+    with db.cursor() as cursor:
+        assert "202403" in particoes_auditoria(cursor)
+        cursor.execute("SELECT COUNT(*) FROM audit_logs")
+        assert cursor.fetchone()[0] == 3
+
+
+def test_consultas_criticas_usam_indices(db):
+    assert aplicar_migracoes(db) == MIGRACOES[-1][0]
+    assert verificar_planos(db) == {}